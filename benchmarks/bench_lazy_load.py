@@ -0,0 +1,49 @@
+"""
+Time to pull one soil profile out of an ECP file with many soil profiles, eager vs lazy loading.
+
+Run with: python benchmarks/bench_lazy_load.py [n_profiles]
+"""
+import json
+import sys
+import time
+
+import numpy as np
+
+from sfsimodels import files
+from sfsimodels import models
+
+
+def gen_ecp_str(n_profiles, n_layers=5, seed=0):
+    rng = np.random.default_rng(seed)
+    ecp_output = files.Output()
+    for i in range(n_profiles):
+        sp = models.SoilProfile()
+        sp.id = i + 1
+        for j in range(n_layers):
+            sl = models.Soil(specific_gravity=rng.uniform(2.6, 2.75), e_curr=rng.uniform(0.5, 0.9),
+                             g_mod=rng.uniform(20e6, 80e6), poissons_ratio=0.3)
+            sp.add_layer(j * 2.0, sl)
+        sp.height = n_layers * 2.0
+        ecp_output.add_to_dict(sp)
+    return ecp_output.to_str()
+
+
+def run(n_profiles=2000):
+    p_str = gen_ecp_str(n_profiles)
+    start = time.perf_counter()
+    json.loads(p_str)
+    t_parse = time.perf_counter() - start
+    print("json parse: %.3fs" % t_parse)
+    for lazy in [False, True]:
+        data = json.loads(p_str)
+        start = time.perf_counter()
+        objs = files.ecp_dict_to_objects(data, lazy=lazy)
+        sp = objs['soil_profile'][n_profiles // 2]
+        t_load = time.perf_counter() - start
+        n_built = objs.n_materialized if lazy else sum(len(objs[bt]) for bt in ['soil', 'soil_profile'])
+        print("lazy=%s: one soil profile in %.4fs (excluding json parse), %i objects built"
+              % (lazy, t_load, n_built))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,45 @@
+"""
+Time to load an ECP file containing many soils.
+
+Compares the default load with the trusted load of soils.
+
+Run with: python benchmarks/bench_load_soils.py [n_soils]
+"""
+import json
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from sfsimodels import files
+from sfsimodels import models
+
+
+def gen_ecp_str(n_soils, seed=0):
+    rng = np.random.default_rng(seed)
+    soils = OrderedDict()
+    for i in range(n_soils):
+        sl = models.Soil(specific_gravity=rng.uniform(2.6, 2.75), e_curr=rng.uniform(0.5, 0.9),
+                         saturation=rng.uniform(0, 1), g_mod=rng.uniform(20e6, 80e6), poissons_ratio=0.3,
+                         phi=rng.uniform(28, 38))
+        sl.e_min = sl.e_curr - 0.2
+        sl.e_max = sl.e_curr + 0.2
+        sl.id = i + 1
+        soils[str(i + 1)] = sl.to_dict()
+    return json.dumps({"name": "soils", "units": "N, kg, m, s", "models": {"soil": soils}})
+
+
+def run(n_soils=50000):
+    p_str = gen_ecp_str(n_soils)
+    for trusted, verify in [(False, 'lazy'), (True, True), (True, 'lazy')]:
+        start = time.perf_counter()
+        objs = files.loads_json(p_str, trusted=trusted, verify=verify)
+        t_load = time.perf_counter() - start
+        assert len(objs['soil']) == n_soils
+        print("trusted=%s, verify=%s: loaded %i soils in %.2fs (%.0f soils/s)"
+              % (trusted, verify, n_soils, t_load, n_soils / t_load))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,61 @@
+"""
+Memory used by each model object, measured with tracemalloc.
+
+Run with: python benchmarks/bench_model_memory.py [n_objects]
+"""
+import sys
+import tracemalloc
+
+from sfsimodels import models
+from sfsimodels.models.buildings import BeamColumnElement
+from sfsimodels.models.sections import IrregularSection
+
+
+def gen_soil():
+    return models.Soil(specific_gravity=2.65, e_curr=0.7, saturation=0.5, g_mod=40e6, poissons_ratio=0.3, phi=33.)
+
+
+def gen_foundation():
+    return models.RaftFoundation(width=10., length=12., depth=0.8, height=1.0, mass=0.0)
+
+
+def gen_sdof_building():
+    bd = models.SDOFBuilding()
+    bd.h_eff = 10.
+    bd.mass_eff = 80000.
+    bd.t_fixed = 0.8
+    return bd
+
+
+def gen_frame_building():
+    return models.FrameBuilding2D(n_storeys=4, n_bays=3)
+
+
+OBJECTS = [
+    ("Soil", gen_soil),
+    ("StressDependentSoil", models.StressDependentSoil),
+    ("RaftFoundation", gen_foundation),
+    ("SDOFBuilding", gen_sdof_building),
+    ("IrregularSection", IrregularSection),
+    ("BeamColumnElement", BeamColumnElement),
+    ("FrameBuilding2D (4 storeys, 3 bays)", gen_frame_building),
+]
+
+
+def measure(gen_obj, n_objects):
+    gen_obj()  # create class level caches before measuring
+    tracemalloc.start()
+    objs = [gen_obj() for i in range(n_objects)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(objs)
+
+
+def run(n_objects=5000):
+    for name, gen_obj in OBJECTS:
+        n = n_objects if "Frame" not in name else max(n_objects // 50, 1)
+        print("%-40s %8.0f bytes/object" % (name, measure(gen_obj, n)))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:]])
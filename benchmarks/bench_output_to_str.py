@@ -0,0 +1,51 @@
+"""
+Scaling of Output.to_str with the number of models, each link between models needs an id lookup from its hash.
+
+The linear search (the previous `get_id_from_hash`) is only timed for the smaller outputs.
+
+Run with: python benchmarks/bench_output_to_str.py [max_power]
+"""
+import sys
+import time
+
+from sfsimodels import files
+
+
+def gen_output(n_models):
+    """Half of the models are soils, the other half are layers that each link to a soil"""
+    ecp_output = files.Output()
+    n_soils = n_models // 2
+    for i in range(n_soils):
+        ecp_output.add_to_output("soil", "s%i" % i, {"id": None, "type": "soil", "unit_dry_weight": 15.0e3 + i})
+    for i in range(n_models - n_soils):
+        ecp_output.add_to_output("layer", "l%i" % i, {"id": None, "type": "layer", "depth": float(i),
+                                                      "soil_id": None, "soil_unique_hash": "s%i" % (i % n_soils)})
+    return ecp_output
+
+
+def _linear_get_id_from_hash(self, mtype, unique_hash):
+    for m_id in self.id2hash_dict[mtype]:
+        if self.id2hash_dict[mtype][m_id] == unique_hash:
+            return m_id
+    return None
+
+
+def run(max_power=5, max_linear_power=4):
+    for power in range(3, max_power + 1):
+        n_models = 10 ** power
+        ecp_output = gen_output(n_models)
+        start = time.perf_counter()
+        ecp_output.to_str()
+        t_indexed = time.perf_counter() - start
+        line = "n_models: %8i  indexed: %8.3fs" % (n_models, t_indexed)
+        if power <= max_linear_power:
+            ecp_output = gen_output(n_models)
+            ecp_output.get_id_from_hash = _linear_get_id_from_hash.__get__(ecp_output)
+            start = time.perf_counter()
+            ecp_output.to_str()
+            line += "  linear search: %8.3fs" % (time.perf_counter() - start)
+        print(line)
+
+
+if __name__ == '__main__':
+    run(*[int(x) for x in sys.argv[1:]])
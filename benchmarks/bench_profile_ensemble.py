@@ -0,0 +1,52 @@
+"""
+Time to evaluate stresses and shear wave velocity of many soil profiles on a common depth grid.
+
+Compares evaluating each profile in turn with the batched `ProfileEnsemble`.
+
+Run with: python benchmarks/bench_profile_ensemble.py [n_profiles]
+"""
+import sys
+import time
+
+import numpy as np
+
+from sfsimodels import models
+
+
+def gen_soil_profiles(n_profiles, seed=0):
+    rng = np.random.default_rng(seed)
+    soils = [models.Soil(specific_gravity=2.65, e_curr=rng.uniform(0.5, 0.9), g_mod=rng.uniform(20e6, 80e6))
+             for i in range(20)]
+    sps = []
+    for i in range(n_profiles):
+        sp = models.SoilProfile()
+        tops = np.concatenate([[0.0], np.sort(rng.uniform(0.5, 29., rng.integers(1, 6)))])
+        for top in tops:
+            sp.add_layer(float(top), soils[rng.integers(len(soils))])
+        sp.height = 30.
+        sp.gwl = rng.uniform(0, 10)
+        sps.append(sp)
+    return sps
+
+
+def run(n_profiles=20000):
+    sps = gen_soil_profiles(n_profiles)
+    depths = np.arange(0.25, 30., 0.5)
+
+    start = time.perf_counter()
+    for sp in sps:
+        sp.get_v_eff_stress_at_depth(depths)
+        [sp.get_shear_vel_at_depth(z) for z in depths]
+    t_single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ens = models.ProfileEnsemble(sps)
+    ens.get_v_eff_stress_at_depths(depths)
+    ens.get_shear_vel_at_depths(depths)
+    t_ens = time.perf_counter() - start
+    print("%i profiles x %i depths: one at a time %.2fs, ensemble %.2fs (including packing)"
+          % (n_profiles, len(depths), t_single, t_ens))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:]])
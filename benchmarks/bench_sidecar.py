@@ -0,0 +1,53 @@
+"""
+Writing and reading an ECP file with a large mesh, with the arrays in the json vs in a binary sidecar file.
+
+Run with: python benchmarks/bench_sidecar.py [nnx] [nny]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from sfsimodels import files
+
+
+def gen_output(nnx, nny, seed=0):
+    rng = np.random.default_rng(seed)
+    ecp_output = files.Output()
+    x_nodes = np.linspace(0, 100., nnx)
+    y_nodes = -np.cumsum(rng.uniform(0.2, 0.5, (nnx, nny)), axis=1)
+    soil_grid = rng.integers(0, 5, (nnx - 1, nny - 1))
+    ecp_output.add_to_output("custom_type", 1, {"id": 1, "type": "femesh", "x_nodes": x_nodes,
+                                                "y_nodes": y_nodes, "soil_grid": soil_grid})
+    return ecp_output
+
+
+def run(nnx=1000, nny=200):
+    folder = tempfile.mkdtemp()
+    for sidecar_min_size in [None, 1000]:
+        ffp = os.path.join(folder, "mesh.json")
+        ecp_output = gen_output(nnx, nny)
+        start = time.perf_counter()
+        ecp_output.to_file(ffp, sidecar_min_size=sidecar_min_size)
+        t_write = time.perf_counter() - start
+        size = os.path.getsize(ffp)
+        if sidecar_min_size is not None:
+            size += os.path.getsize(os.path.join(folder, "mesh_arrays.npy"))
+        start = time.perf_counter()
+        with open(ffp) as json_file:
+            data = json.load(json_file)
+        files.load_sidecar_arrays(data, folder)
+        t_read = time.perf_counter() - start
+        y_nodes = data["models"]["custom_type"]["1"]["y_nodes"]
+        start = time.perf_counter()
+        np.sum(y_nodes)
+        t_use = time.perf_counter() - start
+        print("sidecar: %5s  write: %.3fs  size: %6.1f MB  read: %.3fs  sum(y_nodes): %.3fs"
+              % (sidecar_min_size is not None, t_write, size / 1e6, t_read, t_use))
+
+
+if __name__ == '__main__':
+    run(*[int(x) for x in sys.argv[1:]])
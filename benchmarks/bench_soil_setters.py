@@ -0,0 +1,76 @@
+"""
+Setter throughput of Soil and StressDependentSoil objects.
+
+Compares the incremental recompute of dependent parameters with the full sweep of all
+parameters (`recompute_all_weights_and_void` and `recompute_all_stiffness_parameters`).
+
+Also times repeated overrides, which should not slow down as the history of set values grows.
+
+Run with: python benchmarks/bench_soil_setters.py
+"""
+import time
+import timeit
+
+from sfsimodels.models import soils
+
+
+def full_sweep(self, graph, items, tolerances=None):
+    if graph is soils.STIFFNESS_DEPENDENTS:
+        self.recompute_all_stiffness_parameters()
+    else:
+        self.recompute_all_weights_and_void()
+
+
+def define_soil(cls):
+    sl = cls()
+    sl.specific_gravity = 2.65
+    sl.e_curr = 0.7
+    sl.e_min = 0.5
+    sl.e_max = 1.0
+    sl.saturation = 0.6
+    sl.poissons_ratio = 0.3
+    if cls is soils.Soil:
+        sl.g_mod = 40.0e6
+    else:
+        sl.g0_mod = 500.
+    return sl
+
+
+def reset_fully_specified_soil(sl):
+    # re-setting consistent values on a soil where all parameters are defined
+    sl.unit_dry_weight = sl.unit_dry_weight
+    sl.unit_sat_weight = sl.unit_sat_weight
+    sl.unit_moist_weight = sl.unit_moist_weight
+    sl.relative_density = sl.relative_density
+    sl.poissons_ratio = sl.poissons_ratio
+
+
+def run(number=2000):
+    incremental = soils.Soil._recompute_dependents
+    for cls in [soils.Soil, soils.StressDependentSoil]:
+        for label, method in [("full sweep", full_sweep), ("incremental", incremental)]:
+            soils.Soil._recompute_dependents = method
+            try:
+                t_define = min(timeit.repeat(lambda: define_soil(cls), number=number, repeat=3))
+                sl = define_soil(cls)
+                t_reset = min(timeit.repeat(lambda: reset_fully_specified_soil(sl), number=number, repeat=3))
+            finally:
+                soils.Soil._recompute_dependents = incremental
+            print("%-20s %-12s define: %8.0f soils/s   re-set: %8.0f setter calls/s"
+                  % (cls.__name__, label, number / t_define, 5 * number / t_reset))
+
+
+def run_override_history(n_batches=4, batch_size=200):
+    sl = soils.Soil(specific_gravity=2.65, e_curr=0.7, saturation=0.5, g_mod=40e6, poissons_ratio=0.3)
+    for i in range(n_batches):
+        start = time.perf_counter()
+        for j in range(batch_size):
+            sl.override("e_curr", 0.6 + 0.0001 * (i * batch_size + j))
+            sl.phi = 30. + 0.01 * j
+        print("overrides %5i-%5i: %.4fs  stack length: %i"
+              % (i * batch_size, (i + 1) * batch_size, time.perf_counter() - start, len(sl.stack)))
+
+
+if __name__ == '__main__':
+    run()
+    run_override_history()
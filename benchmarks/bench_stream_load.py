@@ -0,0 +1,38 @@
+"""
+Peak memory and time to load an ECP file of many soil profiles, reading the whole file vs streaming.
+
+Run with: python benchmarks/bench_stream_load.py [n_profiles]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sfsimodels import files
+from bench_lazy_load import gen_ecp_str
+
+
+def run(n_profiles=2000):
+    p_str = gen_ecp_str(n_profiles)
+    ffp = os.path.join(tempfile.mkdtemp(), "ecp.json")
+    with open(ffp, "w") as ofile:
+        ofile.write(p_str)
+    del p_str
+    print("file size: %.1f MB" % (os.path.getsize(ffp) / 1e6))
+    for stream in [False, True]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        objs = files.load_json(ffp, stream=stream)
+        t_load = time.perf_counter() - start
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(objs['soil_profile']) == n_profiles
+        del objs
+        print("stream=%s: loaded in %.2fs, peak memory %.1f MB (%.1f MB more than the loaded objects)"
+              % (stream, t_load, peak / 1e6, (peak - retained) / 1e6))
+    os.remove(ffp)
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:]])
@@ -16,3 +16,12 @@ sp.add_layer(5.0, sl2)
 sp.gwl = 2.0
 
 print(sp.get_v_eff_stress_at_depth(3))
+
+# Under drained layer, the pressure head at the base of the second layer (at 10m) is reduced to 3m
+sp.height = 10.0
+sp.pore_pressure = sm.PorePressureProfile.from_under_drained_layer(sp.gwl, 5.0, 10.0, base_head=3.0)
+print(sp.get_v_eff_stress_at_depth(8))
+
+# Perched water table on the second layer
+sp.pore_pressure = sm.PorePressureProfile.from_perched_water_table(1.0, 5.0, 6.0, gwl=8.0)
+print(sp.get_pore_pressure_at_depth([1.0, 3.0, 5.0, 7.0, 9.0]))
@@ -1,7 +1,8 @@
 from sfsimodels.models.abstract_models import PhysicalObject, CustomObject
 from sfsimodels.models.hazards import SeismicHazard
 from sfsimodels.models.foundations import Foundation, PadFoundation, RaftFoundation, PadFooting
-from sfsimodels.models.soils import Soil, CriticalSoil, discretize_soil_profile, SoilProfile, StressDependentSoil
+from sfsimodels.models.soils import Soil, CriticalSoil, discretize_soil_profile, SoilProfile, StressDependentSoil, \
+    SoilTable, ProfileEnsemble, PorePressureProfile, SoilProfileView, SoilSampler
 from sfsimodels.models.buildings import Building, FrameBuilding, WallBuilding, SDOFBuilding, FrameBuilding2D, \
     NullBuilding, BeamColumnElement, WallElement, SingleWall
 from sfsimodels.models.sections import RectangularSection, IrregularSection
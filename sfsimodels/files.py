@@ -1,4 +1,7 @@
 import json
+import os
+import re
+from collections.abc import Mapping
 
 from sfsimodels.models import soils, buildings, foundations, systems, abstract_models, loads, materials, sections, hazards
 from collections import OrderedDict
@@ -19,23 +22,47 @@ def _json_default(o):
     raise TypeError
 
 
-def load_json(ffp, custom=None, default_to_base=False, verbose=0):
+def load_json(ffp, custom=None, default_to_base=False, verbose=0, trusted=False, verify='lazy', lazy=False,
+              stream=False, mmap_mode='r'):
     """
     Given a json file it creates a dictionary of sfsi objects
 
     :param ffp: str, Full file path to json file
     :param custom: dict, used to load custom objects, {model type: custom object}
     :param verbose: int, console output
+    :param trusted: bool, if true then the saved values of soils are assigned directly (see `ecp_dict_to_objects`)
+    :param verify: bool or 'lazy', consistency check of the trusted soils
+    :param lazy: bool, if true then each model is only built when it is first indexed (see `LazyModels`)
+    :param stream: bool, if true then the file is read one model at a time (see `iter_json`)
+    :param mmap_mode: str, mode used to memory map the sidecar file of arrays (see `Output.to_file`)
     :return: dict
     """
+    if stream:
+        if lazy:
+            raise ValueError("lazy and stream cannot both be used")
+        objs = OrderedDict()
+        for item in iter_json(ffp, custom, default_to_base=default_to_base, verbose=verbose, trusted=trusted,
+                              verify=verify, objs=objs, mmap_mode=mmap_mode, folder=os.path.dirname(ffp)):
+            pass
+        return _add_plural_base_types(objs)
     with open(ffp) as json_file:
         data = json.load(json_file)
-    return ecp_dict_to_objects(data, custom, default_to_base=default_to_base, verbose=verbose)
+    load_sidecar_arrays(data, os.path.dirname(ffp), mmap_mode=mmap_mode)
+    return ecp_dict_to_objects(data, custom, default_to_base=default_to_base, verbose=verbose, trusted=trusted,
+                               verify=verify, lazy=lazy)
 
 
-def load_json_and_meta(ffp, custom=None, verbose=0):
+def load_json_and_meta(ffp, custom=None, verbose=0, stream=False, mmap_mode='r'):
+    if stream:
+        objs = OrderedDict()
+        md = {}
+        for item in iter_json(ffp, custom, verbose=verbose, meta=md, objs=objs, mmap_mode=mmap_mode,
+                              folder=os.path.dirname(ffp)):
+            pass
+        return _add_plural_base_types(objs), md
     with open(ffp) as json_file:
         data = json.load(json_file)
+    load_sidecar_arrays(data, os.path.dirname(ffp), mmap_mode=mmap_mode)
     md = {}
     for item in data:
         if item != "models":
@@ -43,7 +70,7 @@ def load_json_and_meta(ffp, custom=None, verbose=0):
     return ecp_dict_to_objects(data, custom, verbose=verbose), md
 
 
-def loads_json(p_str, custom=None, meta=False, verbose=0):
+def loads_json(p_str, custom=None, meta=False, verbose=0, trusted=False, verify='lazy', lazy=False, folder=None):
     """
     Given a json string it creates a dictionary of sfsi objects
 
@@ -51,17 +78,120 @@ def loads_json(p_str, custom=None, meta=False, verbose=0):
     :param custom: dict, used to load custom objects, {model type: custom object}
     :param meta: bool, if true then also return all ecp meta data in separate dict
     :param verbose: int, console output
+    :param trusted: bool, if true then the saved values of soils are assigned directly (see `ecp_dict_to_objects`)
+    :param verify: bool or 'lazy', consistency check of the trusted soils
+    :param lazy: bool, if true then each model is only built when it is first indexed (see `LazyModels`)
+    :param folder: str, folder of the sidecar file of arrays, required if the json references one
     :return: dict
     """
     data = json.loads(p_str)
+    load_sidecar_arrays(data, folder)
     if meta:
         md = {}
         for item in data:
             if item != "models":
                 md[item] = data[item]
-        return ecp_dict_to_objects(data, custom, verbose=verbose), md
+        return ecp_dict_to_objects(data, custom, verbose=verbose, trusted=trusted, verify=verify, lazy=lazy), md
     else:
-        return ecp_dict_to_objects(data, custom, verbose=verbose)
+        return ecp_dict_to_objects(data, custom, verbose=verbose, trusted=trusted, verify=verify, lazy=lazy)
+
+
+def _get_sidecar_array(ref, arrays):
+    """The array of a sidecar reference, a view of the sidecar bytes"""
+    offset, dtype, shape = ref
+    dtype = np.dtype(dtype)
+    n_bytes = dtype.itemsize * int(np.prod(shape))
+    return arrays[offset:offset + n_bytes].view(dtype).reshape(shape)
+
+
+def _replace_sidecar_refs(value, arrays):
+    """Replaces the sidecar references in a json value (see `SidecarArrays`) with arrays, returns the value"""
+    if isinstance(value, dict):
+        if len(value) == 1 and "sidecar_array" in value:
+            return _get_sidecar_array(value["sidecar_array"], arrays)
+        for key in value:
+            value[key] = _replace_sidecar_refs(value[key], arrays)
+    elif isinstance(value, list):
+        for i in range(len(value)):
+            value[i] = _replace_sidecar_refs(value[i], arrays)
+    return value
+
+
+def load_sidecar_arrays(ecp_dict, folder, mmap_mode='r'):
+    """
+    Replaces the references to the sidecar file in a loaded ecp dictionary with the arrays.
+
+    The sidecar is memory mapped, so the values of an array are only read from the file when they are used.
+
+    :param ecp_dict: dict, loaded ecp file (or the items read before the models, see `iter_json`)
+    :param folder: str, folder of the ecp file, the sidecar file name is relative to it
+    :param mmap_mode: str, see `numpy.load`, e.g. 'r' for read only arrays or 'c' for copy-on-write arrays
+    :return: the memory mapped sidecar (uint8 array), or None if the ecp file does not have a sidecar
+    """
+    if not ecp_dict.get("sidecar"):
+        return None
+    if folder is None:
+        raise ValueError("The ecp data references the sidecar file '{0}', "
+                         "the folder of the sidecar file must be provided".format(ecp_dict["sidecar"]))
+    arrays = np.load(os.path.join(folder, ecp_dict["sidecar"]), mmap_mode=mmap_mode)
+    if "models" in ecp_dict:
+        _replace_sidecar_refs(ecp_dict["models"], arrays)
+    return arrays
+
+
+class SidecarArrays(object):
+    """
+    Moves the large numeric lists of the output models into a binary sidecar file.
+
+    Each list (or nested list) of numbers that has at least `min_size` values is replaced in the json by a
+    reference `{"sidecar_array": [offset, dtype, shape]}`. The sidecar is a `.npy` file of bytes, in which
+    each array starts at a multiple of 16 bytes, so that it can be memory mapped and viewed as the array.
+
+    :param ffp: str, Full file path of the sidecar file
+    :param min_size: int, smaller lists are kept in the json
+    """
+
+    def __init__(self, ffp, min_size=1000):
+        self.ffp = ffp
+        self.min_size = min_size
+        self.arrays = []
+        self.n_bytes = 0
+        self.name_pos = None  # position of the sidecar name in the json file, see `Output.write`
+
+    def add(self, values):
+        """Adds an array to the sidecar, returns the reference to it"""
+        values = np.ascontiguousarray(values)
+        offset = -(-self.n_bytes // 16) * 16
+        self.arrays.append((offset, values))
+        self.n_bytes = offset + values.nbytes
+        return {"sidecar_array": [offset, values.dtype.str, list(values.shape)]}
+
+    def extract(self, value):
+        """Returns a copy of a json value where the large numeric lists are replaced by references"""
+        if isinstance(value, dict):
+            return OrderedDict([(key, self.extract(value[key])) for key in value])
+        if not isinstance(value, list) or not value:
+            return value
+        if isinstance(value[0], (int, float, list)):
+            try:
+                values = np.asarray(value)
+            except ValueError:  # ragged nested lists
+                values = None
+            if values is not None and values.dtype.kind in "biuf":
+                if values.size < self.min_size:
+                    return value
+                return self.add(values)
+        return [self.extract(item) for item in value]
+
+    def save(self):
+        sidecar = np.lib.format.open_memmap(self.ffp, mode="w+", dtype=np.uint8, shape=(self.n_bytes,))
+        for offset, values in self.arrays:
+            sidecar[offset:offset + values.nbytes] = values.reshape(-1).view(np.uint8)
+        sidecar.flush()
+        del sidecar
+
+
+_signatures = {}  # signatures of model classes
 
 
 def get_matching_args_and_kwargs(in_dict, sm_obj, custom=None, overrides=None):
@@ -69,7 +199,12 @@ def get_matching_args_and_kwargs(in_dict, sm_obj, custom=None, overrides=None):
         custom = {}
     if overrides is None:
         overrides = {}
-    sig = signature(sm_obj)
+    try:
+        sig = _signatures[sm_obj]
+    except (KeyError, TypeError):
+        sig = signature(sm_obj)
+        if isinstance(sm_obj, type):
+            _signatures[sm_obj] = sig
     kwargs = OrderedDict()
     args = []
     missing = []
@@ -159,13 +294,137 @@ def get_std_obj_map():
     }
     return obj_map
 
-def ecp_dict_to_objects(ecp_dict, custom_map=None, default_to_base=False, verbose=0):
+def _get_obj_class(obj_map, base_type, m_id, obj, default_to_base=False):
+    """The class of a model in an ecp file"""
+    try:
+        return obj_map["%s-%s" % (base_type, obj["type"])]
+    except KeyError:
+        if default_to_base and f'{base_type}-{base_type}' in obj_map:
+            return obj_map[f'{base_type}-{base_type}']
+        elif obj["type"] in deprecated_types:
+            try:
+                return obj_map["%s-%s" % (base_type, deprecated_types[obj["type"]])]
+            except KeyError:
+                raise KeyError("Map for Model: '%s' index: '%s' and type: '%s' not available, "
+                               "add '%s-%s' to custom dict" % (base_type, m_id, base_type, base_type, obj["type"]))
+        else:
+            raise KeyError("Map for Model: '%s' index: '%s' and type: '%s' not available, "
+                           "add '%s-%s' to custom dict" % (base_type, m_id, base_type, base_type, obj["type"]))
+
+
+def _populate_object(new_instance, obj, objs, verbose=0, trusted=False, verify='lazy'):
+    """Sets the values of a model dictionary on a new object, references to other models are taken from `objs`"""
+    if trusted and 'unique_hash' in obj and hasattr(new_instance, 'set_trusted'):
+        new_instance.set_trusted(obj, verify=verify)
+    else:
+        add_to_obj(new_instance, obj, objs=objs, verbose=verbose)
+
+
+def _init_object(obj_class, obj):
+    """Creates an object using the values in the model dictionary that are arguments of the class"""
+    args, kwargs, missing = get_matching_args_and_kwargs(obj, obj_class)
+    if len(missing):
+        for m_item in missing:
+            name = m_item[0]
+            m_indy = m_item[1]
+            if name == 'n_storeys':
+                args[m_indy] = len(obj["storey_masses"])
+            elif name == 'n_bays':
+                args[m_indy] = len(obj["bay_lengths"])
+    return obj_class(*args, **kwargs)
+
+
+class LazyObjects(OrderedDict):
+    """
+    Dictionary of `LazyModels` for each base type of an ecp file
+    """
+
+    @property
+    def n_materialized(self):
+        """Number of models that have been built"""
+        models = {id(value): value for value in self.values()}  # deprecated plural types share the models
+        return sum(value.n_materialized for value in models.values())
+
+
+class LazyModels(Mapping):
+    """
+    The models of a base type in an ecp file, indexed by id, a model is only built when it is first indexed.
+
+    Models that are referenced by a model (e.g. 'soil_id') are built when the model is built.
+
+    :param base_type: str, base type of the models
+    :param model_dicts: dict, model dictionaries of the base type from the ecp file
+    :param objs: LazyObjects, the models of all base types, used to resolve references to other models
+    :param obj_map: dict, {'<base_type>-<type>': class}
+    """
+
+    def __init__(self, base_type, model_dicts, objs, obj_map, default_to_base=False, verbose=0, trusted=False,
+                 verify='lazy'):
+        self.base_type = base_type
+        self._model_dicts = OrderedDict([(int(model_dicts[m_id]["id"]), model_dicts[m_id]) for m_id in model_dicts])
+        self._models = {}
+        self._objs = objs
+        self._obj_map = obj_map
+        self._default_to_base = default_to_base
+        self._verbose = verbose
+        self._trusted = trusted
+        self._verify = verify
+
+    def __getitem__(self, m_id):
+        try:
+            return self._models[m_id]
+        except KeyError:
+            pass
+        obj = self._model_dicts[m_id]
+        if "type" not in obj:
+            obj["type"] = self.base_type
+        obj_class = _get_obj_class(self._obj_map, self.base_type, m_id, obj, self._default_to_base)
+        new_instance = _init_object(obj_class, obj)
+        self._models[m_id] = new_instance  # stored first, so that references back to this model can be resolved
+        try:
+            _populate_object(new_instance, obj, self._objs, self._verbose, self._trusted, self._verify)
+        except Exception:
+            del self._models[m_id]
+            raise
+        return new_instance
+
+    def __contains__(self, m_id):  # does not build the model
+        return m_id in self._model_dicts
+
+    def get(self, m_id, default=None):
+        if m_id not in self._model_dicts:
+            return default
+        return self[m_id]
+
+    def __iter__(self):
+        return iter(self._model_dicts)
+
+    def __len__(self):
+        return len(self._model_dicts)
+
+    def __repr__(self):
+        return "LazyModels base_type: {0}, n_models: {1}, n_materialized: {2}".format(
+            self.base_type, len(self), self.n_materialized)
+
+    @property
+    def n_materialized(self):
+        """Number of models that have been built"""
+        return len(self._models)
+
+
+def ecp_dict_to_objects(ecp_dict, custom_map=None, default_to_base=False, verbose=0, trusted=False, verify='lazy',
+                        lazy=False):
     """
     Given an ecp dictionary, build a dictionary of sfsi objects
 
     :param ecp_dict: dict, engineering consistency project dictionary
     :param custom: dict, used to load custom objects, {model type: custom object}
     :param verbose: int, console output
+    :param trusted: bool, if true then objects that were saved with a 'unique_hash' and support `set_trusted`
+        (e.g. Soil) have their saved values assigned directly, rather than derived and checked one at a time
+    :param verify: bool or 'lazy', consistency check of the trusted objects (see `Soil.set_trusted`)
+    :param lazy: bool, if true then a `LazyObjects` dictionary is returned, where each model (and the models
+        that it references) is only built when it is first indexed
     :return: dict
     """
     if custom_map is None:
@@ -192,6 +451,13 @@ def ecp_dict_to_objects(ecp_dict, custom_map=None, default_to_base=False, verbos
             del data_models[mtype]
         for m_id in data_models[base_type]:
             data_models[base_type][m_id]["base_type"] = base_type
+    if lazy:
+        objs = LazyObjects()
+        for base_type in data_models:
+            objs[base_type] = LazyModels(base_type, data_models[base_type], objs, obj_map,
+                                         default_to_base=default_to_base, verbose=verbose, trusted=trusted,
+                                         verify=verify)
+        return _add_plural_base_types(objs)
     load_later = {}
     for mtype in data_models:
         base_type = mtype
@@ -203,34 +469,11 @@ def ecp_dict_to_objects(ecp_dict, custom_map=None, default_to_base=False, verbos
             obj = data_models[mtype][m_id]
             if "type" not in obj:
                 obj["type"] = base_type
-            try:
-                obj_class = obj_map["%s-%s" % (base_type, obj["type"])]
-            except KeyError:
-                if default_to_base and f'{base_type}-{base_type}' in obj_map:
-                    obj_class = obj_map[f'{base_type}-{base_type}']
-                elif obj["type"] in deprecated_types:
-                    try:
-                        obj_class = obj_map["%s-%s" % (base_type, deprecated_types[obj["type"]])]
-                    except KeyError:
-                        raise KeyError("Map for Model: '%s' index: '%s' and type: '%s' not available, "
-                                       "add '%s-%s' to custom dict" % (base_type, m_id, base_type, base_type, obj["type"]))
-                else:
-                    raise KeyError("Map for Model: '%s' index: '%s' and type: '%s' not available, "
-                                   "add '%s-%s' to custom dict" % (base_type, m_id, base_type, base_type, obj["type"]))
-            # try:
-            args, kwargs, missing = get_matching_args_and_kwargs(data_models[mtype][m_id], obj_class)
-            if len(missing):
-                for m_item in missing:
-                    name = m_item[0]
-                    m_indy = m_item[1]
-                    if name == 'n_storeys':
-                        args[m_indy] = len(data_models[mtype][m_id]["storey_masses"])
-                    elif name == 'n_bays':
-                        args[m_indy] = len(data_models[mtype][m_id]["bay_lengths"])
-            new_instance = obj_class(*args, **kwargs)
+            obj_class = _get_obj_class(obj_map, base_type, m_id, obj, default_to_base)
+            new_instance = _init_object(obj_class, obj)
             # add_to_obj(new_instance, data_models[mtype][m_id], objs=objs, verbose=verbose)
             try:
-                add_to_obj(new_instance, data_models[mtype][m_id], objs=objs, verbose=verbose)
+                _populate_object(new_instance, obj, objs, verbose, trusted, verify)
             except KeyError as e:
                 if hasattr(new_instance, 'loading_pre_reqs'):
                     if new_instance.base_type not in load_later:
@@ -257,6 +500,10 @@ def ecp_dict_to_objects(ecp_dict, custom_map=None, default_to_base=False, verbos
     #     if base_type not in objs:
     #         objs[base_type] = OrderedDict()
 
+    return _add_plural_base_types(objs)
+
+
+def _add_plural_base_types(objs):
     all_bts = list(objs)
     for base_type in all_bts:  # Support for old style ecp file
         if base_type in standard_types:
@@ -276,6 +523,182 @@ def load_last_objects(objs, load_later, ll_type, now_loaded):
         now_loaded.append(ll_type)
 
 
+_json_whitespace = re.compile(r'[ \t\n\r]*')
+
+
+class _JsonStreamReader(object):
+    """
+    Reads a json document from a file one value at a time, only the unread part of the current value is held
+    in memory.
+
+    :param fp: file object opened in text mode
+    :param chunk_size: int, number of characters read from the file at a time
+    """
+
+    def __init__(self, fp, chunk_size=2 ** 20):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _read(self, size):
+        """Drops the characters that have been read and reads more from the file"""
+        data = self.fp.read(size)
+        self.eof = not data
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+
+    def peek(self):
+        """The next character that is not whitespace, an empty string at the end of the file"""
+        while True:
+            self.pos = _json_whitespace.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._read(self.chunk_size)
+
+    def expect(self, chars):
+        """Reads the next character, which must be one of `chars`"""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError("Expected one of '{0}' but found '{1}' in json file".format(chars, char))
+        self.pos += 1
+        return char
+
+    def decode(self):
+        """Reads the next json value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or self.eof:  # a number could continue in the next chunk
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # at least double the unread part, so that a large value is only decoded a few times
+            self._read(max(self.chunk_size, len(self.buf) - self.pos))
+
+    def iter_keys(self):
+        """Iterates over the keys of a json object, the value of each key must be read before the next key"""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.decode()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+
+def _iter_ready_objects(load_later, objs, verbose=0, finished=False):
+    """
+    Adds the values to the objects that were waiting for other base types to be read, and yields them.
+
+    An object is ready once each of its `loading_pre_reqs` has been read and has no objects that are waiting.
+    The objects that are not ready are left in `load_later`.
+
+    :param load_later: list of (base type, object, model dictionary)
+    :param objs: dict, objects that have been built, {base_type: {id: object}}
+    :param finished: bool, if true then the file has been read and all objects are loaded
+    """
+    while load_later:
+        waiting_types = set(item[0] for item in load_later)
+        ready = []
+        waiting = []
+        for item in load_later:
+            pre_reqs = item[1].loading_pre_reqs
+            if finished or all(pre_req in objs and pre_req not in waiting_types for pre_req in pre_reqs):
+                ready.append(item)
+            else:
+                waiting.append(item)
+        if not ready:
+            break
+        load_later[:] = waiting
+        for base_type, new_instance, obj in ready:
+            add_to_obj(new_instance, obj, objs=objs, verbose=verbose)  # raises KeyError if a reference is missing
+            objs[base_type][int(obj["id"])] = new_instance
+            yield base_type, int(obj["id"]), new_instance
+
+
+def iter_json(ffp, custom=None, default_to_base=False, verbose=0, trusted=False, verify='lazy', meta=None,
+              objs=None, chunk_size=2 ** 20, mmap_mode='r', folder=None):
+    """
+    Reads a json (ecp) file one model at a time and yields each sfsi object as soon as it is built.
+
+    Only the dictionary of the current model is held in memory (rather than the whole json document),
+    along with the objects that have been built, which are used to resolve references between models.
+    Models that reference a base type that has not yet been read (e.g. a building before its sections) are
+    built once the base type has been read.
+
+    :param ffp: str or file object, Full file path to json file
+    :param custom: dict, used to load custom objects, {model type: custom object}
+    :param verbose: int, console output
+    :param trusted: bool, if true then the saved values of soils are assigned directly (see `ecp_dict_to_objects`)
+    :param verify: bool or 'lazy', consistency check of the trusted soils
+    :param meta: dict, if provided then the ecp meta data (all items except 'models') are added to it
+    :param objs: dict, if provided then the objects are also stored in it, {base_type: {id: object}}
+    :param chunk_size: int, number of characters read from the file at a time
+    :param mmap_mode: str, mode used to memory map the sidecar file of arrays (see `load_sidecar_arrays`)
+    :param folder: str, folder of the sidecar file of arrays, defaults to the folder of `ffp` if it is a path,
+        required if `ffp` is a file object and the json references a sidecar file
+    :return: generator of (base type, id, object)
+    """
+    if not hasattr(ffp, 'read'):
+        if folder is None:
+            folder = os.path.dirname(ffp)
+        with open(ffp) as fp:
+            yield from iter_json(fp, custom, default_to_base=default_to_base, verbose=verbose, trusted=trusted,
+                                 verify=verify, meta=meta, objs=objs, chunk_size=chunk_size, mmap_mode=mmap_mode,
+                                 folder=folder)
+        return
+    if custom is None:
+        custom = {}
+    if objs is None:
+        objs = OrderedDict()
+    obj_map = {**get_std_obj_map(), **custom}
+    reader = _JsonStreamReader(ffp, chunk_size=chunk_size)
+    arrays = None
+    for key in reader.iter_keys():
+        if key != "models":
+            value = reader.decode()
+            if meta is not None:
+                meta[key] = value
+            if key == "sidecar":  # written before the models
+                arrays = load_sidecar_arrays({"sidecar": value}, folder, mmap_mode=mmap_mode)
+            continue
+        load_later = []
+        for mtype in reader.iter_keys():
+            base_type = mtype
+            if base_type[:-1] in standard_types:  # support the loading of old plural based ecp files
+                base_type = base_type[:-1]
+            objs.setdefault(base_type, OrderedDict())
+            for m_id in reader.iter_keys():
+                obj = reader.decode()
+                if arrays is not None:
+                    _replace_sidecar_refs(obj, arrays)
+                obj["base_type"] = base_type
+                if "type" not in obj:
+                    obj["type"] = base_type
+                obj_class = _get_obj_class(obj_map, base_type, m_id, obj, default_to_base)
+                new_instance = _init_object(obj_class, obj)
+                try:
+                    _populate_object(new_instance, obj, objs, verbose, trusted, verify)
+                except KeyError:
+                    if not hasattr(new_instance, 'loading_pre_reqs'):
+                        raise
+                    load_later.append((base_type, new_instance, obj))
+                    continue
+                objs[base_type][int(obj["id"])] = new_instance
+                yield base_type, int(obj["id"]), new_instance
+            yield from _iter_ready_objects(load_later, objs, verbose)
+        yield from _iter_ready_objects(load_later, objs, verbose, finished=True)
+
+
 class Output(object):
     name = ""
     units = None
@@ -288,6 +711,7 @@ class Output(object):
     def __init__(self):
         self.unordered_models = {}
         self.id2hash_dict = {}
+        self.hash2id_dict = {}  # reverse of id2hash_dict
 
     @property
     def sfsimodels_version(self):
@@ -329,10 +753,18 @@ class Output(object):
             raise ModelError("Object does not have method 'to_dict', cannot add to output.")
 
     def build_id2hash_dict(self):
+        """
+        Assigns an id to each model that does not have one, and stores the id of each unique hash
+        in `id2hash_dict` and the reverse in `hash2id_dict`
+        """
         for mtype in self.unordered_models:
             if mtype not in self.id2hash_dict:  # Catch any custom objects
                 self.id2hash_dict[mtype] = OrderedDict()
+                self.hash2id_dict[mtype] = {}
+            hash2id = self.hash2id_dict[mtype]
             for unique_hash in self.unordered_models[mtype]:
+                if unique_hash in hash2id:  # already has an id
+                    continue
                 if self.reset_ids is False:
                     obj_id = self.unordered_models[mtype][unique_hash]['id']
                     if obj_id in self.id2hash_dict[mtype]:
@@ -340,12 +772,10 @@ class Output(object):
                 else:
                     obj_id = len(self.id2hash_dict[mtype]) + 1
                 self.id2hash_dict[mtype][obj_id] = unique_hash
+                hash2id[unique_hash] = obj_id
 
     def get_id_from_hash(self, mtype, unique_hash):
-        for m_id in self.id2hash_dict[mtype]:
-            if self.id2hash_dict[mtype][m_id] == unique_hash:
-                return m_id
-        return None
+        return self.hash2id_dict[mtype].get(unique_hash)
 
     def _replace_single_id(self, value, item, pdict=None):  # returns value
         """
@@ -370,7 +800,8 @@ class Output(object):
             else:
                 values = value
             for i, val2 in enumerate(values):
-                values[i] = self._replace_single_id(val2, '')  # if it is a list then check if dict is deeper
+                # if it is a list then check if dict is deeper
+                values[i] = self._replace_single_id(val2, '')
             return values
         if '_unique_hash' in item:  # detect link to new object
             child_mtype = item.replace('_unique_hash', '')
@@ -387,11 +818,16 @@ class Output(object):
         self.build_id2hash_dict()
         for mtype in self.unordered_models:
             for unique_hash in self.unordered_models[mtype]:
-                umd = self.unordered_models[mtype][unique_hash]
-                umd['id'] = self.get_id_from_hash(mtype, unique_hash)
-                for item in umd:
-                    val = umd[item]
-                    umd[item] = self._replace_single_id(val, item, umd)
+                self._replace_ids_of_model(mtype, unique_hash)
+
+    def _replace_ids_of_model(self, mtype, unique_hash):
+        """Replaces the ids of a single model with the ids from the id2hash_dict, returns the model dictionary"""
+        umd = self.unordered_models[mtype][unique_hash]
+        umd['id'] = self.get_id_from_hash(mtype, unique_hash)
+        for item in umd:
+            val = umd[item]
+            umd[item] = self._replace_single_id(val, item, umd)
+        return umd
 
     def add_to_output(self, mtype, m_id, serialisable_dict):
         """
@@ -406,21 +842,18 @@ class Output(object):
             self.unordered_models[mtype] = OrderedDict()
         self.unordered_models[mtype][m_id] = serialisable_dict
 
+    def _get_ordered_mtypes(self):
+        """Model types in the order that they are output, the standard types first"""
+        collected = [item for item in standard_types if item in self.unordered_models]
+        return collected + [item for item in self.unordered_models if item not in collected]
+
     def get_models(self):
         """Unhashed"""
         self.replace_conflicting_ids()
         models_dict = OrderedDict()
-        collected = []
-        for item in standard_types:
-            if item in self.unordered_models:
-                new_dict, replacement_dict = unhash_dict(self.unordered_models[item])
-                models_dict[item] = new_dict
-                collected.append(item)
-        for item in self.unordered_models:
-            # print("item: ", item)
-            if item not in collected:
-                new_dict, replacement_dict = unhash_dict(self.unordered_models[item])
-                models_dict[item] = new_dict
+        for item in self._get_ordered_mtypes():
+            new_dict, replacement_dict = unhash_dict(self.unordered_models[item])
+            models_dict[item] = new_dict
         return models_dict
 
     @staticmethod
@@ -436,16 +869,107 @@ class Output(object):
                 outputs[item] = self.__getattribute__(item)
         return outputs
 
-    def to_file(self, ffp, indent=4, name=None, units=None, comments=None):
-        """Export to json file"""
+    def write(self, fp, indent=4, sidecar=None):
+        """
+        Writes the json output to a file object, one model at a time.
+
+        The ids of each model are resolved (using `hash2id_dict`) just before the model is written,
+        so no copy of the output dictionary is built. The output is the same as `json.dump(self.to_dict(), fp)`.
+
+        :param fp: file object opened in text mode
+        :param indent: int, str or None, indent used by `json.dump`
+        :param sidecar: `SidecarArrays`, if provided then the large arrays of the models are added to it,
+            and the name of the sidecar file is written before the models. `sidecar.save()` must then be called.
+        """
+        if isinstance(indent, int):
+            indent = " " * indent
+        newline = "" if indent is None else "\n"
+        indent = "" if indent is None else indent
+        item_sep = ", " if newline == "" else ","
+
+        def dumps(value, level):
+            v_str = json.dumps(value, indent=indent if newline else None, default=_json_default)
+            return v_str.replace("\n", "\n" + indent * level) if newline else v_str
+
+        def write_key(i, key, level):
+            fp.write("{0}{1}{2}{3}: ".format(item_sep if i else "", newline, indent * level, json.dumps(key)))
+
+        self.build_id2hash_dict()
+        items = self.parameters()
+        if sidecar is not None:
+            items.insert(items.index("models"), "sidecar")
+        fp.write("{")
+        for i, item in enumerate(items):
+            write_key(i, item, 1)
+            if item == "sidecar":
+                sidecar.name_pos = fp.tell() if fp.seekable() else None
+                fp.write(dumps(os.path.basename(sidecar.ffp), 1))
+                continue
+            if item != "models":
+                fp.write(dumps(self.__getattribute__(item), 1))
+                continue
+            mtypes = self._get_ordered_mtypes()
+            if not mtypes:
+                fp.write("{}")
+                continue
+            fp.write("{")
+            for j, mtype in enumerate(mtypes):
+                write_key(j, mtype, 2)
+                if not self.unordered_models[mtype]:
+                    fp.write("{}")
+                    continue
+                fp.write("{")
+                for k, unique_hash in enumerate(self.unordered_models[mtype]):
+                    write_key(k, str(k + 1), 3)  # keys are the positions, as in `unhash_dict`
+                    model = self._replace_ids_of_model(mtype, unique_hash)
+                    if sidecar is not None:
+                        model = sidecar.extract(model)
+                    fp.write(dumps(model, 3))
+                fp.write("{0}{1}}}".format(newline, indent * 2))
+            fp.write("{0}{1}}}".format(newline, indent))
+        fp.write("{0}}}".format(newline))
+
+    def to_file(self, ffp, indent=4, name=None, units=None, comments=None, stream=False, sidecar_min_size=None):
+        """
+        Export to json file
+
+        :param stream: bool, if true then each model is written as soon as its ids are resolved (see `write`)
+        :param sidecar_min_size: int, if set then the numeric lists with at least this many values are stored
+            in a binary sidecar file ('<name>_arrays.npy' next to the json file, see `SidecarArrays`),
+            the sidecar file is not written if there are no lists this large
+        """
         if name is not None:
             self.name = "%s" % name
         if units is not None:
             self.units = units
         if comments is not None:
             self.comments = comments
+        if sidecar_min_size is not None:
+            sidecar = SidecarArrays(os.path.splitext(ffp)[0] + "_arrays.npy", min_size=sidecar_min_size)
+            if stream:
+                with open(ffp, "w") as out_file:
+                    self.write(out_file, indent=indent, sidecar=sidecar)
+                    if not sidecar.n_bytes:  # the name is written before the models, so is replaced by null
+                        out_file.seek(sidecar.name_pos)
+                        out_file.write("null".ljust(len(json.dumps(os.path.basename(sidecar.ffp)))))
+            else:
+                outputs = OrderedDict()
+                for item, value in self.to_dict().items():
+                    if item == "models":
+                        value = sidecar.extract(value)
+                        if sidecar.n_bytes:
+                            outputs["sidecar"] = os.path.basename(sidecar.ffp)
+                    outputs[item] = value
+                with open(ffp, "w") as out_file:
+                    json.dump(outputs, out_file, indent=indent, default=_json_default)
+            if sidecar.n_bytes:
+                sidecar.save()
+            return
         with open(ffp, "w") as out_file:
-            json.dump(self.to_dict(), out_file, indent=indent, default=_json_default)
+            if stream:
+                self.write(out_file, indent=indent)
+            else:
+                json.dump(self.to_dict(), out_file, indent=indent, default=_json_default)
 
     def to_str(self, indent=4, name=None, units=None, comments=None):
         """Return as a json string"""
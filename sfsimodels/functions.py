@@ -1,4 +1,5 @@
 from collections import OrderedDict
+from inspect import signature
 import numpy as np
 import sfsimodels.exceptions
 #
@@ -107,6 +108,9 @@ def add_to_obj(obj, dictionary, objs=None, exceptions=None, verbose=0):
     """
     if exceptions is None:
         exceptions = []
+    # objects that can set many values at once (e.g. Soil) check the consistency of the derived values together
+    graphs = getattr(obj, '_dependency_graphs', ()) if hasattr(obj, 'set_many') else ()
+    many_values = OrderedDict()
     # exceptions.append('unique_hash')
     for item in dictionary:
         if item == 'unique_hash':
@@ -125,7 +129,9 @@ def add_to_obj(obj, dictionary, objs=None, exceptions=None, verbose=0):
                 cleaned_keys = [val.replace('_unique_hash', '') for val in keys]
                 if cleaned_keys[0] == cleaned_keys[1]:
                     value = value[cleaned_keys[0]]
-
+            if any(key in graph for graph in graphs):
+                many_values[key] = value
+                continue
             try:
                 setattr(obj, key, value)
             except AttributeError:
@@ -138,6 +144,39 @@ def add_to_obj(obj, dictionary, objs=None, exceptions=None, verbose=0):
                     raise AttributeError("Can't set {0}={1} on object: {2}".format(key, value, obj))
             except sfsimodels.exceptions.ModelError:
                 pass
+    if many_values:
+        obj.set_many(many_values)
+
+
+_required_parameters = {}
+
+
+def get_required_parameters_of_method(obj, method):
+    """
+    Names of the positional parameters without defaults of a method, cached for each object type
+
+    Parameters
+    ----------
+    obj: object
+        The Object that has the method
+    method: str
+        The name of the method
+
+    Returns
+    -------
+    list or None: None if the signature of the method cannot be determined
+    """
+    key = (type(obj), method)
+    if key not in _required_parameters:
+        try:
+            sig = signature(getattr(obj, method))
+        except (TypeError, ValueError):
+            _required_parameters[key] = None
+        else:
+            _required_parameters[key] = [p.name for p in sig.parameters.values()
+                                         if p.default is p.empty and p.kind in (p.POSITIONAL_ONLY,
+                                                                                p.POSITIONAL_OR_KEYWORD)]
+    return _required_parameters[key]
 
 
 def get_value_of_a_get_method(obj, method, extras=None):
@@ -159,6 +198,10 @@ def get_value_of_a_get_method(obj, method, extras=None):
     """
     if extras is None:
         extras = {}
+    parameters = get_required_parameters_of_method(obj, method)
+    if parameters is not None:
+        params = [extras[parameter] if parameter in extras else getattr(obj, parameter) for parameter in parameters]
+        return getattr(obj, method)(*params)
     try:
         value = getattr(obj, method)()
     except TypeError as e:
@@ -1,6 +1,7 @@
 from sfsimodels.models.hazards import SeismicHazard
 from sfsimodels.models.foundations import Foundation, FoundationPad, FoundationRaft
-from sfsimodels.models.soils import Soil, CriticalSoil, StressDependentSoil, SoilCritical, SoilProfile
+from sfsimodels.models.soils import Soil, CriticalSoil, StressDependentSoil, SoilCritical, SoilProfile, SoilTable, \
+    ProfileEnsemble, PorePressureProfile, SoilProfileView, SoilSampler
 from sfsimodels.models.buildings import Building, \
     SDOFBuilding, NullBuilding
 from sfsimodels.models.sections import RectangularSection, IrregularSection
@@ -12,6 +12,22 @@ import json
 json.encoder.FLOAT_REPR = lambda f: ("%.5g" % f)
 
 
+class _SharedInputs(tuple):
+    """
+    Immutable input names that are shared between objects of the same class.
+
+    Adding to the inputs returns a new list, so `obj.inputs += [...]` only extends the inputs of `obj`.
+    """
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+
+_shared_inputs = {}
+
+
 class PhysicalObject(object):
     _id = None
     name = None
@@ -71,6 +87,13 @@ class PhysicalObject(object):
     def ancestor_types(self):
         return ["physical_object"]
 
+    def _share_inputs(self):
+        """
+        Replaces the inputs list with an immutable tuple that is shared by all objects with the same inputs
+        """
+        inputs = _SharedInputs(self.inputs)
+        self.inputs = _shared_inputs.setdefault(inputs, inputs)
+
     def add_from_same(self, obj, inputs_from="obj", update_inputs=True):
         if not hasattr(self, "inputs"):
             raise ModelError("self does not contain attribute: 'inputs'")
@@ -88,7 +111,7 @@ class PhysicalObject(object):
                 except ModelError:
                     continue
                 if update_inputs and item not in self.inputs:
-                    self.inputs.append(item)
+                    self.inputs = list(self.inputs) + [item]
 
     def to_dict(self, extra=(), **kwargs):
         outputs = OrderedDict()
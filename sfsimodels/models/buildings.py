@@ -213,6 +213,8 @@ class BeamColumnElement(PhysicalObject):
             self._sections = [IrregularSection() for i in range(n_sects)]
         else:
             self._sections = [section_class() for i in range(n_sects)]
+        if type(self) is BeamColumnElement:
+            self._share_inputs()
 
     @property
     def s(self):
@@ -239,7 +241,7 @@ class BeamColumnElement(PhysicalObject):
             prop_value = [prop_value] * len(self.sections)
         for i, sect_i in enumerate(sections):
             if not hasattr(self.sections[sect_i], prop) and prop not in self.sections[sect_i].inputs:
-                self.sections[sect_i].inputs.append(prop)
+                self.sections[sect_i].inputs = self.sections[sect_i].inputs + [prop]
             setattr(self.sections[sect_i], prop, prop_value[i])
 
     def add_inputs_to_section(self, props, sections=None):
@@ -871,6 +873,8 @@ class SDOFBuilding(PhysicalObject):
             'z_fd'
         ]
         self._g = g
+        if type(self) is SDOFBuilding:
+            self._share_inputs()
 
     @property
     def ancestor_types(self):
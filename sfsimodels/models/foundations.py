@@ -72,6 +72,8 @@ class Foundation(PhysicalObject):
         for item in  kwargs:
             self.__setattr__(item, kwargs[item])
             self.stack.append(item)
+        if type(self) is Foundation:
+            self._share_inputs()
 
     @property
     def ancestor_types(self):
@@ -382,6 +384,8 @@ class StripFoundation(Foundation):
     def __init__(self):
         super(StripFoundation, self).__init__()
         self.inputs = self.inputs + self._extra_class_inputs
+        if type(self) is StripFoundation:
+            self._share_inputs()
 
 
 class RaftFoundation(Foundation):
@@ -399,6 +403,8 @@ class RaftFoundation(Foundation):
     def __init__(self, **kwargs):
         super(RaftFoundation, self).__init__(**kwargs)
         self.inputs = self.inputs + self._extra_class_inputs
+        if type(self) is RaftFoundation:
+            self._share_inputs()
 
     @property
     def ancestor_types(self):
@@ -435,6 +441,8 @@ class PadFooting(Foundation):
     def __init__(self):
         super(PadFooting, self).__init__()
         self.inputs = self.inputs + self._extra_class_inputs
+        if type(self) is PadFooting:
+            self._share_inputs()
 
     @property
     def ancestor_types(self):
@@ -493,6 +501,8 @@ class PadFoundation(Foundation):
         self._pad_pos_in_width_dir = None
         self.skip_list = list(self.skip_list) + ["tie_beam_sect_in_width_dir",
                            "tie_beam_sect_in_length_dir"]
+        if type(self) is PadFoundation:
+            self._share_inputs()
 
     def add_to_dict(self, models_dict, return_mdict=False, **kwargs):
         if self.base_type not in models_dict:
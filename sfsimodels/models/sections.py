@@ -100,6 +100,7 @@ class IrregularSection(PhysicalObject):
     _area = None
     _i_rot_ww = None
     _i_rot_dd = None
+    skip_list = ('material',)
 
     def __init__(self, **kwargs):
         self.inputs = [
@@ -112,11 +113,12 @@ class IrregularSection(PhysicalObject):
             'i_rot_dd',
             "material"
                        ]
-        self.skip_list = list(self.skip_list) + ['material']
 
         for param in kwargs:
             if param in self.inputs:
                 setattr(self, param, kwargs[param])
+        if type(self) is IrregularSection:
+            self._share_inputs()
 
     @property
     def depth(self):
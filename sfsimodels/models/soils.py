@@ -1,4 +1,7 @@
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
+from bisect import bisect_right
+from operator import attrgetter
+import hashlib
 from sfsimodels.exceptions import deprecation
 
 import numpy as np
@@ -13,6 +16,150 @@ from sfsimodels import functions as sf
 MASS_DENSITY_WATER = 1.0e3
 
 
+def _nan_if_none(value):
+    if value is None:
+        return np.nan
+    return value
+
+
+def _nan_if_none_array(values):
+    values = np.asarray(values)
+    if values.dtype == object:
+        return np.array([_nan_if_none(value) for value in values.flat], dtype=float).reshape(values.shape)
+    return values.astype(float)
+
+
+# Relationships between soil parameters, (parameter, required parameters, function),
+# the function arguments are an object with `uww`, `ulw` and `liq_sg`, followed by the required parameters.
+# If more than one relationship exists for a parameter then they are listed in order of preference.
+WEIGHT_AND_VOID_RELATIONS = (
+    ("e_curr", ("specific_gravity", "unit_dry_weight"), lambda c, gs, dry: gs * c.uww / dry - 1),
+    ("e_curr", ("specific_gravity", "unit_sat_weight"),
+     lambda c, gs, sat: (gs * c.uww - sat) / (sat - c.liq_sg * c.uww)),
+    ("e_curr", ("e_max", "relative_density", "e_min"), lambda c, e_max, dr, e_min: e_max - dr * (e_max - e_min)),
+    ("relative_density", ("e_max", "e_curr", "e_min"), lambda c, e_max, e, e_min: (e_max - e) / (e_max - e_min)),
+    ("e_min", ("e_curr", "relative_density", "e_max"), lambda c, e, dr, e_max: (e + (dr - 1) * e_max) / dr),
+    ("e_max", ("relative_density", "e_min", "e_curr"), lambda c, dr, e_min, e: (dr * e_min - e) / (dr - 1)),
+    ("specific_gravity", ("e_curr", "unit_dry_weight"), lambda c, e, dry: (1 + e) * dry / c.uww),
+    ("specific_gravity", ("e_curr", "unit_sat_weight"), lambda c, e, sat: (1 + e) * sat / c.uww - e * c.liq_sg),
+    ("unit_dry_weight", ("specific_gravity", "e_curr"), lambda c, gs, e: (gs * c.uww) / (1 + e)),
+    ("unit_sat_weight", ("specific_gravity", "e_curr"), lambda c, gs, e: ((gs + e * c.liq_sg) * c.uww) / (1 + e)),
+    ("unit_moist_weight", ("saturation", "e_curr", "unit_dry_weight"),
+     lambda c, sat, e, dry: sat * e / (1 + e) * c.ulw + dry),
+    ("saturation", ("unit_moist_weight", "unit_dry_weight", "e_curr"),
+     lambda c, moist, dry, e: (moist - dry) / c.ulw / (e / (1 + e))),
+)
+
+STIFFNESS_RELATIONS = (
+    ("g_mod", ("bulk_mod", "poissons_ratio"), lambda c, k, v: 3 * k * (1 - 2 * v) / (2 * (1 + v))),
+    ("bulk_mod", ("g_mod", "poissons_ratio"), lambda c, g, v: 2 * g * (1 + v) / (3 * (1 - 2 * v))),
+    ("poissons_ratio", ("bulk_mod", "g_mod"), lambda c, k, g: (3 * k - 2 * g) / (2 * (3 * k + g))),
+)
+
+
+def _build_dependency_graph(relations):
+    """Maps each parameter to the relationships that require it"""
+    graph = {}
+    for relation in relations:
+        for name in relation[1]:
+            graph.setdefault(name, []).append(relation)
+    return graph
+
+
+WEIGHT_AND_VOID_DEPENDENTS = _build_dependency_graph(WEIGHT_AND_VOID_RELATIONS)
+STIFFNESS_DEPENDENTS = _build_dependency_graph(STIFFNESS_RELATIONS)
+
+
+class _LiquidConstants(object):
+    def __init__(self, gravity, wmd, liq_sg):
+        self.uww = gravity * wmd
+        self.ulw = gravity * wmd * liq_sg
+        self.liq_sg = liq_sg
+
+
+def _isclose_array(a, b, rel_tol):
+    """Vectorised version of `checking_tools.isclose`"""
+    a_abs = np.abs(a)
+    b_abs = np.abs(b)
+    small = (a_abs < 1e-14) & (b_abs < 1e-14)
+    return small | (np.abs(a - b) <= rel_tol * np.maximum(a_abs, b_abs))
+
+
+def calc_consistent_soil_parameters(values, gravity=9.8, wmd=1000.0, liq_sg=1.0, rel_tol=0.001, stiffness=True,
+                                    priority=False):
+    """
+    Derives all weight, void ratio and stiffness parameters for a batch of soils
+
+    Each parameter is an array with a value for each soil (NaN or None if not defined). The relationships
+    between the parameters are applied until no more parameters can be derived, and soils with a set
+    value that is inconsistent with a derived value are flagged.
+
+    If `priority` is true then the parameters are applied in the order of `values`, and a value that is
+    inconsistent with the values derived from the parameters before it is replaced by the derived value.
+
+    :param values: dict, parameter name and array_like of values for each soil
+    :param gravity: float or array_like, gravity acceleration
+    :param wmd: float or array_like, mass density of water used for specific gravity
+    :param liq_sg: float or array_like, specific gravity of pore liquid
+    :param rel_tol: float, relative tolerance used to check consistency
+    :param stiffness: bool, if true then also derive `g_mod`, `bulk_mod` and `poissons_ratio`
+    :param priority: bool, if true then inconsistent values are replaced rather than flagged
+    :return: tuple, (dict of arrays for all parameters, array of bool where true if soil is inconsistent
+        (or if `priority` then true if a value was replaced))
+    """
+    relations = WEIGHT_AND_VOID_RELATIONS + STIFFNESS_RELATIONS if stiffness else WEIGHT_AND_VOID_RELATIONS
+    n = max([np.size(values[item]) for item in values] + [1])
+    params = OrderedDict()
+    for item in OrderedDict.fromkeys(rel[0] for rel in relations):
+        params[item] = np.full(n, np.nan)
+    given = OrderedDict()
+    for item in values:
+        vals = values[item]
+        if np.ndim(vals) and (not isinstance(vals, np.ndarray) or vals.dtype == object):
+            vals = [_nan_if_none(value) for value in vals]
+        given[item] = np.array(np.broadcast_to(np.asarray(_nan_if_none(vals), dtype=float), (n,)))
+    consts = _LiquidConstants(np.asarray(gravity, dtype=float), np.asarray(wmd, dtype=float),
+                              np.asarray(liq_sg, dtype=float))
+    if not priority:
+        params.update(given)
+        return params, _fill_soil_parameters(params, relations, consts, rel_tol)
+    replaced = np.zeros(n, dtype=bool)
+    for item in given:
+        curr = params.setdefault(item, np.full(n, np.nan))
+        known = ~np.isnan(curr)
+        defined = ~np.isnan(given[item])
+        replaced |= defined & known & ~_isclose_array(curr, given[item], rel_tol)
+        fill = defined & ~known
+        if fill.any():
+            curr[fill] = given[item][fill]
+            _fill_soil_parameters(params, relations, consts, rel_tol)
+    return params, replaced
+
+
+def _fill_soil_parameters(params, relations, consts, rel_tol):
+    """
+    Applies the relations until no more parameters can be derived
+
+    :return: array of bool, true if a value in `params` is inconsistent with a derived value
+    """
+    inconsistent = np.zeros(len(params[relations[0][0]]), dtype=bool)
+    changed = True
+    with np.errstate(divide='ignore', invalid='ignore'):
+        while changed:
+            changed = False
+            for item, req, fn in relations:
+                new = fn(consts, *[params[name] for name in req])
+                defined = np.isfinite(new)
+                curr = params[item]
+                known = ~np.isnan(curr)
+                inconsistent |= defined & known & ~_isclose_array(curr, new, rel_tol)
+                fill = defined & ~known
+                if fill.any():
+                    curr[fill] = new[fill]
+                    changed = True
+    return inconsistent
+
+
 class Soil(PhysicalObject):
     """
     An object to simulate an element of soil
@@ -44,6 +191,35 @@ class Soil(PhysicalObject):
     _poissons_ratio = None
     _plasticity_index = None
     _liq_sg = 1
+    _dependency_graphs = (WEIGHT_AND_VOID_DEPENDENTS, STIFFNESS_DEPENDENTS)
+    _unverified = False  # True if trusted values have been set but not yet checked for consistency
+    _depth_variations = None  # {parameter: (gradient, exponent, ref_depth)}
+    _extra_class_inputs = [
+        "id",
+        "name",
+        "base_type",
+        "type",
+        "stype",
+        "g_mod",
+        "bulk_mod",
+        "poissons_ratio",
+        "phi",
+        "dilation_angle",
+        "e_min",
+        "e_max",
+        "e_curr",
+        "relative_density",
+        "specific_gravity",
+        "unit_dry_weight",
+        "unit_sat_weight",
+        "saturation",
+        "cohesion",
+        "plasticity_index",
+        "permeability",
+        "gravity",
+        "wmd",
+        "liq_sg"
+    ]
 
     def __init__(self, pw=None, wmd=None, liq_mass_density=None, liq_sg=1, g=9.8, **kwargs):
         # Note: liq_mass_density has deprecated, and pw is no longer supported
@@ -61,39 +237,18 @@ class Soil(PhysicalObject):
             self._wmd = 1000
         else:
             self._wmd = wmd
-        self.stack = [('gravity', self._gravity), ('wmd', self._wmd), ('liq_sg', self._liq_sg)]
-        self._extra_class_inputs = [
-            "id",
-            "name",
-            "base_type",
-            "type",
-            "stype",
-            "g_mod",
-            "bulk_mod",
-            "poissons_ratio",
-            "phi",
-            "dilation_angle",
-            "e_min",
-            "e_max",
-            "e_curr",
-            "relative_density",
-            "specific_gravity",
-            "unit_dry_weight",
-            "unit_sat_weight",
-            "saturation",
-            "cohesion",
-            "plasticity_index",
-            "permeability",
-            "gravity",
-            "wmd",
-            "liq_sg"
-        ]
+        self.stack = {'gravity': self._gravity, 'wmd': self._wmd, 'liq_sg': self._liq_sg}
         if not hasattr(self, "inputs"):
             self.inputs = []
-        self.inputs += list(self._extra_class_inputs)
-        for param in kwargs:
-            if param in self.inputs:
-                setattr(self, param, kwargs[param])
+        self.inputs += list(Soil._extra_class_inputs)
+        self._set_init_values(kwargs, self.inputs)
+        if type(self) is Soil:
+            self._share_inputs()
+
+    def _set_init_values(self, kwargs, inputs):
+        conflicts = self.set_many(OrderedDict([(param, kwargs[param]) for param in kwargs if param in inputs]))
+        if conflicts:
+            raise ModelError("Soil parameters are inconsistent: %s" % ", ".join(conflicts))
 
     @property
     def ancestor_types(self):
@@ -101,6 +256,11 @@ class Soil(PhysicalObject):
         parent_ancestor_types = super(Soil, self).ancestor_types
         return parent_ancestor_types + ["soil"]
 
+    def to_dict(self, extra=(), **kwargs):
+        if self._depth_variations:
+            extra = tuple(extra) + ("depth_variations",)
+        return super(Soil, self).to_dict(extra=extra, **kwargs)
+
     def override(self, item, value):
         """
         Can set a parameter to a value that is inconsistent with existing values.
@@ -120,44 +280,154 @@ class Soil(PhysicalObject):
             return []
         except ModelError:
             pass  # if inconsistency, then need to rebuild stack
-        # create a new temporary stack
-        temp_stack = list(self.stack)
-        # remove item from original position in stack
-        temp_stack[:] = (value for value in temp_stack if value[0] != item)
-        # add item to the start of the stack
-        temp_stack.insert(0, (item, value))
+        # create a new temporary stack with the item at the start
+        temp_stack = OrderedDict([(item, value)])
+        for name in self.stack:
+            if name != item:
+                temp_stack[name] = self.stack[name]
         # clear object, ready to rebuild
         self.reset_all()
-        # reapply trace, one item at a time, if conflict then don't add the conflict.
+        # reapply in a single pass, if conflict then don't add the conflict.
+        conflicts = self.set_many(temp_stack)
+        return conflicts
+
+    def set_many(self, values):
+        """
+        Sets many parameters at once, the dependent parameters are derived in a single pass.
+
+        If the values are inconsistent, then the object is restored and the values are set one at a time,
+        values that are inconsistent with previously set values are not set and are returned as a list.
+
+        :param values: dict, parameter names and values
+        :return: list, conflicting values
+        """
         conflicts = []
-        for item, value in temp_stack:
-            # catch all conflicts
+        graph_values = [OrderedDict() for graph in self._dependency_graphs]
+        for item in values:
+            for i, graph in enumerate(self._dependency_graphs):
+                if item in graph:
+                    value = clean_float(values[item])
+                    if value is not None:
+                        graph_values[i][item] = value
+                    break
+            else:  # strength, liquid and other parameters that are not derived
+                try:
+                    setattr(self, item, values[item])
+                except ModelError:
+                    conflicts.append(item)
+        for i, graph in enumerate(self._dependency_graphs):
+            if not graph_values[i]:
+                continue
+            tol = self._tolerance if graph is WEIGHT_AND_VOID_DEPENDENTS else 0.001
+            snapshot = [(item, getattr(self, "_" + item)) for item in graph]
+            for item in graph_values[i]:
+                setattr(self, "_" + item, graph_values[i][item])
             try:
-                setattr(self, item, value)
-                if item in ['gravity', 'wmd', 'liq_sg']:
-                    self._add_to_stack(item, value)
+                self._recompute_dependents(graph, graph_values[i], tolerances=dict.fromkeys(graph_values[i], tol))
             except ModelError:
-                conflicts.append(item)
+                for item, value in snapshot:
+                    setattr(self, "_" + item, value)
+                for item in graph_values[i]:  # set one at a time to find the conflicts
+                    try:
+                        setattr(self, item, graph_values[i][item])
+                    except ModelError:
+                        conflicts.append(item)
+                continue
+            for item in graph_values[i]:
+                self._add_to_stack(item, graph_values[i][item])
+        return conflicts
+
+    def set_trusted(self, values, verify=True):
+        """
+        Sets many parameters that are already known to be consistent (e.g. saved by `to_dict`).
+
+        The weight, void and stiffness parameters are assigned directly, without deriving the dependent
+        parameters, and the stack is rebuilt in a single pass. The resulting stack is the same as if the
+        values had been set using `set_many`.
+
+        :param values: dict, parameter names and values, a 'unique_hash' is stored as the loaded hash
+        :param verify: bool or 'lazy', if True then the consistency is checked now, if 'lazy' then it is
+            checked the first time a weight, void or stiffness parameter is read, if False it is not checked
+        :return: list, conflicting values (of parameters that are not derived)
+        """
+        conflicts = []
+        graph_values = [[] for graph in self._dependency_graphs]
+        for item in values:
+            value = values[item]
+            if item == 'unique_hash':
+                self._loaded_unique_hash = value
+                continue
+            if value is None:
+                continue
+            for i, graph in enumerate(self._dependency_graphs):
+                if item in graph:
+                    graph_values[i].append(item)
+                    setattr(self, "_" + item, value)
+                    break
+            else:
+                try:
+                    setattr(self, item, value)
+                except ModelError:
+                    conflicts.append(item)
+        for items in graph_values:
+            for item in items:
+                self._add_to_stack(item, values[item])
+        if verify == 'lazy':
+            self._unverified = True
+        elif verify:
+            self.verify_consistency()
         return conflicts
 
+    def verify_consistency(self):
+        """
+        Checks that the parameters that can be derived from other parameters are consistent with them.
+
+        Raises a ModelError that lists the inconsistent parameters.
+        """
+        self._unverified = False
+        inconsistent = []
+        for graph in self._dependency_graphs:
+            if graph is WEIGHT_AND_VOID_DEPENDENTS:
+                relations, tol = WEIGHT_AND_VOID_RELATIONS, self._tolerance
+            else:
+                relations, tol = STIFFNESS_RELATIONS, 0.001
+            for target, req, fn in relations:
+                curr_value = getattr(self, "_" + target)
+                values = [getattr(self, "_" + name) for name in req]
+                if curr_value is None or None in values or target in inconsistent:
+                    continue
+                try:
+                    value = fn(self, *values)
+                except (TypeError, ZeroDivisionError):
+                    continue
+                if not ct.isclose(curr_value, value, rel_tol=tol):
+                    inconsistent.append(target)
+        if inconsistent:
+            raise ModelError("Soil parameters are inconsistent: %s" % ", ".join(inconsistent))
+
     def reset_all(self):
         """
         Resets all parameters to None
         """
         for item in self.inputs:
             setattr(self, "_%s" % item, None)
-        self.stack = []
+        self.stack = {}
 
     def _add_to_stack(self, item, value):
         """
         Add a parameter-value pair to the stack of parameters that have been set.
+
+        The stack stores the last value of each parameter, in the order that the parameters were set.
+
         :param item:
         :param value:
         :return:
         """
-        p_value = (item, value)
-        if p_value not in self.stack:
-            self.stack.append(p_value)
+        if item in self.stack:
+            if self.stack[item] == value:
+                return
+            del self.stack[item]
+        self.stack[item] = value
 
     @property
     def id(self):
@@ -186,16 +456,22 @@ class Soil(PhysicalObject):
     @property
     def unit_dry_weight(self):
         """The unit weight of the soil if saturation=0"""
+        if self._unverified:
+            self.verify_consistency()
         return self._unit_dry_weight
 
     @property
     def e_curr(self):
         """The current void ratio of the soil"""
+        if self._unverified:
+            self.verify_consistency()
         return self._e_curr
 
     @property
     def specific_gravity(self):
         """The specific gravity of the soil"""
+        if self._unverified:
+            self.verify_consistency()
         return self._specific_gravity
 
     @property
@@ -211,6 +487,7 @@ class Soil(PhysicalObject):
     @wmd.setter
     def wmd(self, value):
         self._wmd = value
+        self._add_to_stack("wmd", value)
 
     @property
     def liq_mass_density(self):
@@ -227,15 +504,16 @@ class Soil(PhysicalObject):
     @gravity.setter
     def gravity(self, value):
         self._gravity = value
+        self._add_to_stack("gravity", value)
 
     @g.setter
     def g(self, value):
-        self._gravity = value
+        self.gravity = value
 
     @liq_mass_density.setter
     def liq_mass_density(self, value):
         deprecation('liq_mass_density has deprecated, set liq_sg or wmd')
-        self._wmd = value / self.liq_sg
+        self.wmd = value / self.liq_sg
 
     @property
     def ulw(self):
@@ -245,6 +523,8 @@ class Soil(PhysicalObject):
     @property
     def saturation(self):
         """The current saturation of the soil"""
+        if self._unverified:
+            self.verify_consistency()
         return self._saturation
 
     @property
@@ -273,11 +553,15 @@ class Soil(PhysicalObject):
     @property
     def unit_sat_weight(self):
         """The weight of the soil if saturation=1"""
+        if self._unverified:
+            self.verify_consistency()
         return self._unit_sat_weight
 
     @property
     def unit_moist_weight(self):
         """The unit moist weight of the soil (accounts for saturation level)"""
+        if self._unverified:
+            self.verify_consistency()
         return self._unit_moist_weight
 
     @property
@@ -359,6 +643,60 @@ class Soil(PhysicalObject):
         else:
             return self.unit_dry_mass
 
+    @property
+    def depth_variations(self):
+        """
+        Parameters that vary with depth within a soil layer, list of (parameter, gradient, exponent, ref_depth)
+
+        See `set_depth_variation`.
+        """
+        if not self._depth_variations:
+            return []
+        return [(item,) + self._depth_variations[item] for item in self._depth_variations]
+
+    @depth_variations.setter
+    def depth_variations(self, values):
+        self._depth_variations = None
+        for value in values:
+            self.set_depth_variation(*value)
+
+    def set_depth_variation(self, item, gradient=0.0, exponent=0.0, ref_depth=1.0):
+        """
+        Sets a parameter to vary with the depth below the top of the layer that contains the soil.
+
+        The value of the parameter is the value of the soil at the top of the layer, `value`, multiplied by
+        `(1 + dz / ref_depth) ** exponent`, plus `gradient * dz`, where `dz` is the depth below the top of the
+        layer (see `calc_depth_varying_value`). The unit weights are integrated in closed form
+        to compute the stresses in a `SoilProfile`.
+
+        :param item: str, name of the parameter (e.g. 'unit_sat_weight', 'shear_vel', 'g_mod')
+        :param gradient: float, linear increase per unit depth
+        :param exponent: float, exponent of the power law
+        :param ref_depth: float, depth at which the power law factor is 2 ** exponent
+        """
+        gradient = float(gradient)
+        exponent = float(exponent)
+        ref_depth = float(ref_depth)
+        if ref_depth <= 0:
+            raise ModelError("ref_depth must be positive, not {0}".format(ref_depth))
+        if self._depth_variations is None:
+            self._depth_variations = OrderedDict()
+        if gradient == 0 and exponent == 0:
+            self._depth_variations.pop(item, None)
+        else:
+            self._depth_variations[item] = (gradient, exponent, ref_depth)
+
+    def get_depth_variation(self, item):
+        """
+        Coefficients of a parameter that varies with depth
+
+        :param item: str, name of the parameter
+        :return: tuple, (gradient, exponent, ref_depth), or None if the parameter does not vary with depth
+        """
+        if self._depth_variations is None:
+            return None
+        return self._depth_variations.get(item)
+
     @property
     def permeability(self):
         """The permeability of the soil"""
@@ -381,38 +719,50 @@ class Soil(PhysicalObject):
     @property
     def g_mod(self):
         """Shear modulus of the soil"""
+        if self._unverified:
+            self.verify_consistency()
         return self._g_mod
 
     @property
     def bulk_mod(self):
         """Bulk modulus of the soil"""
+        if self._unverified:
+            self.verify_consistency()
         return self._bulk_mod
 
     @property
     def poissons_ratio(self):
         """Poisson's ratio of the soil"""
+        if self._unverified:
+            self.verify_consistency()
         return self._poissons_ratio
 
     @property
     def e_min(self):
         """The minimum void ratio"""
+        if self._unverified:
+            self.verify_consistency()
         return self._e_min
 
     @property
     def e_max(self):
         """The maximum void ratio"""
+        if self._unverified:
+            self.verify_consistency()
         return self._e_max
 
     @property
     def relative_density(self):
         """The relative density :math (e_max - e_curr) / (.e_max - .e_min)"""
+        if self._unverified:
+            self.verify_consistency()
         return self._relative_density
 
     @id.setter
     def id(self, value):
         if value not in [None, ""]:
             value = int(value)
-            self.stack.append(("id", value))
+            self._add_to_stack("id", value)
             self._id = value
 
     @e_curr.setter
@@ -430,7 +780,7 @@ class Soil(PhysicalObject):
         old_value = self._e_curr
         self._e_curr = float(value)
         try:
-            self.recompute_all_weights_and_void()
+            self._recompute_dependents(WEIGHT_AND_VOID_DEPENDENTS, ["e_curr"])
             self._add_to_stack("e_curr", float(value))
         except ModelError as e:
             self._e_curr = old_value
@@ -450,7 +800,7 @@ class Soil(PhysicalObject):
         old_value = self.unit_dry_weight
         self._unit_dry_weight = value
         try:
-            self.recompute_all_weights_and_void()
+            self._recompute_dependents(WEIGHT_AND_VOID_DEPENDENTS, ["unit_dry_weight"])
             self._add_to_stack("unit_dry_weight", value)
         except ModelError as e:
             self._unit_dry_weight = old_value
@@ -470,7 +820,7 @@ class Soil(PhysicalObject):
         old_value = self.unit_sat_weight
         self._unit_sat_weight = value
         try:
-            self.recompute_all_weights_and_void()
+            self._recompute_dependents(WEIGHT_AND_VOID_DEPENDENTS, ["unit_sat_weight"])
             self._add_to_stack("unit_sat_weight", value)
         except ModelError as e:
             self._unit_sat_weight = old_value
@@ -490,7 +840,7 @@ class Soil(PhysicalObject):
         old_value = self.unit_moist_weight
         self._unit_moist_weight = value
         try:
-            self.recompute_all_weights_and_void()
+            self._recompute_dependents(WEIGHT_AND_VOID_DEPENDENTS, ["unit_moist_weight"])
             self._add_to_stack("unit_moist_weight", value)
         except ModelError as e:
             self._unit_moist_weight = old_value
@@ -514,7 +864,7 @@ class Soil(PhysicalObject):
         old_value = self.saturation
         self._saturation = value
         try:
-            self.recompute_all_weights_and_void()
+            self._recompute_dependents(WEIGHT_AND_VOID_DEPENDENTS, ["saturation"])
             self._add_to_stack("saturation", value)
         except ModelError as e:
             self._saturation = old_value
@@ -534,7 +884,7 @@ class Soil(PhysicalObject):
         old_value = self.relative_density
         self._relative_density = value
         try:
-            self.recompute_all_weights_and_void()
+            self._recompute_dependents(WEIGHT_AND_VOID_DEPENDENTS, ["relative_density"])
             self._add_to_stack("relative_density", value)
         except ModelError as e:
             self._relative_density = old_value
@@ -550,27 +900,42 @@ class Soil(PhysicalObject):
         if specific_gravity is not None and not ct.isclose(specific_gravity, value, rel_tol=self._tolerance):
             raise ModelError("specific gravity is inconsistent with set unit_dry_weight and void_ratio")
 
+        old_value = self.specific_gravity
         self._specific_gravity = float(value)
-        self.stack.append(("specific_gravity", float(value)))
-        self.recompute_all_weights_and_void()
+        try:
+            self._recompute_dependents(WEIGHT_AND_VOID_DEPENDENTS, ["specific_gravity"])
+        except ModelError as e:
+            self._specific_gravity = old_value
+            raise ModelError(e)
+        self._add_to_stack("specific_gravity", float(value))
 
     @e_min.setter
     def e_min(self, value):
         value = clean_float(value)
         if value is None:
             return
+        old_value = self.e_min
         self._e_min = value
-        self.stack.append(("e_min", value))
-        self.recompute_all_weights_and_void()
+        try:
+            self._recompute_dependents(WEIGHT_AND_VOID_DEPENDENTS, ["e_min"])
+        except ModelError as e:
+            self._e_min = old_value
+            raise ModelError(e)
+        self._add_to_stack("e_min", value)
 
     @e_max.setter
     def e_max(self, value):
         value = clean_float(value)
         if value is None:
             return
+        old_value = self.e_max
         self._e_max = float(value)
-        self.stack.append(("e_max", value))
-        self.recompute_all_weights_and_void()
+        try:
+            self._recompute_dependents(WEIGHT_AND_VOID_DEPENDENTS, ["e_max"])
+        except ModelError as e:
+            self._e_max = old_value
+            raise ModelError(e)
+        self._add_to_stack("e_max", value)
 
     @phi.setter
     def phi(self, value):
@@ -578,7 +943,7 @@ class Soil(PhysicalObject):
         if value is None:
             return
         self._phi = value
-        self.stack.append(("phi", value))
+        self._add_to_stack("phi", value)
 
     @cohesion.setter
     def cohesion(self, value):
@@ -586,7 +951,7 @@ class Soil(PhysicalObject):
         if value is None:
             return
         self._cohesion = value
-        self.stack.append(("cohesion", value))
+        self._add_to_stack("cohesion", value)
 
     @porosity.setter
     def porosity(self, value):
@@ -594,7 +959,7 @@ class Soil(PhysicalObject):
         if value is None:
             return
         self._e_curr = value / (1 - value)
-        self.stack.append(("e_curr", value))  # note that it is the set store variable that goes in the stack
+        self._add_to_stack("e_curr", self._e_curr)  # note that it is the set store variable that goes in the stack
 
     @dilation_angle.setter
     def dilation_angle(self, value):
@@ -602,7 +967,7 @@ class Soil(PhysicalObject):
         if value is None:
             return
         self._dilation_angle = value
-        self.stack.append(("dilation_angle", value))
+        self._add_to_stack("dilation_angle", value)
 
     @permeability.setter
     def permeability(self, value):
@@ -610,7 +975,7 @@ class Soil(PhysicalObject):
         if value is None:
             return
         self._permeability = value
-        self.stack.append(("permeability", value))
+        self._add_to_stack("permeability", value)
 
     @g_mod.setter
     def g_mod(self, value):
@@ -623,7 +988,7 @@ class Soil(PhysicalObject):
         old_value = self.g_mod
         self._g_mod = value
         try:
-            self.recompute_all_stiffness_parameters()
+            self._recompute_dependents(STIFFNESS_DEPENDENTS, ["g_mod"])
             self._add_to_stack("g_mod", value)
         except ModelError as e:
             self._g_mod = old_value
@@ -640,7 +1005,7 @@ class Soil(PhysicalObject):
         old_value = self.bulk_mod
         self._bulk_mod = value
         try:
-            self.recompute_all_stiffness_parameters()
+            self._recompute_dependents(STIFFNESS_DEPENDENTS, ["bulk_mod"])
             self._add_to_stack("bulk_mod", value)
         except ModelError as e:
             self._bulk_mod = old_value
@@ -657,7 +1022,7 @@ class Soil(PhysicalObject):
         old_value = self.poissons_ratio
         self._poissons_ratio = value
         try:
-            self.recompute_all_stiffness_parameters()
+            self._recompute_dependents(STIFFNESS_DEPENDENTS, ["poissons_ratio"])
             self._add_to_stack("poissons_ratio", value)
         except ModelError as e:
             self._poissons_ratio = old_value
@@ -728,6 +1093,7 @@ class Soil(PhysicalObject):
         if self.liq_sg is not None and self.liq_sg != value:
             raise ModelError(f"New liq_sg ({value:.3g}) is inconsistent with current value ({self.liq_sg:.3g})")
         self._liq_sg = value
+        self._add_to_stack("liq_sg", value)
 
     def _calc_specific_gravity(self):
         try:
@@ -783,6 +1149,52 @@ class Soil(PhysicalObject):
         except TypeError:
             return None
 
+    def _recompute_dependents(self, graph, items, tolerances=None):
+        """
+        Computes the parameters that depend on parameters that have been set.
+
+        Only the relationships that require a changed parameter are evaluated, propagation stops at
+        parameters that are already defined (these are only checked for consistency).
+        If an inconsistency is found, then all parameters computed here are reset to None.
+
+        :param graph: dict, parameter name and list of relationships that require it
+        :param items: names of the parameters that have been set
+        :param tolerances: dict, relative tolerance used to check the consistency of a parameter (default=0.001)
+        """
+        if tolerances is None:
+            tolerances = {}
+        computed = []
+        evaluated = set()  # a relationship only needs to be evaluated once all of its parameters are defined
+        queue = []
+        for item in items:
+            queue += graph.get(item, ())
+        try:
+            while queue:
+                relation = queue.pop(0)
+                if id(relation) in evaluated:
+                    continue
+                target, req, fn = relation
+                values = [getattr(self, "_" + name) for name in req]
+                if None in values:
+                    continue
+                evaluated.add(id(relation))
+                try:
+                    value = fn(self, *values)
+                except (TypeError, ZeroDivisionError):
+                    continue
+                curr_value = getattr(self, "_" + target)
+                if curr_value is not None:
+                    if not ct.isclose(curr_value, value, rel_tol=tolerances.get(target, 0.001)):
+                        raise ModelError(f"new _{target} is inconsistent with current value ({curr_value}, {value})")
+                    continue
+                setattr(self, "_" + target, value)
+                computed.append(target)
+                queue += graph.get(target, ())
+        except ModelError:
+            for name in computed:
+                setattr(self, "_" + name, None)
+            raise
+
     def recompute_all_weights_and_void(self):
         # TODO: catch potential inconsistency when void ratio get defined based on weight and the again from saturation
         f_map = OrderedDict()
@@ -849,29 +1261,218 @@ class Soil(PhysicalObject):
             return None
 
 
+def calc_e_critical(m_eff_stress, e_cr0, p_cr0, lamb_crl):
+    """
+    Void ratio of the critical state line at a mean effective stress,
+    :math:`e_{cr} = e_{cr0} - \\lambda \\ln(p' / p_{cr0})`
+
+    All inputs are broadcast together, so they can be arrays of stresses and/or arrays of soil parameters.
+
+    :param m_eff_stress: float or array_like, mean effective stress
+    :param e_cr0: float or array_like, critical void ratio at `p_cr0`
+    :param p_cr0: float or array_like, reference mean effective stress
+    :param lamb_crl: float or array_like, slope of the critical state line
+    :return: float or array_like
+    """
+    return e_cr0 - lamb_crl * np.log(m_eff_stress / p_cr0)
+
+
+def calc_state_parameter(e_curr, m_eff_stress, e_cr0, p_cr0, lamb_crl):
+    """
+    State parameter, the difference between the void ratio and the critical void ratio, :math:`\\psi = e - e_{cr}`
+
+    :param e_curr: float or array_like, current void ratio
+    :param m_eff_stress: float or array_like, mean effective stress
+    :param e_cr0: float or array_like, critical void ratio at `p_cr0`
+    :param p_cr0: float or array_like, reference mean effective stress
+    :param lamb_crl: float or array_like, slope of the critical state line
+    :return: float or array_like
+    """
+    return e_curr - calc_e_critical(m_eff_stress, e_cr0, p_cr0, lamb_crl)
+
+
+def calc_critical_stress_ratio(phi):
+    """
+    Critical state stress ratio in triaxial compression, :math:`M = 6 \\sin \\phi / (3 - \\sin \\phi)`
+
+    :param phi: float or array_like, critical state friction angle [degrees]
+    :return: float or array_like
+    """
+    sin_phi = np.sin(np.radians(phi))
+    return 6 * sin_phi / (3 - sin_phi)
+
+
 class CriticalSoil(Soil):
     # critical state parameters
-    e_cr0 = 0.0
-    p_cr0 = 0.0
-    lamb_crl = 0.0
+    _e_cr0 = 0.0
+    _p_cr0 = 0.0
+    _lamb_crl = 0.0
     type = "critical_soil"
+    _extra_class_inputs = ["e_cr0", "p_cr0", "lamb_crl"]
 
     def __init__(self, wmd=None, liq_mass_density=None, g=9.8,  **kwargs):
         # run parent class initialiser function
         super(CriticalSoil, self).__init__(wmd=wmd, liq_mass_density=liq_mass_density, g=g, **kwargs)
-        self._extra_class_inputs = ["e_cr0", "p_cr0", "lamb_crl"]
-        self.inputs = self.inputs + self._extra_class_inputs
-        for param in kwargs:
-            if param in self.inputs:
-                setattr(self, param, kwargs[param])
+        self.inputs = self.inputs + CriticalSoil._extra_class_inputs
+        self._set_init_values(kwargs, CriticalSoil._extra_class_inputs)
+        if type(self) is CriticalSoil:
+            self._share_inputs()
 
     @property
     def ancestor_types(self):
         return super(CriticalSoil, self).ancestor_types + [self.type]
 
+    @property
+    def e_cr0(self):
+        """Critical void ratio at the reference mean effective stress `p_cr0`"""
+        return self._e_cr0
+
+    @e_cr0.setter
+    def e_cr0(self, value):
+        value = clean_float(value)
+        if value is None:
+            return
+        self._e_cr0 = value
+        self._add_to_stack("e_cr0", value)
+
+    @property
+    def p_cr0(self):
+        """Reference mean effective stress of the critical state line"""
+        return self._p_cr0
+
+    @p_cr0.setter
+    def p_cr0(self, value):
+        value = clean_float(value)
+        if value is None:
+            return
+        self._p_cr0 = value
+        self._add_to_stack("p_cr0", value)
+
+    @property
+    def lamb_crl(self):
+        """Slope of the critical state line in e-ln(p') space"""
+        return self._lamb_crl
+
+    @lamb_crl.setter
+    def lamb_crl(self, value):
+        value = clean_float(value)
+        if value is None:
+            return
+        self._lamb_crl = value
+        self._add_to_stack("lamb_crl", value)
+
+    @property
+    def critical_stress_ratio(self):
+        """Critical state stress ratio (M) in triaxial compression, computed from `phi`"""
+        if self.phi is None:
+            return None
+        return calc_critical_stress_ratio(self.phi)
+
     def e_critical(self, p):
-        p = float(p)
-        return self.e_cr0 - self.lamb_crl * np.log(p / self.p_cr0)
+        """
+        Void ratio of the critical state line at a mean effective stress
+
+        :param p: float or array_like, mean effective stress
+        :return: float or array_like
+        """
+        if not np.ndim(p):
+            p = float(p)
+        return calc_e_critical(p, self.e_cr0, self.p_cr0, self.lamb_crl)
+
+    def get_state_parameter_at_m_eff_stress(self, m_eff_stress):
+        """
+        State parameter at a mean effective stress using the current void ratio
+
+        :param m_eff_stress: float or array_like, mean effective stress
+        :return: float or array_like
+        """
+        return calc_state_parameter(self.e_curr, m_eff_stress, self.e_cr0, self.p_cr0, self.lamb_crl)
+
+    def get_state_parameter_at_v_eff_stress(self, v_eff_stress, k0=None, plane_strain=False):
+        """
+        State parameter at a vertical effective stress using the current void ratio
+
+        :param v_eff_stress: float or array_like, vertical effective stress
+        :param k0: float or array_like, lateral earth pressure coefficient (default from poissons_ratio)
+        :param plane_strain: bool, if true then only the in-plane lateral stress is used
+        :return: float or array_like
+        """
+        if k0 is None:
+            k0 = self.k_0
+        m_eff_stress = calc_m_eff_stress_from_v_eff_stress(v_eff_stress, k0, plane_strain=plane_strain)
+        return self.get_state_parameter_at_m_eff_stress(m_eff_stress)
+
+
+def calc_m_eff_stress_from_v_eff_stress(v_eff_stress, k0, plane_strain=False):
+    """
+    Mean effective stress from the vertical effective stress and the lateral earth pressure coefficient
+
+    :param v_eff_stress: float or array_like, vertical effective stress
+    :param k0: float or array_like, lateral earth pressure coefficient
+    :param plane_strain: bool, if true then only the in-plane lateral stress is used
+    :return: float or array_like
+    """
+    if plane_strain:
+        return v_eff_stress * (1 + k0) / 2
+    return v_eff_stress * (1 + 2 * k0) / 3
+
+
+def calc_g_mod_at_m_eff_stress(m_eff_stress, g0_mod, p_atm=101000.0, a=0.5, g_mod_p0=0.0):
+    """
+    Shear modulus at a mean effective stress, :math:`G = G_0 p_{atm} (p' / p_{atm})^a + G_{p0}`
+
+    All inputs are broadcast together, so they can be arrays of stresses and/or arrays of soil parameters.
+
+    :param m_eff_stress: float or array_like, mean effective stress
+    :param g0_mod: float or array_like, normalised shear modulus
+    :param p_atm: float or array_like, atmospheric pressure
+    :param a: float or array_like, stress factor
+    :param g_mod_p0: float or array_like, shear modulus at zero confining stress
+    :return: float or array_like
+    """
+    return g0_mod * p_atm * (m_eff_stress / p_atm) ** a + g_mod_p0
+
+
+def calc_g_mod_at_v_eff_stress(v_eff_stress, g0_mod, poissons_ratio=None, p_atm=101000.0, a=0.5, g_mod_p0=0.0,
+                               k0=None):
+    """
+    Shear modulus at a vertical effective stress
+
+    If `k0` is not set then it is computed from the Poisson's ratio, :math:`k_0 = v / (1 - v)`.
+    All inputs are broadcast together.
+
+    :param v_eff_stress: float or array_like, vertical effective stress
+    :param g0_mod: float or array_like, normalised shear modulus
+    :param poissons_ratio: float or array_like, Poisson's ratio
+    :param p_atm: float or array_like, atmospheric pressure
+    :param a: float or array_like, stress factor
+    :param g_mod_p0: float or array_like, shear modulus at zero confining stress
+    :param k0: float or array_like, lateral earth pressure coefficient
+    :return: float or array_like
+    """
+    if k0 is None:
+        k0 = poissons_ratio / (1 - poissons_ratio)
+    m_eff_stress = calc_m_eff_stress_from_v_eff_stress(v_eff_stress, k0)
+    return calc_g_mod_at_m_eff_stress(m_eff_stress, g0_mod, p_atm, a, g_mod_p0)
+
+
+def calc_shear_vel(g_mod, unit_dry_mass, unit_sat_mass, saturated):
+    """
+    Shear wave velocity from the shear modulus and the dry or saturated mass
+
+    :param g_mod: float or array_like, shear modulus
+    :param unit_dry_mass: float or array_like, dry unit mass
+    :param unit_sat_mass: float or array_like, saturated unit mass
+    :param saturated: bool or array_like of bool, if true then use saturated mass
+    :return: float or array_like
+    """
+    if np.ndim(saturated):
+        unit_mass = np.where(saturated, _nan_if_none(unit_sat_mass), _nan_if_none(unit_dry_mass))
+    elif saturated:
+        unit_mass = unit_sat_mass
+    else:
+        unit_mass = unit_dry_mass
+    return np.sqrt(g_mod / unit_mass)
 
 
 class StressDependentSoil(Soil):
@@ -881,15 +1482,16 @@ class StressDependentSoil(Soil):
     _a = 0.5  # stress factor
     _g_mod_p0 = 0.0  # shear modulus at zero confining stress
     _curr_m_eff_stress = None
+    _dependency_graphs = (WEIGHT_AND_VOID_DEPENDENTS,)  # stiffness depends on stress
+    _extra_class_inputs = ["g0_mod", "p_atm", "a"]
 
     def __init__(self, pw=None, wmd=None, liq_mass_density=None, liq_sg=1, g=9.8, **kwargs):
 
         super(StressDependentSoil, self).__init__(pw=pw, wmd=wmd, liq_mass_density=liq_mass_density, liq_sg=liq_sg, g=g, **kwargs)
-        self._extra_class_inputs = ["g0_mod", "p_atm", "a"]
-        self.inputs = self.inputs + self._extra_class_inputs
-        for param in kwargs:
-            if param in self.inputs:
-                setattr(self, param, kwargs[param])
+        self.inputs = self.inputs + StressDependentSoil._extra_class_inputs
+        self._set_init_values(kwargs, StressDependentSoil._extra_class_inputs)
+        if type(self) is StressDependentSoil:
+            self._share_inputs()
 
     @property
     def ancestor_types(self):
@@ -993,43 +1595,87 @@ class StressDependentSoil(Soil):
         if value is not None:
             self._add_to_stack("p_atm", float(value))
 
+    def _get_k0(self, k0=None):
+        if k0 is None:
+            return self._poissons_ratio / (1 - self._poissons_ratio)
+        return k0
+
     def get_g_mod_at_v_eff_stress(self, v_eff_stress, k0=None):
+        """
+        Shear modulus at a vertical effective stress
+
+        :param v_eff_stress: float or array_like, vertical effective stress
+        :param k0: float or array_like, lateral earth pressure coefficient (default from poissons_ratio)
+        :return: float or array_like
+        """
         # k0 = 1 - np.sin(self.phi_r)
-        if k0 is None:
-            k0 = self.poissons_ratio / (1 - self.poissons_ratio)
-        return self.g0_mod * self.p_atm * (v_eff_stress * (1 + 2 * k0) / 3 / self.p_atm) ** self.a + self.g_mod_p0
+        m_eff_stress = calc_m_eff_stress_from_v_eff_stress(v_eff_stress, self._get_k0(k0))
+        return calc_g_mod_at_m_eff_stress(m_eff_stress, self._g0_mod, self._p_atm, self._a, self._g_mod_p0)
 
     def set_g0_mod_at_v_eff_stress(self, v_eff_stress, g_mod, g_mod_p0=None, k0=None, plane_strain=False):
+        """
+        Sets the normalised shear modulus from the shear modulus at a vertical effective stress
+
+        If arrays of stresses and shear moduli are given, then `g0_mod` is fit using least squares.
+
+        :param v_eff_stress: float or array_like, vertical effective stress
+        :param g_mod: float or array_like, shear modulus at each stress
+        :param g_mod_p0: float, shear modulus at zero confining stress
+        :param k0: float, lateral earth pressure coefficient (default from poissons_ratio)
+        :param plane_strain: bool, if true then only the in-plane lateral stress is used
+        """
         if g_mod_p0 is not None:
             self.g_mod_p0 = g_mod_p0
-        if k0 is None:
-            k0 = self.poissons_ratio / (1 - self.poissons_ratio)
-        if plane_strain:
-            m = self.p_atm * (v_eff_stress * (1 + k0) / 2 / self.p_atm) ** self.a
+        m_eff_stress = calc_m_eff_stress_from_v_eff_stress(v_eff_stress, self._get_k0(k0), plane_strain=plane_strain)
+        self._set_g0_mod_from_m_eff_stress(m_eff_stress, g_mod)
+
+    def _set_g0_mod_from_m_eff_stress(self, m_eff_stress, g_mod):
+        m = self._p_atm * (np.asarray(m_eff_stress) / self._p_atm) ** self._a
+        g_mod = np.asarray(g_mod) - self._g_mod_p0
+        if np.ndim(m) or np.ndim(g_mod):
+            m, g_mod = np.broadcast_arrays(m, g_mod)
+            self.g0_mod = np.sum(m * g_mod) / np.sum(m ** 2)
         else:
-            m = self.p_atm * (v_eff_stress * (1 + 2 * k0) / 3 / self.p_atm) ** self.a
-        self.g0_mod = (g_mod - self.g_mod_p0) / m
+            self.g0_mod = g_mod / m
 
     def set_curr_m_eff_stress_from_g_mod(self, g_mod):
         self._curr_m_eff_stress = ((g_mod - self.g_mod_p0) / (self.g0_mod * self.p_atm)) ** (1. / self.a) * self.p_atm
         # self._curr_m_eff_stress = (g_mod - self.g_mod_p0) / self.g0_mod
 
     def get_g_mod_at_m_eff_stress(self, m_eff_stress):
-        return self.g0_mod * self.p_atm * (m_eff_stress / self.p_atm) ** self.a + self.g_mod_p0
+        """
+        Shear modulus at a mean effective stress
+
+        :param m_eff_stress: float or array_like, mean effective stress
+        :return: float or array_like
+        """
+        return calc_g_mod_at_m_eff_stress(m_eff_stress, self._g0_mod, self._p_atm, self._a, self._g_mod_p0)
 
     def set_g0_mod_at_m_eff_stress(self, m_eff_stress, g_mod, g_mod_p0=None):
+        """
+        Sets the normalised shear modulus from the shear modulus at a mean effective stress
+
+        If arrays of stresses and shear moduli are given, then `g0_mod` is fit using least squares.
+
+        :param m_eff_stress: float or array_like, mean effective stress
+        :param g_mod: float or array_like, shear modulus at each stress
+        :param g_mod_p0: float, shear modulus at zero confining stress
+        """
         if g_mod_p0 is not None:
             self.g_mod_p0 = g_mod_p0
-        m = self.p_atm * (m_eff_stress / self.p_atm) ** self.a
-        self.g0_mod = (g_mod - self.g_mod_p0) / m
+        self._set_g0_mod_from_m_eff_stress(m_eff_stress, g_mod)
 
     def get_shear_vel_at_v_eff_stress(self, v_eff_stress, saturated):
+        """
+        Shear wave velocity at a vertical effective stress
+
+        :param v_eff_stress: float or array_like, vertical effective stress
+        :param saturated: bool or array_like of bool, if true then use saturated mass
+        :return: float or array_like
+        """
         try:
             g_mod = self.get_g_mod_at_v_eff_stress(v_eff_stress)
-            if saturated:
-                return np.sqrt(g_mod / self.unit_sat_mass)
-            else:
-                return np.sqrt(g_mod / self.unit_dry_mass)
+            return calc_shear_vel(g_mod, self.unit_dry_mass, self.unit_sat_mass, saturated)
         except TypeError:
             return None
 
@@ -1046,6 +1692,626 @@ class StressDependentSoil(Soil):
         return self.get_shear_vel_at_v_eff_stress(v_eff_stress, saturated)
 
 
+class SoilTable(object):
+    """
+    Stores the parameters of many soils as columns of numpy arrays (structure-of-arrays)
+
+    Parameters that are not defined are NaN, and columns that are not defined for any soil are not stored.
+
+    :param n: int, number of soils
+    :param soil_class: class of the soils (default=Soil)
+    :param kwargs: parameter names and values (scalar or array) for each soil
+    """
+    parameters = (
+        "g_mod",
+        "bulk_mod",
+        "poissons_ratio",
+        "phi",
+        "dilation_angle",
+        "e_min",
+        "e_max",
+        "e_curr",
+        "relative_density",
+        "specific_gravity",
+        "unit_dry_weight",
+        "unit_sat_weight",
+        "unit_moist_weight",
+        "saturation",
+        "cohesion",
+        "plasticity_index",
+        "permeability",
+        "gravity",
+        "wmd",
+        "liq_sg",
+        "g0_mod",
+        "p_atm",
+        "a",
+        "g_mod_p0",
+        "curr_m_eff_stress",
+        "e_cr0",
+        "p_cr0",
+        "lamb_crl"
+    )
+    _defaults = {"gravity": 9.8, "wmd": 1000., "liq_sg": 1.}
+
+    def __init__(self, n, soil_class=None, **kwargs):
+        self._n = int(n)
+        self._columns = OrderedDict()
+        if soil_class is None:
+            soil_class = Soil
+        self.soil_classes = [soil_class]
+        self.class_inds = np.zeros(self._n, dtype=np.int16)  # index of the soil class in `soil_classes`
+        self.ids = None  # object array, only stored if set
+        self.names = None
+        self.stacks = None  # object array of the names of the parameters that were set on each soil
+        self.int_items = None  # object array of the names of the parameters of each soil that were ints
+        for item in self._defaults:
+            self[item] = self._defaults[item]
+        for item in kwargs:
+            self[item] = kwargs[item]
+
+    def __len__(self):
+        return self._n
+
+    def __repr__(self):
+        return "SoilTable n: {0}, columns: {1}".format(self._n, list(self._columns))
+
+    def __getitem__(self, item):
+        if item in self._columns:
+            return self._columns[item]
+        if item in self.parameters:
+            return np.full(self._n, np.nan)
+        raise KeyError("SoilTable does not store parameter: {0}".format(item))
+
+    def __setitem__(self, item, values):
+        if item not in self.parameters:
+            raise KeyError("SoilTable does not store parameter: {0}".format(item))
+        if np.ndim(values) == 0:
+            values = _nan_if_none(values)
+        elif not isinstance(values, np.ndarray) or values.dtype == object:
+            values = [_nan_if_none(value) for value in values]
+        self._columns[item] = np.array(np.broadcast_to(np.asarray(values, dtype=float), (self._n,)))
+
+    def __getattr__(self, item):
+        if item in SoilTable.parameters:
+            return self[item]
+        raise AttributeError("'SoilTable' object has no attribute '{0}'".format(item))
+
+    @property
+    def columns(self):
+        """Names of the stored columns"""
+        return list(self._columns)
+
+    @classmethod
+    def from_soils(cls, soils):
+        """
+        Create a table from a list of soil objects
+
+        :param soils: list of Soil objects
+        :return: SoilTable
+        """
+        soils = list(soils)
+        table = cls(len(soils))
+        classes = []
+        for sl in soils:
+            if type(sl) not in classes:
+                classes.append(type(sl))
+        table.soil_classes = classes
+        table.class_inds = np.array([classes.index(type(sl)) for sl in soils], dtype=np.int16)
+        int_items = [[] for sl in soils]
+        for item in cls.parameters:
+            values = [_get_stored_soil_value(sl, item) for sl in soils]
+            if item in cls._defaults or any(value is not None for value in values):
+                table[item] = values
+            for i, value in enumerate(values):
+                if isinstance(value, int) and not isinstance(value, bool):
+                    int_items[i].append(item)
+        ids = [sl.id for sl in soils]
+        if any(value is not None for value in ids):
+            table.ids = np.array(ids, dtype=object)
+        names = [sl.name for sl in soils]
+        if any(value is not None for value in names):
+            table.names = np.array(names, dtype=object)
+        table.stacks = np.empty(len(soils), dtype=object)
+        table.stacks[:] = [tuple(sl.stack) for sl in soils]
+        table.int_items = np.empty(len(soils), dtype=object)
+        table.int_items[:] = [tuple(items) for items in int_items]
+        return table
+
+    @classmethod
+    def concatenate(cls, tables):
+        """
+        Create a table from the rows of many tables
+
+        :param tables: list of SoilTable objects
+        :return: SoilTable
+        """
+        tables = list(tables)
+        table = cls(sum([len(tab) for tab in tables]))
+        classes = []
+        for tab in tables:
+            for soil_class in tab.soil_classes:
+                if soil_class not in classes:
+                    classes.append(soil_class)
+        table.soil_classes = classes
+        table.class_inds = np.concatenate(
+            [np.array([classes.index(sc) for sc in tab.soil_classes], dtype=np.int16)[tab.class_inds]
+             for tab in tables])
+        for item in cls.parameters:
+            if any(item in tab.columns for tab in tables):
+                table[item] = np.concatenate([tab[item] for tab in tables])
+        for name in ("ids", "names", "stacks", "int_items"):
+            if any(getattr(tab, name) is not None for tab in tables):
+                setattr(table, name, np.concatenate([getattr(tab, name) if getattr(tab, name) is not None
+                                                     else np.full(len(tab), None) for tab in tables]))
+        return table
+
+    def take(self, inds):
+        """
+        Create a table from a selection of rows
+
+        :param inds: array_like of int, row indices, or array_like of bool, true for each selected row
+        :return: SoilTable
+        """
+        inds = np.asarray(inds)
+        if inds.dtype == bool:
+            inds = np.flatnonzero(inds)
+        inds = inds.astype(int)
+        table = type(self)(len(inds))
+        table.soil_classes = list(self.soil_classes)
+        table.class_inds = self.class_inds[inds]
+        for item in self._columns:
+            table[item] = self._columns[item][inds]
+        if self.ids is not None:
+            table.ids = self.ids[inds]
+        if self.names is not None:
+            table.names = self.names[inds]
+        if self.stacks is not None:
+            table.stacks = self.stacks[inds]
+        if self.int_items is not None:
+            table.int_items = self.int_items[inds]
+        return table
+
+    def get_soil(self, index):
+        """
+        Create a soil object from a row of the table
+
+        If the table was created from soils (see `from_soils`) then the stack of the soil is rebuilt from the
+        parameters that were set on the original soil, otherwise all the defined inputs are added to the stack.
+        Values that were ints on the original soil are restored as ints, so that the `unique_hash` is unchanged.
+
+        :param index: int, row index
+        :return: Soil object
+        """
+        soil_class = self.soil_classes[self.class_inds[index]]
+        values = OrderedDict()
+        for item in self._columns:
+            value = self._columns[item][index]
+            values[item] = None if np.isnan(value) else float(value)
+        if self.int_items is not None and self.int_items[index] is not None:
+            for item in self.int_items[index]:
+                if values.get(item) is not None:
+                    values[item] = int(values[item])
+        sl = soil_class(g=values['gravity'], wmd=values['wmd'], liq_sg=values['liq_sg'])
+        for item in values:
+            if item in ('gravity', 'wmd', 'liq_sg'):
+                continue
+            if hasattr(soil_class, "_%s" % item):
+                setattr(sl, "_%s" % item, values[item])
+            elif hasattr(soil_class, item):
+                setattr(sl, item, values[item])
+        if self.stacks is not None and self.stacks[index] is not None:
+            stack_items = self.stacks[index]
+        else:
+            stack_items = sl.inputs
+        for item in stack_items:
+            if item in values and values[item] is not None and item not in ('gravity', 'wmd', 'liq_sg'):
+                sl._add_to_stack(item, values[item])
+        if self.ids is not None and self.ids[index] is not None:
+            sl.id = self.ids[index]
+        if self.names is not None:
+            sl.name = self.names[index]
+        return sl
+
+    def to_soils(self):
+        """Create a list of soil objects from the table"""
+        return [self.get_soil(i) for i in range(self._n)]
+
+    @property
+    def unit_dry_mass(self):
+        """The mass of the soil in dry state"""
+        return self['unit_dry_weight'] / self['gravity']
+
+    @property
+    def unit_sat_mass(self):
+        """The mass of the soil when fully saturated"""
+        return self['unit_sat_weight'] / self['gravity']
+
+    @property
+    def unit_moist_mass(self):
+        """The unit moist mass of the soil (accounts for saturation level)"""
+        return self['unit_moist_weight'] / self['gravity']
+
+    @property
+    def porosity(self):
+        """Soil porosity"""
+        return self['e_curr'] / (1 + self['e_curr'])
+
+    @property
+    def bulk_mod(self):
+        """Bulk modulus of the soil, computed from g_mod and poissons_ratio if not set"""
+        bulk_mod = 2 * self['g_mod'] * (1 + self['poissons_ratio']) / (3 * (1 - 2 * self['poissons_ratio']))
+        return np.where(np.isnan(self['bulk_mod']), bulk_mod, self['bulk_mod'])
+
+    def recompute_all_weights_and_void(self, rel_tol=0.001):
+        """
+        Derives all weight and void ratio parameters for all soils in the table
+
+        :param rel_tol: float, relative tolerance used to check consistency
+        :return: array of bool, true if soil has inconsistent parameters
+        """
+        names = set([name for rel in WEIGHT_AND_VOID_RELATIONS for name in (rel[0],) + rel[1]])
+        values = OrderedDict([(item, self._columns[item]) for item in self._columns if item in names])
+        params, inconsistent = calc_consistent_soil_parameters(values, self['gravity'], self['wmd'],
+                                                               self['liq_sg'], rel_tol=rel_tol, stiffness=False)
+        self._set_derived_columns(params)
+        return inconsistent
+
+    def recompute_all_stiffness_parameters(self, rel_tol=0.001):
+        """
+        Derives `g_mod`, `bulk_mod` and `poissons_ratio` for all soils in the table (except stress dependent soils)
+
+        :param rel_tol: float, relative tolerance used to check consistency
+        :return: array of bool, true if soil has inconsistent parameters
+        """
+        use = ~np.array([issubclass(sc, StressDependentSoil) for sc in self.soil_classes])[self.class_inds]
+        inconsistent = np.zeros(self._n, dtype=bool)
+        values = OrderedDict([(item, self[item][use]) for item in ("g_mod", "bulk_mod", "poissons_ratio")])
+        params, inconsistent[use] = calc_consistent_soil_parameters(values, rel_tol=rel_tol, stiffness=True)
+        for item in values:
+            column = self[item]
+            column[use] = params[item]
+            params[item] = column
+        self._set_derived_columns(OrderedDict([(item, params[item]) for item in values]))
+        return inconsistent
+
+    def _set_derived_columns(self, params):
+        for item in params:
+            if item in self._columns or not np.isnan(params[item]).all():
+                self._columns[item] = params[item]
+
+    def get_unit_mass(self, saturated):
+        """
+        Unit mass of each soil
+
+        :param saturated: bool or array_like of bool, if true then use saturated mass
+        :return: array_like
+        """
+        return np.where(saturated, self.unit_sat_mass, self.unit_dry_mass)
+
+    def get_shear_vel(self, saturated):
+        """
+        Calculate the shear wave velocity of each soil
+
+        :param saturated: bool or array_like of bool, if true then use saturated mass
+        :return: array_like
+        """
+        return np.sqrt(self['g_mod'] / self.get_unit_mass(saturated))
+
+    def _get_rows(self, item, inds=None):
+        if inds is None:
+            return self[item]
+        return self[item][inds]
+
+    def get_g_mod_at_v_eff_stress(self, v_eff_stress, k0=None, inds=None):
+        """
+        Shear modulus of each soil at a vertical effective stress
+
+        Soils without `g0_mod` (not stress dependent) return `g_mod`.
+
+        :param v_eff_stress: float or array_like, vertical effective stress, broadcast with the soils
+        :param k0: float or array_like, lateral earth pressure coefficient (default from poissons_ratio)
+        :param inds: array_like of int, row of the table for each stress (default is all rows)
+        :return: array_like
+        """
+        g0_mod = self._get_rows('g0_mod', inds)
+        g_mod = calc_g_mod_at_v_eff_stress(v_eff_stress, g0_mod, self._get_rows('poissons_ratio', inds),
+                                           self._get_rows('p_atm', inds), self._get_rows('a', inds),
+                                           np.nan_to_num(self._get_rows('g_mod_p0', inds)), k0=k0)
+        return np.where(np.isnan(g0_mod), self._get_rows('g_mod', inds), g_mod)
+
+    def get_state_parameter_at_v_eff_stress(self, v_eff_stress, k0=None, inds=None, plane_strain=False):
+        """
+        State parameter of each soil at a vertical effective stress
+
+        Soils without critical state parameters return NaN.
+
+        :param v_eff_stress: float or array_like, vertical effective stress, broadcast with the soils
+        :param k0: float or array_like, lateral earth pressure coefficient (default from poissons_ratio)
+        :param inds: array_like of int, row of the table for each stress (default is all rows)
+        :param plane_strain: bool, if true then only the in-plane lateral stress is used
+        :return: array_like
+        """
+        if k0 is None:
+            poissons_ratio = self._get_rows('poissons_ratio', inds)
+            k0 = poissons_ratio / (1 - poissons_ratio)
+        m_eff_stress = calc_m_eff_stress_from_v_eff_stress(v_eff_stress, k0, plane_strain=plane_strain)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return calc_state_parameter(self._get_rows('e_curr', inds), m_eff_stress, self._get_rows('e_cr0', inds),
+                                        self._get_rows('p_cr0', inds), self._get_rows('lamb_crl', inds))
+
+    @property
+    def critical_stress_ratio(self):
+        """Critical state stress ratio (M) in triaxial compression of each soil, computed from `phi`"""
+        return calc_critical_stress_ratio(self['phi'])
+
+    def get_shear_vel_at_v_eff_stress(self, v_eff_stress, saturated, inds=None):
+        """
+        Shear wave velocity of each soil at a vertical effective stress
+
+        :param v_eff_stress: float or array_like, vertical effective stress, broadcast with the soils
+        :param saturated: bool or array_like of bool, if true then use saturated mass
+        :param inds: array_like of int, row of the table for each stress (default is all rows)
+        :return: array_like
+        """
+        g_mod = self.get_g_mod_at_v_eff_stress(v_eff_stress, inds=inds)
+        unit_mass = np.where(saturated, self._get_rows('unit_sat_weight', inds),
+                             self._get_rows('unit_dry_weight', inds)) / self._get_rows('gravity', inds)
+        return np.sqrt(g_mod / unit_mass)
+
+
+def _get_stored_soil_value(sl, item):
+    """Get the stored (not computed) value of a soil parameter"""
+    if hasattr(sl, "_%s" % item):
+        return getattr(sl, "_%s" % item)
+    return getattr(sl, item, None)
+
+
+_soil_state_getters = {}
+
+
+def _get_soil_state(sl):
+    """Stored values of the parameters in `SoilTable.parameters`, used to detect changes to a soil"""
+    getter = _soil_state_getters.get(type(sl))
+    if getter is None:
+        names = []
+        for item in SoilTable.parameters:
+            if hasattr(sl, "_%s" % item):
+                names.append("_%s" % item)
+            elif hasattr(sl, item):
+                names.append(item)
+        getter = attrgetter(*names)
+        _soil_state_getters[type(sl)] = getter
+    try:
+        return getter(sl)
+    except AttributeError:  # attribute only set on some objects of the class
+        return tuple(_get_stored_soil_value(sl, item) for item in SoilTable.parameters)
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class _ResultCache(object):
+    """Least recently used store of query results, cleared when the state of the soil profile changes"""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.state = None
+        self.results = OrderedDict()
+
+    def clear(self):
+        self.results.clear()
+        self.state = None
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.results))
+
+
+def _get_query_key(value):
+    """Hashable key of a query argument, arrays are represented by their shape, dtype and a hash of their data"""
+    if isinstance(value, (np.ndarray, list, tuple)):
+        values = np.asarray(value)
+        if values.dtype != object:
+            data = hashlib.blake2b(np.ascontiguousarray(values).tobytes(), digest_size=16).digest()
+            return values.shape, values.dtype.str, data
+        return tuple(_get_query_key(item) for item in value)
+    return value
+
+
+def _copy_result(value):
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, dict):
+        return OrderedDict([(item, _copy_result(value[item])) for item in value])
+    return value
+
+
+class PorePressureProfile(object):
+    """
+    Piecewise linear pore water pressure profile
+
+    The pore pressure is linearly interpolated between the defined depths. Above the first depth the pressure
+    is equal to the first pressure, and below the last depth the pressure increases hydrostatically.
+
+    :param depths: array_like, depths from the surface in increasing order
+    :param pressures: array_like, pore pressure at each depth
+    :param unit_water_weight: float, unit weight of water used below the last depth
+    """
+    type = "pore_pressure_profile"
+
+    def __init__(self, depths, pressures, unit_water_weight=9800.):
+        depths = np.array(depths, dtype=float).reshape(-1)
+        pressures = np.array(pressures, dtype=float).reshape(-1)
+        if not len(depths) or len(depths) != len(pressures):
+            raise ModelError("depths and pressures must have the same length, "
+                             "({0} != {1})".format(len(depths), len(pressures)))
+        if np.any(np.diff(depths) < 0):
+            raise ModelError("depths must be in increasing order: {0}".format(list(depths)))
+        self.depths = depths
+        self.pressures = pressures
+        self.unit_water_weight = float(unit_water_weight)
+
+    def __repr__(self):
+        return "PorePressureProfile depths: {0}, pressures: {1}".format(list(self.depths), list(self.pressures))
+
+    @classmethod
+    def from_hydrostatic(cls, gwl, unit_water_weight=9800.):
+        """
+        Hydrostatic pressure below the ground water level
+
+        :param gwl: float, depth from the surface to the ground water level
+        :param unit_water_weight: float, unit weight of water
+        """
+        return cls([gwl], [0.0], unit_water_weight)
+
+    @classmethod
+    def from_pressure_heads(cls, depths, heads, unit_water_weight=9800.):
+        """
+        Piecewise linear pressure heads
+
+        :param depths: array_like, depths from the surface in increasing order
+        :param heads: array_like, pressure head (height of water) at each depth
+        :param unit_water_weight: float, unit weight of water
+        """
+        return cls(depths, np.asarray(heads, dtype=float) * unit_water_weight, unit_water_weight)
+
+    @classmethod
+    def from_perched_water_table(cls, perched_wl, aquitard_top, aquitard_base, gwl, unit_water_weight=9800.):
+        """
+        Water perched on a low permeability layer (aquitard) above the ground water level
+
+        The pressure is hydrostatic from the perched water level to the top of the aquitard, reduces linearly to
+        zero at the base of the aquitard, is zero down to the ground water level and is hydrostatic below.
+
+        :param perched_wl: float, depth from the surface to the perched water level
+        :param aquitard_top: float, depth from the surface to the top of the aquitard
+        :param aquitard_base: float, depth from the surface to the base of the aquitard
+        :param gwl: float, depth from the surface to the ground water level
+        :param unit_water_weight: float, unit weight of water
+        """
+        if not perched_wl <= aquitard_top <= aquitard_base <= gwl:
+            raise ModelError("Must have perched_wl <= aquitard_top <= aquitard_base <= gwl")
+        depths = [perched_wl, aquitard_top, aquitard_base, gwl]
+        pressures = [0.0, (aquitard_top - perched_wl) * unit_water_weight, 0.0, 0.0]
+        return cls(depths, pressures, unit_water_weight)
+
+    @classmethod
+    def from_under_drained_layer(cls, gwl, layer_top, layer_base, base_head, unit_water_weight=9800.):
+        """
+        Layer that is drained at its base (e.g. a clay layer above a pumped aquifer)
+
+        The pressure is hydrostatic from the ground water level to the top of the layer, varies linearly to the
+        pressure head at the base of the layer, and increases hydrostatically below the layer.
+
+        :param gwl: float, depth from the surface to the ground water level
+        :param layer_top: float, depth from the surface to the top of the under drained layer
+        :param layer_base: float, depth from the surface to the base of the under drained layer
+        :param base_head: float, pressure head (height of water) at the base of the layer
+        :param unit_water_weight: float, unit weight of water
+        """
+        if not gwl <= layer_top <= layer_base:
+            raise ModelError("Must have gwl <= layer_top <= layer_base")
+        depths = [gwl, layer_top, layer_base]
+        pressures = [0.0, (layer_top - gwl) * unit_water_weight, base_head * unit_water_weight]
+        return cls(depths, pressures, unit_water_weight)
+
+    def get_pressure_at_depth(self, depth):
+        """
+        Pore pressure at a depth (or array of depths)
+
+        :param depth: float or array_like, depth from surface
+        :return: float or array_like
+        """
+        z = np.asarray(depth, dtype=float)
+        pressure = np.interp(z, self.depths, self.pressures)
+        pressure = np.where(z > self.depths[-1],
+                            self.pressures[-1] + (z - self.depths[-1]) * self.unit_water_weight, pressure)
+        if not np.ndim(depth):
+            return float(pressure)
+        return pressure
+
+    def get_pressure_head_at_depth(self, depth):
+        """
+        Pressure head (height of water) at a depth (or array of depths)
+
+        :param depth: float or array_like, depth from surface
+        :return: float or array_like
+        """
+        return self.get_pressure_at_depth(depth) / self.unit_water_weight
+
+    def to_dict(self, **kwargs):
+        outputs = OrderedDict()
+        outputs["type"] = self.type
+        outputs["depths"] = self.depths.tolist()
+        outputs["pressures"] = self.pressures.tolist()
+        outputs["unit_water_weight"] = self.unit_water_weight
+        return outputs
+
+
+def calc_depth_varying_value(value, dz, gradient=0.0, exponent=0.0, ref_depth=1.0):
+    """
+    Value of a parameter that varies with depth within a layer
+
+    Linear if `exponent=0`, and a power law if `gradient=0`.
+
+    :param value: float or array_like, value at the top of the layer
+    :param dz: float or array_like, depth below the top of the layer
+    :param gradient: float or array_like, linear increase per unit depth
+    :param exponent: float or array_like, exponent of the power law
+    :param ref_depth: float or array_like, reference depth of the power law
+    :return: float or array_like, `value * (1 + dz / ref_depth) ** exponent + gradient * dz`
+    """
+    return value * (1 + dz / ref_depth) ** exponent + gradient * dz
+
+
+def calc_depth_varying_integral(value, dz0, dz1, gradient=0.0, exponent=0.0, ref_depth=1.0):
+    """
+    Integral of a parameter that varies with depth (see `calc_depth_varying_value`) between two depths,
+    computed in closed form (e.g. the change in vertical stress due to a varying unit weight)
+
+    :param value: float or array_like, value at the top of the layer
+    :param dz0: float or array_like, depth below the top of the layer at the start of the integral
+    :param dz1: float or array_like, depth below the top of the layer at the end of the integral
+    :param gradient: float or array_like, linear increase per unit depth
+    :param exponent: float or array_like, exponent of the power law
+    :param ref_depth: float or array_like, reference depth of the power law
+    :return: float or array_like
+    """
+    n1 = np.asarray(exponent, dtype=float) + 1
+    x0 = 1 + np.asarray(dz0, dtype=float) / ref_depth
+    x1 = 1 + np.asarray(dz1, dtype=float) / ref_depth
+    with np.errstate(divide='ignore', invalid='ignore'):
+        power_int = np.where(n1 == 0, np.log(x1 / x0), (x1 ** n1 - x0 ** n1) / np.where(n1 == 0, 1.0, n1))
+    return value * ref_depth * power_int + gradient * (dz1 ** 2 - dz0 ** 2) / 2
+
+
+def _calc_varying_stress_increment(unit_weights, tops, z, layer_tops, gradients, exponents, ref_depths):
+    """
+    Stress from intervals with a varying unit weight, in addition to the stress of the constant unit weight
+    (`unit_weights * (z - tops)`), zero for intervals that do not vary
+    """
+    varying = (gradients != 0) | (exponents != 0)
+    total = calc_depth_varying_integral(unit_weights, tops - layer_tops, z - layer_tops, gradients, exponents,
+                                        ref_depths)
+    return np.where(varying, total - unit_weights * (z - tops), 0.0)
+
+
+def _get_weight_variation(sl, item):
+    """Coefficients of the unit weight used for stresses, (gradient, exponent, ref_depth)"""
+    return sl.get_depth_variation(item) or (0.0, 0.0, 1.0)
+
+
+def _get_slice_variation(sl, item, saturated):
+    """Coefficients of a property evaluated along a soil profile, the unit mass varies with the unit weight"""
+    if item == 'unit_mass':
+        variation = sl.get_depth_variation('unit_sat_weight' if saturated else 'unit_dry_weight')
+        if variation is not None:
+            return (variation[0] / sl.g,) + variation[1:]
+    return sl.get_depth_variation(item)
+
+
 class SoilLayer(Soil):  # not used
 
     def __init__(self, depth=0.0, height=1000, top_total_stress=0.0, top_pore_pressure=0.0):
@@ -1067,6 +2333,10 @@ class SoilProfile(PhysicalObject):
     unit_water_weight = 9800.  # [N/m3]
     _height = None
     hydrostatic = False
+    _layer_cache = None
+    _site_metrics = None
+    _pore_pressure = None
+    _result_cache = None
     base_type = "soil_profile"
     type = "soil_profile"
 
@@ -1109,6 +2379,11 @@ class SoilProfile(PhysicalObject):
             })
         models_dict["soil_profile"][self.unique_hash] = profile_dict
 
+    def to_dict(self, extra=(), **kwargs):
+        if self.pore_pressure is not None:
+            extra = tuple(extra) + ("pore_pressure",)
+        return super(SoilProfile, self).to_dict(extra=extra, **kwargs)
+
     @property
     def ancestor_types(self):
         return super(SoilProfile, self).ancestor_types + ["soil_profile"]
@@ -1143,6 +2418,73 @@ class SoilProfile(PhysicalObject):
     def _sort_layers(self):
         """Sort the layers by depth."""
         self._layers = OrderedDict(sorted(self._layers.items(), key=lambda t: t[0]))
+        self._clear_layer_cache()
+
+    def _clear_layer_cache(self):
+        """Must be called whenever the layers are changed."""
+        self._layer_cache = None
+
+    def _get_layer_cache(self):
+        """
+        Sorted layer depths and soil objects, rebuilt only after the layers have changed.
+
+        :return: tuple, (list of depths, array of depths, list of soil objects)
+        """
+        if self._layer_cache is None or len(self._layer_cache[0]) != len(self._layers):
+            depths = list(self._layers.keys())
+            self._layer_cache = (depths, np.array(depths, dtype=float), list(self._layers.values()))
+        return self._layer_cache
+
+    def enable_cache(self, maxsize=128):
+        """
+        Stores the results of stress, shear wave velocity and split queries, keyed on the queried depths.
+
+        The stored results are cleared when the layers, soils, `gwl`, `height` or `pore_pressure` change.
+
+        :param maxsize: int, maximum number of stored results, the least recently used result is removed first
+            (if None then the number is not limited)
+        """
+        self._result_cache = _ResultCache(maxsize)
+
+    def disable_cache(self):
+        """Stops storing query results and removes the stored results"""
+        self._result_cache = None
+
+    def clear_cache(self):
+        """Removes the stored query results"""
+        if self._result_cache is not None:
+            self._result_cache.clear()
+
+    def cache_info(self):
+        """
+        Statistics of the query result cache
+
+        :return: CacheInfo(hits, misses, maxsize, currsize), or None if the cache is not enabled
+        """
+        if self._result_cache is None:
+            return None
+        return self._result_cache.info()
+
+    def _get_cached(self, name, args, fn):
+        """Returns `fn(*args)`, using the stored result if the cache is enabled and the query has been made before"""
+        cache = self._result_cache
+        if cache is None:
+            return fn(*args)
+        state = self._get_content_key()
+        if state != cache.state:
+            cache.results.clear()
+            cache.state = state
+        key = (name,) + tuple(_get_query_key(arg) for arg in args)
+        if key in cache.results:
+            cache.hits += 1
+            cache.results.move_to_end(key)
+            return _copy_result(cache.results[key])
+        cache.misses += 1
+        result = fn(*args)
+        cache.results[key] = _copy_result(result)
+        if cache.maxsize is not None and len(cache.results) > cache.maxsize:
+            cache.results.popitem(last=False)
+        return result
 
     @property
     def id(self):
@@ -1174,6 +2516,20 @@ class SoilProfile(PhysicalObject):
         """
         self._gwl = float(value)
 
+    @property
+    def pore_pressure(self):
+        """
+        Pore pressure profile (`PorePressureProfile`), if None then the pressure is hydrostatic below the `gwl`
+        """
+        return self._pore_pressure
+
+    @pore_pressure.setter
+    def pore_pressure(self, value):
+        if isinstance(value, dict):
+            value = PorePressureProfile(value["depths"], value["pressures"],
+                                        value.get("unit_water_weight", self.unit_water_weight))
+        self._pore_pressure = value
+
     @property
     def height(self):
         return self._height
@@ -1216,7 +2572,7 @@ class SoilProfile(PhysicalObject):
         """
         layer_int = int(layer_int)
         try:
-            return self.depths[layer_int - 1]
+            return self._get_layer_cache()[0][layer_int - 1]
         except IndexError as e:
             if layer_int == 0 or layer_int > self.n_layers:
                 raise IndexError("index={0}, but must be between 1 and {1}".format(layer_int, self.n_layers))
@@ -1243,7 +2599,7 @@ class SoilProfile(PhysicalObject):
 
     @property
     def layer_objects(self):
-        return list(self._layers.values())
+        return list(self._get_layer_cache()[2])
 
     @layers.setter
     def layers(self, layers):
@@ -1261,17 +2617,20 @@ class SoilProfile(PhysicalObject):
             del self._layers[depth]
         except KeyError:
             raise KeyError("Depth: {0} not found in {1}".format(depth, list(self.layers.keys())))
+        self._clear_layer_cache()
 
     def remove_layer(self, layer_int):
-        key = list(self._layers.keys())[layer_int - 1]
+        key = self._get_layer_cache()[0][layer_int - 1]
         del self._layers[key]
+        self._clear_layer_cache()
 
     def replace_layer(self, layer_int, soil):
-        key = list(self._layers.keys())[layer_int - 1]
+        key = self._get_layer_cache()[0][layer_int - 1]
         self._layers[key] = soil
+        self._clear_layer_cache()
 
     def move_layer(self, new_depth, layer_int, overwrite=False):
-        key = list(self._layers.keys())[layer_int - 1]
+        key = self._get_layer_cache()[0][layer_int - 1]
         if new_depth != key and new_depth in self._layers.keys() and not overwrite:
             raise ValueError(f'new_depth ({new_depth}) is already in soil profile. If you want to over write this layer then set overwrite=True')
         soil = self._layers[key]
@@ -1284,22 +2643,28 @@ class SoilProfile(PhysicalObject):
         new_keys = [depth + delta_depth for depth in old_keys]
         vals = self._layers.values()
         self._layers = dict(zip(new_keys, vals))
+        self._clear_layer_cache()
 
     def layer(self, index):
         index = int(index)
         if index == 0:
             raise KeyError("index=%i, but must be 1 or greater." % index)
-        return list(self._layers.values())[index - 1]
+        return self._get_layer_cache()[2][index - 1]
 
     def set_soil_ids_to_layers(self):
         for i in range(1, len(self._layers) + 1):
             self.layer(i).id = i
 
     def get_layer_index_by_depth(self, depth):
-        for i, ld in enumerate(self.layers):
-            if ld > depth:
-                return i
-        return self.n_layers
+        """
+        Get the index of the layer at a depth (or array of depths), returns 0 if above the first layer.
+
+        :param depth: float or array_like, depth from surface
+        :return: int or array of int
+        """
+        if hasattr(depth, "__len__"):
+            return np.searchsorted(self._get_layer_cache()[1], depth, side='right')
+        return bisect_right(self._get_layer_cache()[0], depth)
 
     def get_soil_at_depth(self, depth):
         lay_index = self.get_layer_index_by_depth(depth)
@@ -1309,31 +2674,66 @@ class SoilProfile(PhysicalObject):
         lay_index = self.get_layer_index_by_depth(depth)
         soil = self.layer(lay_index)
         if hasattr(soil, parameter):
-            return getattr(soil, parameter)
+            value = getattr(soil, parameter)
+            variation = soil.get_depth_variation(parameter)
+            if variation is not None and value is not None:
+                return calc_depth_varying_value(value, depth - self.get_layer_depth(lay_index), *variation)
+            return value
         else:
             raise ModelError("%s not in soil object at depth (%.3f)." % (parameter, depth))
 
     def get_parameters_at_depth(self, depth, parameters):
         lay_index = self.get_layer_index_by_depth(depth)
         soil = self.layer(lay_index)
+        dz = depth - self.get_layer_depth(lay_index)
         od = OrderedDict()
         for parameter in parameters:
             if hasattr(soil, parameter):
-                od[parameter] = getattr(soil, parameter)
+                value = getattr(soil, parameter)
+                variation = soil.get_depth_variation(parameter)
+                if variation is not None and value is not None:
+                    value = calc_depth_varying_value(value, dz, *variation)
+                od[parameter] = value
         return od
     
     def get_parameters_at_depths(self, depths, parameters):
+        """
+        Get the values of soil parameters at many depths.
+
+        The depths are resolved to layers using a single `np.searchsorted`, and the value of each parameter is
+        taken from a table of the values of each layer.
+
+        :param depths: array_like, depths from surface
+        :param parameters: list, names of soil parameters
+        :return: OrderedDict of arrays aligned with `depths`, values that are not defined (or above the first
+            layer) are NaN, parameters with non-numeric values are object arrays (with None if not defined)
+        """
+        depths = np.asarray(depths, dtype=float)
+        inds = np.searchsorted(self._get_layer_cache()[1], depths, side='right')  # 0 is above the first layer
+        soils = self._get_layer_cache()[2]
         od = OrderedDict()
         for parameter in parameters:
-            od[parameter] = []
-        for depth in depths:
-            lay_index = self.get_layer_index_by_depth(depth)
-            soil = self.layer(lay_index)
-            
-            for parameter in parameters:
-                if hasattr(soil, parameter):
-                    od[parameter].append(getattr(soil, parameter))
-            return od
+            values = [None]
+            for sl in soils:
+                try:
+                    values.append(getattr(sl, parameter, None))
+                except TypeError:  # computed from a parameter that is not defined
+                    values.append(None)
+            if all(value is None or isinstance(value, (int, float, np.number)) for value in values):
+                table = np.array([_nan_if_none(value) for value in values], dtype=float)
+            else:
+                table = np.empty(len(values), dtype=object)
+                table[:] = values
+                od[parameter] = table[inds]
+                continue
+            variations = [(0.0, 0.0, 1.0)] + [sl.get_depth_variation(parameter) or (0.0, 0.0, 1.0) for sl in soils]
+            if any(variation != (0.0, 0.0, 1.0) for variation in variations):
+                coeffs = np.array(variations)[inds]
+                layer_tops = np.append(0.0, self._get_layer_cache()[1])[inds]
+                od[parameter] = calc_depth_varying_value(table[inds], depths - layer_tops, *coeffs.T)
+            else:
+                od[parameter] = table[inds]
+        return od
 
     @property
     def n_layers(self):
@@ -1349,7 +2749,7 @@ class SoilProfile(PhysicalObject):
         An ordered list of depths.
         :return:
         """
-        return list(self._layers.keys())
+        return list(self._get_layer_cache()[0])
 
     # def set_soil_saturation_based_on_gwl(self):
     #     for depth in self._layers:
@@ -1370,15 +2770,103 @@ class SoilProfile(PhysicalObject):
     def get_v_total_stress_at_depth(self, z):
         """
         Determine the vertical total stress at depth z, where z can be a number or an array of numbers.
+
+        The stress at the top of each layer (split at the ground water level) is precomputed,
+        the stresses at all depths are then obtained using a single `np.searchsorted`.
         """
+        return self._get_cached("v_total", (z,), self._calc_v_total_stress_at_depth)
 
+    def _calc_v_total_stress_at_depth(self, z):
         if not hasattr(z, "__len__"):
-            return self.one_vertical_total_stress(z)
+            return float(self._eval_v_total_stress(np.array([z], dtype=float))[0])
+        return self._eval_v_total_stress(np.asarray(z, dtype=float))
+
+    def _eval_v_total_stress(self, z):
+        tops, top_stresses, unit_weights, variations = self._get_v_total_stress_table()
+        inds = np.searchsorted(tops, z, side='left') - 1
+        above = inds < 0
+        inds = np.where(above, 0, inds)
+        sigma_v = top_stresses[inds] + unit_weights[inds] * (z - tops[inds])
+        if variations is not None:
+            sigma_v = sigma_v + _calc_varying_stress_increment(unit_weights[inds], tops[inds], z,
+                                                               *[values[inds] for values in variations])
+        sigma_v = np.where(above, self._get_surface_water_stress(), sigma_v)
+        if np.isnan(sigma_v).any():
+            # a required unit weight is not defined, use the scalar approach to raise the appropriate error
+            return np.array([self.one_vertical_total_stress(value) for value in z.flat]).reshape(z.shape)
+        return sigma_v
+
+    def _get_surface_water_stress(self):
+        if self.gwl < 0:
+            return -self.gwl * self.unit_water_weight
+        return 0.0
+
+    def _get_v_total_stress_table(self):
+        """
+        Splits the profile into intervals of constant unit weight and computes the total stress at the top of each.
+
+        Intervals start at the top of each layer (or the surface) and at the ground water level.
+        Unit weights that are not defined are set to NaN. Unit weights that vary with depth
+        (see `Soil.set_depth_variation`) are integrated in closed form.
+
+        :return: tuple, (depth to top of each interval, total stress at top of each interval,
+            unit weight at the top of each interval, variations), where variations is None if no unit weight
+            varies with depth, otherwise a tuple of arrays (depth to top of layer, gradient, exponent, ref_depth)
+            for each interval
+        """
+        depths, _, soils = self._get_layer_cache()
+        n_layers = len(depths)
+        tops = []
+        unit_weights = []
+        through_weights = []  # weight used when stress is computed below the interval
+        variations = []  # (depth to top of layer, gradient, exponent, ref_depth)
+        through_increments = []  # additional stress across the interval from a varying unit weight
+        for i in range(n_layers):
+            top = max(depths[i], 0)
+            bottom = max(depths[i + 1], 0) if i < n_layers - 1 else np.inf
+            if bottom <= top:
+                continue
+            sl = soils[i]
+            dry_item = 'unit_dry_weight' if sl.saturation is None else 'unit_moist_weight'
+            if bottom <= self.gwl:
+                dry_weight = _nan_if_none(sl.get_unit_weight_or('dry'))
+                tops.append(top)
+                unit_weights.append(dry_weight)
+                through_weights.append(dry_weight)
+                variations.append((depths[i],) + _get_weight_variation(sl, dry_item))
+                through_increments.append((dry_weight, top, bottom, variations[-1]))
+                continue
+            if top < self.gwl:
+                # partially saturated layer, unit_weight_or('dry') only used if stress evaluated above the gwl
+                tops.append(top)
+                unit_weights.append(_nan_if_none(sl.get_unit_weight_or('dry')))
+                through_weights.append(_nan_if_none(sl.unit_dry_weight))
+                variations.append((depths[i],) + _get_weight_variation(sl, dry_item))
+                through_increments.append((through_weights[-1], top, self.gwl,
+                                           (depths[i],) + _get_weight_variation(sl, 'unit_dry_weight')))
+                top = self.gwl
+            sat_weight = _nan_if_none(sl.unit_sat_weight)
+            tops.append(top)
+            unit_weights.append(sat_weight)
+            through_weights.append(sat_weight)
+            variations.append((depths[i],) + _get_weight_variation(sl, 'unit_sat_weight'))
+            through_increments.append((sat_weight, top, bottom, variations[-1]))
+        tops = np.array(tops, dtype=float)
+        unit_weights = np.array(unit_weights, dtype=float)
+        top_stresses = np.empty_like(tops)
+        if any(variation[1:] != (0.0, 0.0, 1.0) for variation in variations):
+            variations = tuple(np.array(variations, dtype=float).T)
+            increments = [_calc_varying_stress_increment(weight, top, bottom, *variation)
+                          for weight, top, bottom, variation in through_increments[:-1]]
         else:
-            sigma_v_effs = []
-            for value in z:
-                sigma_v_effs.append(self.one_vertical_total_stress(value))
-            return np.array(sigma_v_effs)
+            variations = None
+            increments = 0.0
+        if len(tops):
+            heights = np.diff(tops)
+            top_stresses[0] = self._get_surface_water_stress()
+            top_stresses[1:] = top_stresses[0] + np.cumsum(heights * np.array(through_weights[:-1], dtype=float)
+                                                           + increments)
+        return tops, top_stresses, unit_weights, variations
 
     def one_vertical_total_stress(self, z_c):
         """
@@ -1406,22 +2894,41 @@ class SoilProfile(PhysicalObject):
                     continue
                 height = bottom_depth - max(depths[l_index], z_surface)
 
+                sl = self.layer(layer_int)
+                top_depth = bottom_depth - height
                 if bottom_depth <= self.gwl:
-                    total_stress += height * self.layer(layer_int).get_unit_weight_or('dry')
+                    total_stress += height * sl.get_unit_weight_or('dry')
+                    dry_item = 'unit_dry_weight' if sl.saturation is None else 'unit_moist_weight'
+                    total_stress += self._calc_varying_stress_in_layer(sl, dry_item, sl.get_unit_weight_or('dry'),
+                                                                       top_depth, bottom_depth, depths[l_index])
                 else:
-                    if self.layer(layer_int).unit_sat_weight is None:
+                    if sl.unit_sat_weight is None:
                         raise AnalysisError("Saturated unit weight not defined for layer %i." % layer_int)
-                    sat_height = bottom_depth - max(self.gwl, depths[l_index])
+                    sat_height = bottom_depth - max(self.gwl, depths[l_index], z_surface)
                     dry_height = height - sat_height
-                    total_stress += sat_height * self.layer(layer_int).unit_sat_weight
+                    total_stress += sat_height * sl.unit_sat_weight
+                    total_stress += self._calc_varying_stress_in_layer(sl, 'unit_sat_weight', sl.unit_sat_weight,
+                                                                       bottom_depth - sat_height, bottom_depth,
+                                                                       depths[l_index])
                     if dry_height > 0:
-                        total_stress += dry_height * self.layer(layer_int).unit_dry_weight
+                        total_stress += dry_height * sl.unit_dry_weight
+                        total_stress += self._calc_varying_stress_in_layer(sl, 'unit_dry_weight', sl.unit_dry_weight,
+                                                                           top_depth, top_depth + dry_height,
+                                                                           depths[l_index])
             else:
                 end = 1
             if end:
                 break
         return total_stress
 
+    @staticmethod
+    def _calc_varying_stress_in_layer(sl, item, unit_weight, top, bottom, layer_top):
+        """Stress from a unit weight that varies with depth, in addition to the constant unit weight"""
+        variation = sl.get_depth_variation(item)
+        if variation is None:
+            return 0.0
+        return float(_calc_varying_stress_increment(unit_weight, top, bottom, layer_top, *variation))
+
     def hydrostatic_pressure(self, y_c):
         """
         Determine the vertical effective stress at a single depth y_c.
@@ -1443,14 +2950,29 @@ class SoilProfile(PhysicalObject):
         deprecation("Use get_v_eff_stress_at_depth")
         return self.get_v_eff_stress_at_depth(y_c)
 
+    def get_pore_pressure_at_depth(self, y_c):
+        """
+        Determine the pore pressure at a depth (or array of depths).
+
+        Uses `pore_pressure` if set, otherwise the pressure is hydrostatic below the ground water level.
+
+        :param y_c: float or array_like, depth from surface
+        """
+        if self.pore_pressure is None:
+            return self.get_hydrostatic_pressure_at_depth(y_c)
+        return self.pore_pressure.get_pressure_at_depth(y_c)
+
     def get_v_eff_stress_at_depth(self, y_c):
         """
         Determine the vertical effective stress at a single depth z_c.
 
         :param y_c: float, depth from surface
         """
-        sigma_v_c = self.get_v_total_stress_at_depth(y_c)
-        pp = self.get_hydrostatic_pressure_at_depth(y_c)
+        return self._get_cached("v_eff", (y_c,), self._calc_v_eff_stress_at_depth)
+
+    def _calc_v_eff_stress_at_depth(self, y_c):
+        sigma_v_c = self._calc_v_total_stress_at_depth(y_c)
+        pp = self.get_pore_pressure_at_depth(y_c)
         sigma_veff_c = sigma_v_c - pp
         return sigma_veff_c
 
@@ -1466,16 +2988,23 @@ class SoilProfile(PhysicalObject):
         :param y_c: float, depth from surface
         :return:
         """
+        return self._get_cached("shear_vel", (y_c,), self._calc_shear_vel_at_depth)
+
+    def _calc_shear_vel_at_depth(self, y_c):
         sl = self.get_soil_at_depth(y_c)
         if y_c <= self.gwl:
             saturation = False
         else:
             saturation = True
         if hasattr(sl, "get_shear_vel_at_v_eff_stress"):
-            v_eff = self.get_v_eff_stress_at_depth(y_c)
+            v_eff = self._calc_v_eff_stress_at_depth(y_c)
             vs = sl.get_shear_vel_at_v_eff_stress(v_eff, saturation)
         else:
             vs = sl.get_shear_vel(saturation)
+        variation = sl.get_depth_variation('shear_vel')
+        if variation is not None and vs is not None:
+            vs = calc_depth_varying_value(vs, y_c - self.get_layer_depth(self.get_layer_index_by_depth(y_c)),
+                                          *variation)
         return vs
 
     def shear_vel_at_depth(self, y_c):
@@ -1487,6 +3016,14 @@ class SoilProfile(PhysicalObject):
         self.gen_split(incs=incs, target=target, props=props)
 
     def gen_split(self, incs=None, target=1.0, props=None, pos='centre'):
+        """
+        Splits the soil profile into slices and stores the properties of each slice in `self.split`
+
+        :param incs: array_like, increments of depth to use for each layer
+        :param target: target depth increment size
+        :param props: list, names of properties to be evaluated at each slice
+        :param pos: str, position in the slice where properties are evaluated ('centre', 'top' or 'bottom')
+        """
         if incs is None:
             incs = np.ones(self.n_layers) * target
         if props is None:
@@ -1494,63 +3031,603 @@ class SoilProfile(PhysicalObject):
         else:
             if 'thickness' in props:
                 props.remove('thickness')
-        dd = OrderedDict([('thickness', []), ('depth', [])])
+        self.split = self._get_cached("split", (incs, props, pos), self._calc_split)
+
+    def _calc_split(self, incs, props, pos):
+        layer_inds, thicknesses, depths = self._get_slices(incs, pos=pos, stop_at_height=True)
+        saturated = depths > self.gwl
+        dd = OrderedDict([('thickness', thicknesses), ('depth', depths)])
         for item in props:
-            dd[item] = []
+            dd[item] = self._get_slice_values(item, layer_inds, depths, saturated)
+        return dd
+
+    def _get_content_key(self):
+        """Key that changes whenever the layers, the stored soil parameters or the water level change"""
+        depths, _, soils = self._get_layer_cache()
+        soil_values = tuple((type(sl), _get_soil_state(sl), tuple(sl.depth_variations)) for sl in soils)
+        pore_pressure = None
+        if self.pore_pressure is not None:
+            pp = self.pore_pressure
+            pore_pressure = (tuple(pp.depths), tuple(pp.pressures), pp.unit_water_weight)
+        return (self.gwl, self.height, self.unit_water_weight, pore_pressure, tuple(depths), soil_values)
+
+    def get_site_metrics(self, target=1.0, incs=None, depth_limit=30.):
+        """
+        Computes the site metrics (e.g. Vs30, site period and travel time) of the soil profile
 
-        cum_thickness = 0
-        for i in range(self.n_layers):
-            if self.layer_depth(i + 1) >= self.height:
-                break
-            sl = self.layer(i + 1)
-            thickness = self.get_layer_height(i + 1)
-            if thickness is None:
-                raise ValueError("thickness of layer {0} is None, check if soil_profile.height is set".format(i + 1))
-            if thickness <= 0:  # below soil profile height
+        The profile is split (as in `gen_split`), stress dependent soils are evaluated using
+        `get_shear_vel_at_v_eff_stress`. The results are cached until the soil profile or its soils are changed.
+
+        :param target: target depth increment size
+        :param incs: array_like, increments of depth to use for each layer
+        :param depth_limit: float, depth used to compute the average shear wave velocity (e.g. 30m for Vs30)
+        :return: OrderedDict, see `calc_site_metrics`
+        """
+        if incs is None:
+            incs = np.ones(self.n_layers) * target
+        key = (self._get_content_key(), tuple(np.asarray(incs, dtype=float)), depth_limit)
+        if self._site_metrics is None or self._site_metrics[0] != key:
+            layer_inds, thicknesses, depths = self._get_slices(incs, pos='centre', stop_at_height=True)
+            saturated = depths > self.gwl
+            shear_vel = self._get_slice_values('shear_vel', layer_inds, depths, saturated)
+            unit_mass = self._get_slice_values('unit_mass', layer_inds, depths, saturated)
+            metrics = calc_site_metrics(thicknesses, _nan_if_none_array(shear_vel), _nan_if_none_array(unit_mass),
+                                        depth_limit=depth_limit)
+            self._site_metrics = (key, OrderedDict([(item, float(metrics[item])) for item in metrics]))
+        return OrderedDict(self._site_metrics[1])
+
+    def _get_slices(self, incs, pos='centre', stop_at_height=True):
+        """
+        Computes the layer index, thickness and depth of every slice of the soil profile
+
+        :param incs: array_like, increments of depth to use for each layer
+        :param pos: str, position in the slice where the depth is taken ('centre', 'top' or 'bottom')
+        :param stop_at_height: bool, if true then layers below the profile height are not split
+        :return: tuple, (layer index (starting at 1), thickness, depth) arrays for each slice
+        """
+        depths = self._get_layer_cache()[1]
+        if self.height is None:
+            last_thickness = np.nan
+        else:
+            last_thickness = self.height - depths[-1]
+        thicknesses = np.append(np.diff(depths), last_thickness)
+        layer_inds = np.arange(1, len(depths) + 1)
+        incs = np.asarray(incs, dtype=float)[:len(depths)]
+        if stop_at_height:
+            if self.height is None:
+                raise ValueError("thickness of layer {0} is None, check if soil_profile.height is set".format(
+                    len(depths)))
+            n_above = np.searchsorted(depths, self.height, side='left')
+            keep = thicknesses[:n_above] > 0  # below soil profile height
+            layer_inds = layer_inds[:n_above][keep]
+            thicknesses = thicknesses[:n_above][keep]
+            incs = incs[:n_above][keep]
+        elif np.isnan(thicknesses[-1]):
+            raise ValueError("thickness of layer {0} is None, check if soil_profile.height is set".format(
+                len(depths)))
+        n_slices = np.maximum((thicknesses / incs).astype(int), 1)
+        slice_thickness = np.repeat(thicknesses / n_slices, n_slices)
+        slice_tops = np.concatenate([[0.0], np.cumsum(slice_thickness)[:-1]])
+        if pos == 'centre':
+            slice_depths = slice_tops + slice_thickness * 0.5
+        elif pos == 'bottom':
+            slice_depths = slice_tops + slice_thickness
+        else:
+            slice_depths = slice_tops
+        return np.repeat(layer_inds, n_slices), slice_thickness, slice_depths
+
+    def _get_slice_values(self, item, layer_inds, depths, saturated):
+        """
+        Evaluates a property at each slice, each layer is evaluated using a single call on all of its slices.
+
+        A stress dependent get method (`get_<item>_at_v_eff_stress`) is used before `get_<item>`,
+        and then the attribute `<item>`.
+
+        :param item: str, name of property
+        :param layer_inds: array_like, layer index of each slice
+        :param depths: array_like, depth of each slice
+        :param saturated: array_like of bool, whether each slice is saturated
+        :return: array_like
+        """
+        if item == 'v_eff':
+            return self._calc_v_eff_stress_at_depth(depths)
+        elif item == 'v_total':
+            return self._calc_v_total_stress_at_depth(depths)
+        elif item == 'pore_pressure':
+            return self.get_pore_pressure_at_depth(depths)
+        fn0 = "get_{0}_at_v_eff_stress".format(item)  # first check for stress dependence
+        fn1 = "get_{0}".format(item)
+        _, layer_tops, soils = self._get_layer_cache()
+        v_effs = None
+        stress_dependent = [ind for ind in np.unique(layer_inds) if hasattr(soils[ind - 1], fn0)]
+        if len(stress_dependent):
+            v_effs = np.full(len(depths), np.nan)
+            req = np.isin(layer_inds, stress_dependent)
+            try:
+                v_effs[req] = self._calc_v_eff_stress_at_depth(depths[req])
+            except TypeError:
+                raise ValueError("Cannot compute vertical effective stress at depths: {0}".format(depths[req]))
+        segments = []
+        numeric = True
+        bounds = np.flatnonzero(np.diff(layer_inds)) + 1
+        for sel in np.split(np.arange(len(layer_inds)), bounds):
+            if not len(sel):
                 continue
-            n_slices = max(int(thickness / incs[i]), 1)
-            slice_thickness = float(thickness) / n_slices
-            for j in range(n_slices):
-                dd["thickness"].append(slice_thickness)
-                v_eff = None
-                if pos == 'centre':
-                    centre_depth = cum_thickness + slice_thickness * 0.5
-                elif pos == 'bottom':
-                    centre_depth = cum_thickness + slice_thickness
+            sl = soils[layer_inds[sel[0]] - 1]
+            sat_sels = [sel] if saturated[sel[0]] == saturated[sel[-1]] else [sel[~saturated[sel]], sel[saturated[sel]]]
+            for sub in sat_sels:
+                sat = bool(saturated[sub[0]])
+                if hasattr(sl, fn0):
+                    value = sf.get_value_of_a_get_method(sl, fn0, extras={"saturated": sat,
+                                                                          'v_eff_stress': v_effs[sub]})
+                elif hasattr(sl, fn1):
+                    value = sf.get_value_of_a_get_method(sl, fn1, extras={"saturated": sat})
+                elif hasattr(sl, item):
+                    value = getattr(sl, item)
                 else:
-                    centre_depth = cum_thickness
-                dd['depth'].append(centre_depth)
-                cum_thickness += slice_thickness
-                if centre_depth > self.gwl:
-                    saturated = True
+                    value = None
+                variation = _get_slice_variation(sl, item, sat)
+                if variation is not None and value is not None and not isinstance(value, str):
+                    value = calc_depth_varying_value(value, depths[sub] - layer_tops[layer_inds[sel[0]] - 1],
+                                                     *variation)
+                if value is None or isinstance(value, str):
+                    numeric = False
+                    segments.append([value] * len(sub))
                 else:
-                    saturated = False
-                # some properties require vertical effective stress or saturation
-                for item in props:
-                    if item == 'v_eff':
-                        value = self.get_v_eff_stress_at_depth(centre_depth)
-                    elif item == 'v_total':
-                        value = self.get_v_total_stress_at_depth(centre_depth)
-                    else:
-                        value = None
-                        fn0 = "get_{0}_at_v_eff_stress".format(item)  # first check for stress dependence
-                        fn1 = "get_{0}".format(item)  # first check for stress dependence
-                        if hasattr(sl, fn0):
-                            try:
-                                v_eff = self.get_v_eff_stress_at_depth(centre_depth)
-                            except TypeError:
-                                raise ValueError("Cannot compute vertical effective stress at depth: {0}".format(centre_depth))
-                            value = sf.get_value_of_a_get_method(sl, fn0, extras={"saturated": saturated,
-                                                                                  'v_eff_stress': v_eff})
-                        elif hasattr(sl, fn1):
-                            value = sf.get_value_of_a_get_method(sl, fn1, extras={"saturated": saturated})
-                        elif hasattr(sl, item):
-                            value = getattr(sl, item)
-                    dd[item].append(value)
-
-        for item in dd:
-            dd[item] = np.array(dd[item])
-        self.split = dd
+                    segments.append(np.broadcast_to(value, len(sub)))
+        if numeric:
+            return np.concatenate(segments) if len(segments) else np.array([])
+        return np.array([value for segment in segments for value in segment])
+
+
+def calc_site_metrics(thickness, shear_vel, unit_mass=None, depth_limit=30.):
+    """
+    Site metrics from the thickness and shear wave velocity of the slices of a soil profile
+
+    Arrays can be 1D (slice) or 2D (profile x slice), where the rows of a 2D array can be padded at the end
+    with slices of zero thickness. If the profile is shallower than `depth_limit`, then the shear wave velocity
+    of the deepest slice is assumed to continue down to `depth_limit`.
+
+    :param thickness: array_like, thickness of each slice
+    :param shear_vel: array_like, shear wave velocity of each slice
+    :param unit_mass: array_like, unit mass of each slice (optional)
+    :param depth_limit: float, depth used to compute the average shear wave velocity (e.g. 30m for Vs30)
+    :return: OrderedDict, 'height', 'travel_time' (to the base of the profile), 'site_period' (4H/Vs),
+        'vs_avg' (average to the base), 'vs{depth_limit}' (e.g. 'vs30') and 'unit_mass_avg' (if unit_mass is set)
+    """
+    thickness = np.asarray(thickness, dtype=float)
+    shear_vel = np.asarray(shear_vel, dtype=float)
+    used = thickness > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slowness = np.where(used, 1. / shear_vel, 0.0)
+        height = np.sum(thickness, axis=-1)
+        travel_time = np.sum(thickness * slowness, axis=-1)
+        tops = np.cumsum(thickness, axis=-1) - thickness
+        thickness_lim = np.clip(depth_limit - tops, 0, thickness)
+        last = np.maximum(np.sum(used, axis=-1) - 1, 0)
+        last_slowness = np.take_along_axis(slowness, np.expand_dims(last, -1), axis=-1)[..., 0]
+        travel_time_lim = np.sum(thickness_lim * slowness, axis=-1) + np.maximum(depth_limit - height, 0) * last_slowness
+        metrics = OrderedDict()
+        metrics['height'] = height
+        metrics['travel_time'] = travel_time
+        metrics['site_period'] = 4 * travel_time
+        metrics['vs_avg'] = height / travel_time
+        metrics['vs%g' % depth_limit] = depth_limit / travel_time_lim
+        if unit_mass is not None:
+            unit_mass = np.where(used, np.asarray(unit_mass, dtype=float), 0.0)
+            metrics['unit_mass_avg'] = np.sum(thickness * unit_mass, axis=-1) / height
+    return metrics
+
+
+def _pad_rows(rows, fill, dtype=float):
+    """Stacks rows of different lengths into a 2D array, padded at the end with `fill`"""
+    width = max([len(row) for row in rows] + [1])
+    padded = np.full((len(rows), width), fill, dtype=dtype)
+    for i, row in enumerate(rows):
+        padded[i, :len(row)] = row
+    return padded
+
+
+class ProfileEnsemble(object):
+    """
+    Evaluates the stresses and properties of many soil profiles at once
+
+    The layers of each profile and its intervals of constant unit weight are packed into padded 2D arrays
+    (profile x layer), where the unused entries have a depth of infinity. The soil parameters are stored in a
+    `SoilTable` with one row per soil object.
+
+    Values are returned as 2D arrays (profile x depth). Values that cannot be computed
+    (e.g. above the first layer, or where a unit weight is not defined) are NaN.
+
+    :param soil_profiles: list of SoilProfile objects
+    :param chunk_size: int, maximum number of profiles evaluated at once (bounds the memory used)
+    """
+
+    def __init__(self, soil_profiles, chunk_size=1000):
+        self.soil_profiles = list(soil_profiles)
+        self.chunk_size = int(chunk_size)
+        sps = self.soil_profiles
+        self.gwls = np.array([sp.gwl for sp in sps], dtype=float)
+        self.heights = np.array([_nan_if_none(sp.height) for sp in sps], dtype=float)
+        self.unit_water_weights = np.array([sp.unit_water_weight for sp in sps], dtype=float)
+        self.surface_stresses = np.array([sp._get_surface_water_stress() for sp in sps], dtype=float)
+        soils = []
+        soil_rows = {}
+        layer_depths = []
+        layer_rows = []
+        tables = []
+        for sp in sps:
+            depths, _, sp_soils = sp._get_layer_cache()
+            for sl in sp_soils:
+                if id(sl) not in soil_rows:
+                    soil_rows[id(sl)] = len(soils)
+                    soils.append(sl)
+            layer_depths.append(depths)
+            layer_rows.append([-1] + [soil_rows[id(sl)] for sl in sp_soils])  # -1 is above the first layer
+            tables.append(sp._get_v_total_stress_table())
+        self.soil_table = SoilTable.from_soils(soils)
+        self.layer_depths = _pad_rows(layer_depths, np.inf)
+        self.layer_rows = _pad_rows(layer_rows, -1, dtype=int)
+        self.interval_tops = _pad_rows([table[0] for table in tables], np.inf)
+        self.interval_stresses = _pad_rows([table[1] for table in tables], np.nan)
+        self.interval_unit_weights = _pad_rows([table[2] for table in tables], np.nan)
+        # unit weights that vary with depth, (depth to top of layer, gradient, exponent, ref_depth) of each interval
+        self.interval_variations = None
+        if any(table[3] is not None for table in tables):
+            defaults = (0.0, 0.0, 0.0, 1.0)
+            self.interval_variations = tuple(
+                _pad_rows([table[3][k] if table[3] is not None else np.full(len(table[0]), defaults[k])
+                           for table in tables], defaults[k]) for k in range(4))
+        # properties that vary with depth, (gradient, exponent, ref_depth) of each soil
+        self.soil_variations = OrderedDict()
+        for name, item, saturated in [('unit_dry_mass', 'unit_mass', False), ('unit_sat_mass', 'unit_mass', True),
+                                      ('shear_vel', 'shear_vel', False)]:
+            variations = [_get_slice_variation(sl, item, saturated) for sl in soils]
+            if any(variation is not None for variation in variations):
+                self.soil_variations[name] = np.array([variation or (0.0, 0.0, 1.0) for variation in variations])
+        self._stress_dependent = not np.isnan(self.soil_table['g0_mod']).all()
+        # profiles with a pore pressure profile are evaluated one at a time
+        self._pore_pressure_inds = np.array([i for i, sp in enumerate(sps) if sp.pore_pressure is not None],
+                                            dtype=int)
+
+    def __len__(self):
+        return len(self.soil_profiles)
+
+    def __repr__(self):
+        return "ProfileEnsemble n_profiles: {0}, n_soils: {1}".format(len(self), len(self.soil_table))
+
+    def _eval_in_chunks(self, fn, depths, chunk_size=None):
+        """
+        Evaluates `fn(profile_slice, depths)` for each chunk of profiles
+
+        :param fn: function that returns a 2D array (profile x depth) for a slice of profiles
+        :param depths: array_like, 1D depths used for all profiles, or 2D depths (profile x depth)
+        :param chunk_size: int, number of profiles per chunk (default is `self.chunk_size`)
+        :return: 2D array (profile x depth)
+        """
+        depths = np.asarray(depths, dtype=float)
+        if depths.ndim == 2 and len(depths) != len(self):
+            raise ValueError("depths has {0} rows but there are {1} profiles".format(len(depths), len(self)))
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+        n_depths = depths.shape[-1] if depths.ndim else 1
+        values = np.empty((len(self), n_depths))
+        for start in range(0, len(self), chunk_size):
+            sel = slice(start, start + chunk_size)
+            if depths.ndim == 2:
+                z = depths[sel]
+            else:
+                z = np.broadcast_to(depths.reshape(-1), (len(self.gwls[sel]), n_depths))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values[sel] = fn(sel, z)
+        return values
+
+    def _v_total_stress(self, sel, z):
+        tops = self.interval_tops[sel]
+        inds = (tops[:, :, None] < z[:, None, :]).sum(axis=1) - 1
+        above = inds < 0
+        inds = np.where(above, 0, inds)
+        top_stresses = np.take_along_axis(self.interval_stresses[sel], inds, axis=1)
+        unit_weights = np.take_along_axis(self.interval_unit_weights[sel], inds, axis=1)
+        interval_tops = np.take_along_axis(tops, inds, axis=1)
+        sigma_v = top_stresses + unit_weights * (z - interval_tops)
+        if self.interval_variations is not None:
+            variations = [np.take_along_axis(values[sel], inds, axis=1) for values in self.interval_variations]
+            sigma_v = sigma_v + _calc_varying_stress_increment(unit_weights, interval_tops, z, *variations)
+        return np.where(above, self.surface_stresses[sel][:, None], sigma_v)
+
+    def _hydrostatic_pressure(self, sel, z):
+        gwls = self.gwls[sel][:, None]
+        return np.where(z < gwls, 0.0, (z - gwls) * self.unit_water_weights[sel][:, None])
+
+    def _pore_pressure(self, sel, z):
+        pp = self._hydrostatic_pressure(sel, z)
+        start, stop, _ = sel.indices(len(self))
+        inds = self._pore_pressure_inds
+        for i in inds[(inds >= start) & (inds < stop)]:
+            pp[i - start] = self.soil_profiles[i].pore_pressure.get_pressure_at_depth(z[i - start])
+        return pp
+
+    def _v_eff_stress(self, sel, z):
+        return self._v_total_stress(sel, z) - self._pore_pressure(sel, z)
+
+    def _layer_inds(self, sel, z):
+        """Index of the layer at each depth, 0 if above the first layer"""
+        return (self.layer_depths[sel][:, :, None] <= z[:, None, :]).sum(axis=1)
+
+    def _soil_rows(self, sel, z):
+        """Row of the soil table at each depth, -1 if above the first layer"""
+        return np.take_along_axis(self.layer_rows[sel], self._layer_inds(sel, z), axis=1)
+
+    def _vary_with_depth(self, values, name, sel, z, rows):
+        """Applies the variation with depth of a property (see `soil_variations`) to its value at the layer top"""
+        if name not in self.soil_variations:
+            return values
+        inds = np.maximum(self._layer_inds(sel, z) - 1, 0)
+        layer_tops = np.take_along_axis(self.layer_depths[sel], inds, axis=1)
+        coeffs = self.soil_variations[name][rows]
+        return calc_depth_varying_value(values, z - layer_tops, coeffs[..., 0], coeffs[..., 1], coeffs[..., 2])
+
+    def _unit_mass(self, sel, z):
+        rows = self._soil_rows(sel, z)
+        saturated = z > self.gwls[sel][:, None]
+        sat_mass = self._vary_with_depth(self.soil_table.unit_sat_mass[rows], 'unit_sat_mass', sel, z, rows)
+        dry_mass = self._vary_with_depth(self.soil_table.unit_dry_mass[rows], 'unit_dry_mass', sel, z, rows)
+        unit_mass = np.where(saturated, sat_mass, dry_mass)
+        return np.where(rows < 0, np.nan, unit_mass)
+
+    def _shear_vel(self, sel, z):
+        rows = self._soil_rows(sel, z)
+        saturated = z > self.gwls[sel][:, None]
+        v_eff = self._v_eff_stress(sel, z) if self._stress_dependent else 0.0
+        vs = self.soil_table.get_shear_vel_at_v_eff_stress(v_eff, saturated, inds=rows)
+        vs = self._vary_with_depth(vs, 'shear_vel', sel, z, rows)
+        return np.where(rows < 0, np.nan, vs)
+
+    def get_v_total_stress_at_depths(self, depths, chunk_size=None):
+        """
+        Vertical total stress of each profile at each depth
+
+        :param depths: array_like, 1D depths used for all profiles, or 2D depths (profile x depth)
+        :param chunk_size: int, number of profiles evaluated at once (default is `self.chunk_size`)
+        :return: 2D array (profile x depth)
+        """
+        return self._eval_in_chunks(self._v_total_stress, depths, chunk_size)
+
+    def get_hydrostatic_pressure_at_depths(self, depths, chunk_size=None):
+        """
+        Hydrostatic pore pressure of each profile at each depth
+
+        :param depths: array_like, 1D depths used for all profiles, or 2D depths (profile x depth)
+        :param chunk_size: int, number of profiles evaluated at once (default is `self.chunk_size`)
+        :return: 2D array (profile x depth)
+        """
+        return self._eval_in_chunks(self._hydrostatic_pressure, depths, chunk_size)
+
+    def get_pore_pressure_at_depths(self, depths, chunk_size=None):
+        """
+        Pore pressure of each profile at each depth, uses the `pore_pressure` of the profile if set
+
+        :param depths: array_like, 1D depths used for all profiles, or 2D depths (profile x depth)
+        :param chunk_size: int, number of profiles evaluated at once (default is `self.chunk_size`)
+        :return: 2D array (profile x depth)
+        """
+        return self._eval_in_chunks(self._pore_pressure, depths, chunk_size)
+
+    def get_v_eff_stress_at_depths(self, depths, chunk_size=None):
+        """
+        Vertical effective stress of each profile at each depth
+
+        :param depths: array_like, 1D depths used for all profiles, or 2D depths (profile x depth)
+        :param chunk_size: int, number of profiles evaluated at once (default is `self.chunk_size`)
+        :return: 2D array (profile x depth)
+        """
+        return self._eval_in_chunks(self._v_eff_stress, depths, chunk_size)
+
+    def get_unit_mass_at_depths(self, depths, chunk_size=None):
+        """
+        Unit mass of the soil of each profile at each depth, saturated mass is used below the ground water level
+
+        :param depths: array_like, 1D depths used for all profiles, or 2D depths (profile x depth)
+        :param chunk_size: int, number of profiles evaluated at once (default is `self.chunk_size`)
+        :return: 2D array (profile x depth)
+        """
+        return self._eval_in_chunks(self._unit_mass, depths, chunk_size)
+
+    def get_split_slices(self, target=1.0):
+        """
+        Splits each profile down to its height (as in `SoilProfile.gen_split`)
+
+        :param target: target depth increment size
+        :return: tuple, (thickness, depth) 2D arrays (profile x slice), padded at the end with zero thickness
+            and NaN depth
+        """
+        slices = [sp._get_slices(np.ones(sp.n_layers) * target, pos='centre', stop_at_height=True)
+                  for sp in self.soil_profiles]
+        thicknesses = _pad_rows([sl[1] for sl in slices], 0.0)
+        depths = _pad_rows([sl[2] for sl in slices], np.nan)
+        return thicknesses, depths
+
+    def get_site_metrics(self, target=1.0, depth_limit=30., chunk_size=None):
+        """
+        Computes the site metrics (e.g. Vs30, site period and travel time) of all profiles
+
+        :param target: target depth increment size
+        :param depth_limit: float, depth used to compute the average shear wave velocity (e.g. 30m for Vs30)
+        :param chunk_size: int, number of profiles evaluated at once (default is `self.chunk_size`)
+        :return: OrderedDict of arrays (one value per profile), see `calc_site_metrics`
+        """
+        thicknesses, depths = self.get_split_slices(target)
+        shear_vel = self.get_shear_vel_at_depths(depths, chunk_size=chunk_size)
+        unit_mass = self.get_unit_mass_at_depths(depths, chunk_size=chunk_size)
+        return calc_site_metrics(thicknesses, shear_vel, unit_mass, depth_limit=depth_limit)
+
+    def _state_parameter(self, sel, z):
+        rows = self._soil_rows(sel, z)
+        sp = self.soil_table.get_state_parameter_at_v_eff_stress(self._v_eff_stress(sel, z), inds=rows)
+        return np.where(rows < 0, np.nan, sp)
+
+    def get_state_parameter_at_depths(self, depths, chunk_size=None):
+        """
+        State parameter of each profile at each depth (NaN for soils without critical state parameters)
+
+        :param depths: array_like, 1D depths used for all profiles, or 2D depths (profile x depth)
+        :param chunk_size: int, number of profiles evaluated at once (default is `self.chunk_size`)
+        :return: 2D array (profile x depth)
+        """
+        return self._eval_in_chunks(self._state_parameter, depths, chunk_size)
+
+    def get_shear_vel_at_depths(self, depths, chunk_size=None):
+        """
+        Shear wave velocity of each profile at each depth
+
+        Stress dependent soils are evaluated at the vertical effective stress.
+
+        :param depths: array_like, 1D depths used for all profiles, or 2D depths (profile x depth)
+        :param chunk_size: int, number of profiles evaluated at once (default is `self.chunk_size`)
+        :return: 2D array (profile x depth)
+        """
+        return self._eval_in_chunks(self._shear_vel, depths, chunk_size)
+
+
+def _norm_cdf(z):
+    """Standard normal cumulative distribution function (erfc approximation, fractional error < 1.2e-7)"""
+    x = np.abs(z) / np.sqrt(2)
+    t = 1. / (1. + 0.5 * x)
+    poly = -1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (-0.18628806 + t * (
+        0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (-0.82215223 + t * 0.17087277))))))))
+    erfc = t * np.exp(-x * x + poly)
+    return np.where(z >= 0, 1 - 0.5 * erfc, 0.5 * erfc)
+
+
+class SoilSampler(object):
+    """
+    Generates random realisations of a soil, returned as the rows of a `SoilTable`
+
+    The distribution of each sampled parameter is a tuple of:
+    ('normal', mean, standard deviation), ('lognormal', mean, standard deviation) or ('uniform', lower, upper).
+    Correlation between the parameters is applied to the underlying standard normal variables (Gaussian copula).
+
+    The sampled values take priority over the parameters of the soil, followed by the parameters of the soil in
+    the order that they were set. Parameters that are inconsistent with the parameters before them are derived
+    again (see `calc_consistent_soil_parameters` with `priority=True`), so all realisations are consistent.
+
+    :param soil: Soil object, parameters that are not sampled are taken from this soil
+    :param distributions: dict, parameter name and distribution
+    :param correlation: array_like, correlation matrix of the sampled parameters (in the order of `distributions`)
+    """
+    distribution_types = ("normal", "lognormal", "uniform")
+
+    def __init__(self, soil, distributions=None, correlation=None):
+        self.soil = soil
+        self.distributions = OrderedDict(distributions if distributions is not None else [])
+        for item in self.distributions:
+            if item not in SoilTable.parameters:
+                raise ModelError("Cannot sample parameter: {0}".format(item))
+            if self.distributions[item][0] not in self.distribution_types:
+                raise ModelError("distribution of {0} must be one of {1}".format(item, self.distribution_types))
+        n_params = len(self.distributions)
+        if correlation is None:
+            correlation = np.eye(n_params)
+        self.correlation = np.array(correlation, dtype=float)
+        if self.correlation.shape != (n_params, n_params):
+            raise ModelError("correlation must have shape ({0}, {0})".format(n_params))
+        try:
+            self._chol = np.linalg.cholesky(self.correlation)
+        except np.linalg.LinAlgError:
+            raise ModelError("correlation matrix must be positive definite")
+
+    def sample(self, n, seed=None, depths=None, correlation_length=None):
+        """
+        Generates realisations of the soil
+
+        :param n: int, number of realisations
+        :param seed: int or numpy.random.Generator, seed of the random number generator
+        :param depths: array_like, depths within each realisation (optional)
+        :param correlation_length: float, vertical correlation length, the correlation between two depths is
+            exp(-distance / correlation_length) (if None then the depths are independent)
+        :return: SoilTable, with n rows (or n x len(depths) rows ordered by realisation, then depth)
+        """
+        rng = np.random.default_rng(seed)
+        n_depths = 1 if depths is None else len(depths)
+        z = rng.standard_normal((n, n_depths, len(self.distributions)))
+        if correlation_length is not None and n_depths > 1:
+            depths = np.asarray(depths, dtype=float)
+            corr = np.exp(-np.abs(depths[:, np.newaxis] - depths[np.newaxis, :]) / correlation_length)
+            chol = np.linalg.cholesky(corr + 1e-10 * np.eye(n_depths))  # small nugget for numerical stability
+            z = np.einsum('ij,njk->nik', chol, z)
+        z = z.reshape(n * n_depths, -1) @ self._chol.T
+        return self._create_table(self._transform(z), n * n_depths)
+
+    def _transform(self, z):
+        """Transforms correlated standard normal variables to the distribution of each parameter"""
+        values = OrderedDict()
+        for i, item in enumerate(self.distributions):
+            dist_type, p0, p1 = self.distributions[item][:3]
+            if dist_type == "normal":
+                values[item] = p0 + p1 * z[:, i]
+            elif dist_type == "lognormal":
+                sigma = np.sqrt(np.log(1 + (p1 / p0) ** 2))
+                values[item] = np.exp(np.log(p0) - sigma ** 2 / 2 + sigma * z[:, i])
+            else:
+                values[item] = p0 + (p1 - p0) * _norm_cdf(z[:, i])
+        return values
+
+    def _create_table(self, sampled, n):
+        sl = self.soil
+        values = OrderedDict(sampled)
+        for item in list(sl.stack) + list(SoilTable.parameters):
+            if item in values or item not in SoilTable.parameters or item in SoilTable._defaults:
+                continue
+            value = _get_stored_soil_value(sl, item)
+            if value is not None:
+                values[item] = np.full(n, value, dtype=float)
+        consts = OrderedDict()
+        for item in SoilTable._defaults:
+            value = _get_stored_soil_value(sl, item)
+            consts[item] = SoilTable._defaults[item] if value is None else value
+        stiffness = not isinstance(sl, StressDependentSoil)
+        params = calc_consistent_soil_parameters(values, consts['gravity'], consts['wmd'], consts['liq_sg'],
+                                                 stiffness=stiffness, priority=True)[0]
+        table = SoilTable(n, soil_class=type(sl), **consts)
+        for item in params:
+            if item in SoilTable.parameters and not np.isnan(params[item]).all():
+                table[item] = params[item]
+        return table
+
+
+def sample_soil_profile(sp, samplers, n, target=1.0, correlation_length=None, seed=None):
+    """
+    Generates realisations of the slices of a soil profile (split as in `SoilProfile.gen_split`)
+
+    Each layer is sampled independently, the values within a layer are correlated vertically.
+
+    :param sp: SoilProfile
+    :param samplers: dict, layer index (starting at 1) and SoilSampler, layers without a sampler are not varied
+    :param n: int, number of realisations
+    :param target: target depth increment size
+    :param correlation_length: float, vertical correlation length (see `SoilSampler.sample`)
+    :param seed: int or numpy.random.Generator, seed of the random number generator
+    :return: OrderedDict, 'thickness', 'depth' and 'layer' of each slice, and 'soils' a SoilTable with
+        n x n_slices rows ordered by realisation, then slice (e.g. `soils['g_mod'].reshape(n, -1)`)
+    """
+    rng = np.random.default_rng(seed)
+    layer_inds, thicknesses, depths = sp._get_slices(np.ones(sp.n_layers) * target, pos='centre',
+                                                     stop_at_height=True)
+    tables = []
+    order = np.empty((n, len(depths)), dtype=int)
+    n_rows = 0
+    for layer_ind in np.unique(layer_inds):
+        sel = np.flatnonzero(layer_inds == layer_ind)
+        sampler = samplers.get(int(layer_ind))
+        if sampler is None:
+            sampler = SoilSampler(sp.layer(layer_ind))
+        tables.append(sampler.sample(n, seed=rng, depths=depths[sel], correlation_length=correlation_length))
+        order[:, sel] = n_rows + np.arange(n * len(sel)).reshape(n, len(sel))
+        n_rows += n * len(sel)
+    dd = OrderedDict([('thickness', thicknesses), ('depth', depths), ('layer', layer_inds)])
+    dd['soils'] = SoilTable.concatenate(tables).take(order.reshape(-1))
+    return dd
 
 
 def discretize_soil_profile(sp, incs=None, target=1.0):
@@ -1565,51 +3642,71 @@ def discretize_soil_profile(sp, incs=None, target=1.0):
 
     if incs is None:
         incs = np.ones(sp.n_layers) * target
+    layer_inds, thicknesses, depths = sp._get_slices(incs, pos='bottom', stop_at_height=False)
+    saturated = depths >= sp.gwl
     dd = {}
-    dd["thickness"] = []
-    dd["unit_mass"] = []
-    dd["shear_vel"] = []
-    cum_thickness = 0
-    for i in range(sp.n_layers):
-        sl = sp.layer(i + 1)
-        thickness = sp.get_layer_height(i + 1)
-        n_slices = max(int(thickness / incs[i]), 1)
-        slice_thickness = float(thickness) / n_slices
-        for j in range(n_slices):
-            cum_thickness += slice_thickness
-            if cum_thickness >= sp.gwl:
-                rho = sl.unit_sat_mass
-                saturation = True
-            else:
-                rho = sl.unit_dry_mass
-                saturation = False
-            if hasattr(sl, "get_shear_vel_at_v_eff_stress"):
-                v_eff = sp.vertical_effective_stress(cum_thickness)
-                vs = sl.get_shear_vel_at_v_eff_stress(v_eff, saturation)
-            else:
-                vs = sl.get_shear_vel(saturation)
-            dd["shear_vel"].append(vs)
-            dd["unit_mass"].append(rho)
-            dd["thickness"].append(slice_thickness)
-    for item in dd:
-        dd[item] = np.array(dd[item])
+    dd["thickness"] = thicknesses
+    dd["unit_mass"] = sp._get_slice_values('unit_mass', layer_inds, depths, saturated)
+    dd["shear_vel"] = sp._get_slice_values('shear_vel', layer_inds, depths, saturated)
     return dd
 
 
-def get_new_soil_profile_at_x_offset(sp_ref, x, dy_surf_at_x=0):
-    # make last 30m free-field
-    xangs = list(sp_ref.x_angles)
+class SoilProfileView(SoilProfile):
+    """
+    A soil profile that shares the soil objects of a reference soil profile, with different layer depths
+    (e.g. the reference soil profile at a different x position)
+
+    The layers are set directly, rather than being added and sorted one at a time.
+
+    :param sp_ref: SoilProfile, reference soil profile
+    :param depths: array_like, depth to the top of each layer of the reference soil profile
+    :param height: float, depth from the surface to the base of the soil profile
+    :param x_angles: array_like, slope of the top of each layer (default is zero)
+    """
+
+    def __init__(self, sp_ref, depths, height=None, x_angles=None):
+        # SoilProfile.__init__ is not called since it creates a default soil
+        self.skip_list = []
+        self.split = OrderedDict()
+        self.sp_ref = sp_ref
+        depths = [float(depth) for depth in depths]
+        layers = list(zip(depths, sp_ref._get_layer_cache()[2]))
+        if any(depths[i + 1] < depths[i] for i in range(len(depths) - 1)):
+            layers.sort(key=lambda t: t[0])
+        self._layers = OrderedDict(layers)
+        if height is not None:
+            self.height = height
+        if x_angles is None:
+            x_angles = np.zeros(len(self._layers))
+        self.x_angles = x_angles
+
+    def __repr__(self):
+        return "SoilProfileView id: {0}, name: {1}, of: {2}".format(self.id, self.name, self.sp_ref)
+
+
+def get_new_soil_profiles_at_x_offsets(sp_ref, xs, dy_surf_at_xs=0):
+    """
+    Creates soil profiles at many x offsets from a reference soil profile, using the slopes of the layers (x_angles)
+
+    The layer depths at all offsets are computed in a single array operation.
+
+    :param sp_ref: SoilProfile, reference soil profile
+    :param xs: array_like, x offsets from the reference soil profile
+    :param dy_surf_at_xs: float or array_like, change in surface elevation at each offset
+    :return: list of SoilProfileView
+    """
+    xs = np.asarray(xs, dtype=float)
+    dys = np.broadcast_to(np.asarray(dy_surf_at_xs, dtype=float), xs.shape)
+    xangs = np.array(sp_ref.x_angles, dtype=float)
     xangs[0] = 0
-    xangs = np.array(xangs)
-    lays = np.array(list(sp_ref.layers)) - xangs * x + dy_surf_at_x
-    sp_ff = SoilProfile()
-    for ll in range(len(lays)):
-        if ll == 0:
-            sp_ff.add_layer(0.0, sp_ref.layer(1))
-        else:
-            sp_ff.add_layer(lays[ll], sp_ref.layer(ll + 1))
-    sp_ff.height = sp_ref.height + dy_surf_at_x
-    return sp_ff
+    lays = sp_ref._get_layer_cache()[1][np.newaxis, :] - xangs[np.newaxis, :] * xs[:, np.newaxis] + dys[:, np.newaxis]
+    lays[:, 0] = 0.0
+    heights = sp_ref.height + dys
+    return [SoilProfileView(sp_ref, lays[i], height=heights[i]) for i in range(len(xs))]
+
+
+def get_new_soil_profile_at_x_offset(sp_ref, x, dy_surf_at_x=0):
+    return get_new_soil_profiles_at_x_offsets(sp_ref, [x], dy_surf_at_x)[0]
 # TODO: extend to have LiquefiableSoil
 
 
@@ -1,5 +1,5 @@
 from collections import OrderedDict
-from sfsimodels.models import SoilProfile, Foundation, SDOFBuilding
+from sfsimodels.models import SoilProfile, SoilProfileView, Foundation, SDOFBuilding
 from sfsimodels.exceptions import ModelError
 from sfsimodels import functions as sf
 import uuid
@@ -327,24 +327,10 @@ def trim_system_to_width(tds, target_width, ff_width=30):
 
     x_ff = target_width - ff_width
     y_ff = tds.get_y_surface_at_x(x_ff)
-    sp_ref, x_ref = tds.get_sp_and_x_sps_for_x(x_ff)
-    # if ff_width is very close to soil profile
-    # - then set angles of that sp to zero and move free-field away to avoid meshing issue.
-    if x_ff - x_ref < 1:
-        sp_ref.x_angles = np.zeros(tds.sps[-1].n_layers)
-        sp_ref.x_angles[0] = None
-        x_ff = x_ref + 1
-    y_ref = tds.get_y_surface_at_x(x_ref)
-    lays = np.array(list(sp_ref.layers)[1:]) - np.array(sp_ref.x_angles[1:]) * (x_ff - x_ref) - y_ref + y_ff
-    sp_ff = SoilProfile()
-    for ll in range(len(lays) + 1):
-        if ll == 0:
-            sp_ff.add_layer(0, sp_ref.layer(1))
-        else:
-            sp_ff.add_layer(lays[ll - 1], sp_ref.layer(ll + 1))
-    sp_ff.x_angles = np.zeros(len(lays) + 1)
+    sps, x_ffs = _gen_sps_at_xs(tds, [x_ff])
+    sp_ff = sps[0]
+    x_ff = x_ffs[0]
     sp_ff.name = 'free-field'
-    sp_ff.height = tds.height + y_ff
     tds.y_surf = np.where(tds.x_surf > x_ff, y_ff, tds.y_surf)
     ind = sf.interp_left(x_ff, tds.x_surf)
     tds.x_surf = np.insert(tds.x_surf, ind + 1, x_ff)
@@ -360,25 +346,58 @@ def trim_system_to_width(tds, target_width, ff_width=30):
     tds.width = target_width
 
 
-def gen_sp_at_x(tds, x_ff):
-    y_ff = tds.get_y_surface_at_x(x_ff)
-    sp_ref, x_ref = tds.get_sp_and_x_sps_for_x(x_ff)
+def _gen_sps_at_xs(tds, xs):
+    """
+    Generates soil profiles (without ground water levels) from the nearest soil profile to the left of each x
+
+    :return: tuple, (list of SoilProfileView, array of x positions, moved if close to the reference soil profile)
+    """
+    xs = np.array(xs, dtype=float)
+    y_ffs = tds.get_y_surface_at_x(xs)
+    x_sps = np.array(tds.x_sps)
+    order = np.argsort(x_sps)
+    ref_inds = order[sf.interp_left(xs, x_sps[order])]
+    x_refs = x_sps[ref_inds]
     # if ff_width is very close to soil profile
     # - then set angles of that sp to zero and move free-field away to avoid meshing issue.
-    if x_ff - x_ref < 1:
-        sp_ref.x_angles = np.zeros(tds.sps[-1].n_layers)
-        sp_ref.x_angles[0] = None
-        x_ff = x_ref + 1
-    y_ref = tds.get_y_surface_at_x(x_ref)
-    lays = np.array(list(sp_ref.layers)[1:]) - np.array(sp_ref.x_angles[1:]) * (x_ff - x_ref) - y_ref + y_ff
-    sp_ff = SoilProfile()
-    for ll in range(len(lays) + 1):
-        if ll == 0:
-            sp_ff.add_layer(0, sp_ref.layer(1))
-        else:
-            sp_ff.add_layer(lays[ll - 1], sp_ref.layer(ll + 1))
-    sp_ff.x_angles = np.zeros(len(lays) + 1)
-    sp_ff.height = tds.height + y_ff
-    sp_ff.gwl = y_ff - tds.gwl
-    return sp_ff
+    close = xs - x_refs < 1
+    for ind in np.unique(ref_inds[close]):
+        tds.sps[ind].x_angles = np.zeros(tds.sps[-1].n_layers)
+        tds.sps[ind].x_angles[0] = None
+    xs = np.where(close, x_refs + 1, xs)
+    y_refs = tds.get_y_surface_at_x(x_refs)
+    sps = [None] * len(xs)
+    for ind in np.unique(ref_inds):
+        sp_ref = tds.sps[ind]
+        inds = np.flatnonzero(ref_inds == ind)
+        angles = np.array(sp_ref.x_angles[1:], dtype=float)
+        lays = np.array(sp_ref.depths)[np.newaxis, :] - y_refs[inds][:, np.newaxis] + y_ffs[inds][:, np.newaxis]
+        lays[:, 1:] -= angles[np.newaxis, :] * (xs[inds] - x_refs[inds])[:, np.newaxis]
+        lays[:, 0] = 0
+        for k, i in enumerate(inds):
+            sps[i] = SoilProfileView(sp_ref, lays[k], height=tds.height + y_ffs[i])
+    return sps, xs
+
+
+def gen_sps_at_xs(tds, xs):
+    """
+    Generates a soil profile at each x position from the nearest soil profile to the left, using the slopes
+    of its layers (x_angles)
+
+    The layer depths are computed in one array operation for each reference soil profile, and the generated
+    soil profiles share the soil objects of the reference soil profile.
+
+    :param tds: TwoDSystem
+    :param xs: array_like, x positions
+    :return: list of SoilProfileView
+    """
+    y_ffs = tds.get_y_surface_at_x(np.asarray(xs, dtype=float))
+    sps = _gen_sps_at_xs(tds, xs)[0]
+    for i, sp in enumerate(sps):
+        sp.gwl = y_ffs[i] - tds.gwl
+    return sps
+
+
+def gen_sp_at_x(tds, x_ff):
+    return gen_sps_at_xs(tds, [x_ff])[0]
 
@@ -63,3 +63,13 @@ def test_interp2d_at_edge():
     print(f_interp)
     assert f_interp[0][0] == 0
     assert f_interp[1][0] == 10.
+
+
+def test_add_to_obj_with_set_many():
+    from sfsimodels import models
+    sl = models.Soil()
+    fns.add_to_obj(sl, {"specific_gravity": 2.65, "e_curr": 0.7, "phi": 30.})
+    assert np.isclose(sl.unit_dry_weight, 2.65 * 9.8 * 1000 / 1.7)
+    assert sl.phi == 30.
+    with pytest.raises(AttributeError, match="Can't set unit_dry_mass"):
+        fns.add_to_obj(models.Soil(), {"specific_gravity": 2.65, "unit_dry_mass": 1500.})
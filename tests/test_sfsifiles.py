@@ -1,3 +1,4 @@
+import io
 import os
 from collections import OrderedDict
 
@@ -8,6 +9,7 @@ import numpy as np
 from sfsimodels import models
 import sfsimodels as sm
 import json
+import pytest
 
 test_dir = os.path.dirname(__file__)
 
@@ -527,6 +529,222 @@ def test_save_and_load_two_soil_profiles():
 
 
 
+def test_trusted_load_of_soils():
+    sl = models.Soil(specific_gravity=2.65, e_curr=0.7, saturation=0.5, g_mod=40e6, poissons_ratio=0.3)
+    sl.id = 1
+    sp = models.SoilProfile()
+    sp.add_layer(0, sl)
+    ecp_output = sm.Output()
+    ecp_output.add_to_dict(sp)
+    p_str = json.dumps(ecp_output.to_dict(), indent=4)
+    objs = sm.loads_json(p_str)
+    t_objs = sm.loads_json(p_str, trusted=True, verify=True)
+    loaded_soil = objs['soil'][1]
+    t_soil = t_objs['soil'][1]
+    assert list(t_soil.stack.items()) == list(loaded_soil.stack.items())
+    assert t_soil.to_dict() == loaded_soil.to_dict()
+    assert t_soil.loaded_unique_hash == sl.unique_hash
+    assert t_objs['soil_profile'][1].layer(1) is t_soil
+
+    # inconsistent values are only found when first read
+    soil_dict = json.loads(p_str)['models']['soil']['1']
+    soil_dict['unit_dry_weight'] = 20000.
+    t_soil = models.Soil()
+    t_soil.set_trusted(soil_dict, verify='lazy')
+    with pytest.raises(sm.ModelError):
+        assert t_soil.unit_dry_weight
+    with pytest.raises(sm.ModelError):
+        models.Soil().set_trusted(soil_dict, verify=True)
+
+
+
+def test_lazy_load_only_builds_indexed_models():
+    ecp_output = sm.Output()
+    for i in range(3):
+        sl = models.Soil(specific_gravity=2.65, e_curr=0.6 + 0.05 * i)
+        sp = models.SoilProfile()
+        sp.add_layer(0, sl)
+        sp.add_layer(2, models.Soil(specific_gravity=2.7, e_curr=0.8 - 0.05 * i))
+        sp.height = 10.
+        sp.id = i + 1
+        ecp_output.add_to_dict(sp)
+    p_str = json.dumps(ecp_output.to_dict(), indent=4)
+    objs = sm.loads_json(p_str, lazy=True)
+    assert len(objs['soil']) == 6
+    assert len(objs['soil_profile']) == 3
+    assert objs.n_materialized == 0
+    sp = objs['soil_profile'][2]
+    assert objs.n_materialized == 3  # the soil profile and its two soils
+    assert objs['soil_profile'].n_materialized == 1
+    assert objs['soil'].n_materialized == 2
+    assert sp.layer(1) is objs['soil'][sp.layer(1).id]
+    assert objs['soil_profiles'][2] is sp
+    eager_objs = sm.loads_json(p_str)
+    assert sp.to_dict() == eager_objs['soil_profile'][2].to_dict()
+    assert [sl.to_dict() for sl in objs['soil'].values()] == [sl.to_dict() for sl in eager_objs['soil'].values()]
+    assert objs.n_materialized == 7
+
+
+def test_lazy_load_membership_does_not_build_models():
+    ecp_output = sm.Output()
+    for i in range(2):
+        sp = models.SoilProfile()
+        sp.add_layer(0, models.Soil(specific_gravity=2.65, e_curr=0.6 + 0.05 * i))
+        sp.height = 10.
+        sp.id = i + 1
+        ecp_output.add_to_dict(sp)
+    objs = sm.loads_json(ecp_output.to_str(), lazy=True)
+    assert 2 in objs['soil_profile']
+    assert 3 not in objs['soil_profile']
+    assert objs['soil_profile'].get(3) is None
+    assert objs['soil_profile'].get(3, 'missing') == 'missing'
+    assert objs.n_materialized == 0
+    sp = objs['soil_profile'].get(2)
+    assert sp is objs['soil_profile'][2]
+    assert objs.n_materialized == 2
+
+
+def test_iter_json_streams_models_with_forward_references():
+    fb2d = models.FrameBuilding2D(2, 2)
+    fb2d.id = 1
+    fb2d.interstorey_heights = 3.4 * np.ones(2)
+    fb2d.floor_length = 18.0
+    fb2d.floor_width = 16.0
+    fb2d.storey_masses = 40.0e3 * np.ones(2)
+    fb2d.bay_lengths = [6., 6.0]
+    fb2d.set_beam_prop("depth", [0.5, 0.6], repeat="up")
+    fb2d.set_column_prop("width", [0.5, 0.5, 0.5], repeat="up")
+    ecp_output = sm.Output()
+    ecp_output.add_to_dict(fb2d)
+    ecp_output.name = "a single building"
+    ecp_dict = ecp_output.to_dict()
+    # the building is read before the sections and elements that it references
+    ecp_dict["models"] = OrderedDict([(mtype, ecp_dict["models"][mtype])
+                                      for mtype in ["building", "beam_column_element", "section"]])
+    assert list(ecp_dict["models"])[0] == "building"
+    p_str = json.dumps(ecp_dict, indent=4)
+    meta = {}
+    loaded = list(files.iter_json(io.StringIO(p_str), meta=meta, chunk_size=64))
+    assert meta["name"] == "a single building"
+    assert [item[0] for item in loaded] == ["section"] * 3 + ["beam_column_element"] * 3 + ["building"]
+    building = loaded[-1][2]
+    assert np.isclose(building.beams[0][1].sections[0].depth, 0.6)
+    eager_objs = sm.loads_json(p_str)
+    assert json.dumps(building.to_dict()) == json.dumps(eager_objs["building"][1].to_dict())
+
+
+
+def test_streamed_output_matches_json_dump():
+    def build_output():
+        ecp_output = sm.Output()
+        fb2d = models.FrameBuilding2D(2, 2)
+        fb2d.id = 1
+        fb2d.interstorey_heights = 3.4 * np.ones(2)
+        fb2d.floor_length = 18.0
+        fb2d.floor_width = 16.0
+        fb2d.storey_masses = 40.0e3 * np.ones(2)
+        fb2d.bay_lengths = [6., 6.0]
+        fb2d.set_beam_prop("depth", [0.5, 0.6], repeat="up")
+        ecp_output.add_to_dict(fb2d)
+        for i in range(2):
+            sp = models.SoilProfile()
+            sp.id = i + 1
+            sp.add_layer(0, models.Soil(specific_gravity=2.65, e_curr=0.6 + 0.1 * i))
+            sp.add_layer(3, models.Soil(specific_gravity=2.7, e_curr=0.7))
+            sp.height = 10.
+            ecp_output.add_to_dict(sp)
+        ecp_output.add_to_output("custom_type", 1, {"values": [1, 2], "empty": {}})
+        ecp_output.name = "streamed"
+        return ecp_output
+
+    for indent in [4, 0, None]:
+        expected = json.dumps(build_output().to_dict(), indent=indent, default=files._json_default)
+        p_str = io.StringIO()
+        build_output().write(p_str, indent=indent)
+        assert p_str.getvalue() == expected
+
+
+def test_output_hash2id_dict():
+    ecp_output = sm.Output()
+    ecp_output.reset_ids = False
+    for i in range(3):
+        sl = models.Soil(specific_gravity=2.65, e_curr=0.6 + 0.1 * i)
+        sl.id = 3 - i
+        ecp_output.add_to_dict(sl)
+    first = ecp_output.to_str()
+    for m_id in ecp_output.id2hash_dict["soil"]:
+        unique_hash = ecp_output.id2hash_dict["soil"][m_id]
+        assert ecp_output.get_id_from_hash("soil", unique_hash) == m_id
+    assert ecp_output.get_id_from_hash("soil", "not-a-hash") is None
+    assert ecp_output.to_str() == first  # ids are only assigned once
+
+
+def test_output_with_sidecar_arrays(tmp_path):
+    ecp_output = sm.Output()
+    fb2d = models.FrameBuilding2D(20, 2)
+    fb2d.id = 1
+    fb2d.interstorey_heights = 3.4 * np.ones(20)
+    fb2d.floor_length = 18.0
+    fb2d.floor_width = 16.0
+    fb2d.storey_masses = 40.0e3 + np.arange(20)
+    fb2d.bay_lengths = [6., 6.0]
+    ecp_output.add_to_dict(fb2d)
+    x_nodes = np.linspace(0, 10, 11)
+    soil_grid = np.arange(100).reshape(10, 10)
+    ecp_output.add_to_output("custom_type", 1, {"id": 1, "type": "mesh", "x_nodes": x_nodes,
+                                                "soil_grid": soil_grid, "name": "grid"})
+    ffp = str(tmp_path / "sidecar.json")
+    ecp_output.to_file(ffp, sidecar_min_size=10)
+    assert os.path.exists(str(tmp_path / "sidecar_arrays.npy"))
+    with open(ffp) as json_file:
+        data = json.load(json_file)
+    assert data["sidecar"] == "sidecar_arrays.npy"
+    assert data["models"]["building"]["1"]["bay_lengths"] == [6., 6.]  # small lists are kept in the json
+    assert "sidecar_array" in data["models"]["building"]["1"]["storey_masses"]
+
+    files.load_sidecar_arrays(data, str(tmp_path))
+    mesh = data["models"]["custom_type"]["1"]
+    assert isinstance(mesh["soil_grid"], np.memmap)
+    assert mesh["soil_grid"].dtype == soil_grid.dtype
+    assert np.array_equal(mesh["soil_grid"], soil_grid)
+    assert np.array_equal(mesh["x_nodes"], x_nodes)
+    assert mesh["name"] == "grid"
+
+    ecp_output.unordered_models.pop("custom_type")
+    for stream in [False, True]:
+        ecp_output.to_file(ffp, sidecar_min_size=10, stream=stream)
+        building = files.load_json(ffp, stream=stream)["building"][1]
+        assert np.allclose(building.storey_masses, fb2d.storey_masses)
+        assert np.allclose(building.interstorey_heights, fb2d.interstorey_heights)
+    with open(ffp) as json_file:
+        p_str = json_file.read()
+    building = sm.loads_json(p_str, folder=str(tmp_path))["building"][1]
+    assert np.allclose(building.storey_masses, fb2d.storey_masses)
+    with pytest.raises(ValueError):
+        sm.loads_json(p_str)  # the folder of the sidecar is not known
+    with pytest.raises(ValueError):
+        list(files.iter_json(io.StringIO(p_str)))
+    objs = OrderedDict()
+    for item in files.iter_json(io.StringIO(p_str), objs=objs, folder=str(tmp_path)):
+        pass
+    assert np.allclose(objs["building"][1].storey_masses, fb2d.storey_masses)
+
+
+def test_output_without_large_arrays_has_no_sidecar(tmp_path):
+    ecp_output = sm.Output()
+    sl = models.Soil(specific_gravity=2.65, e_curr=0.7)
+    ecp_output.add_to_dict(sl)
+    for stream in [False, True]:
+        ffp = str(tmp_path / "no_sidecar_{0}.json".format(stream))
+        ecp_output.to_file(ffp, sidecar_min_size=10, stream=stream)
+        assert not os.path.exists(str(tmp_path / "no_sidecar_{0}_arrays.npy".format(stream)))
+        with open(ffp) as json_file:
+            assert json.load(json_file).get("sidecar") is None  # null if streamed
+        assert np.isclose(files.load_json(ffp)["soil"][1].e_curr, 0.7)
+        assert np.isclose(files.load_json(ffp, stream=True)["soil"][1].e_curr, 0.7)
+
+
+
 if __name__ == '__main__':
     # test_load_json()
     # test_save_and_load_wall_building()
@@ -1,3 +1,4 @@
+import json
 import numpy as np
 import pytest
 
@@ -114,6 +115,24 @@ def test_soil_profile_vertical_total_stress_w_surface_layer():
     assert np.isclose(soil_profile.get_v_total_stress_at_depth(5), expected, rtol=0.0001)
 
 
+def test_v_total_stress_at_depths_matches_single_depth():
+    sl1 = models.Soil(specific_gravity=2.65, e_curr=0.6, saturation=0.3)
+    sl2 = models.Soil(specific_gravity=2.65, e_curr=0.8)
+    sl3 = models.Soil(specific_gravity=2.7, e_curr=0.5)
+    sp = models.SoilProfile()
+    sp.add_layer(-1.0, sl1)
+    sp.add_layer(2.0, sl2)
+    sp.add_layer(6.5, sl3)
+    depths = np.linspace(-2, 12, 57)
+    for gwl in [-1.5, 0.0, 3.0, 6.5, 1e6]:
+        sp.gwl = gwl
+        expected = [sp.one_vertical_total_stress(z) for z in depths]
+        assert np.allclose(sp.get_v_total_stress_at_depth(depths), expected)
+        pp = sp.get_hydrostatic_pressure_at_depth(depths)
+        assert np.allclose(sp.get_v_eff_stress_at_depth(depths), np.array(expected) - pp)
+        assert np.isclose(sp.get_v_total_stress_at_depth(4.0), sp.one_vertical_total_stress(4.0))
+
+
 def test_soil_profile_vertical_effective_stress():
     soil_1 = models.Soil()
     soil_1.phi = 33.
@@ -198,6 +217,24 @@ def test_get_layer_index_by_depth():
     assert sp.get_layer_index_by_depth(4) == 2
 
 
+def test_get_layer_index_by_depths():
+    sp = models.SoilProfile()
+    sp.add_layer(0, models.Soil())
+    sp.add_layer(3, models.Soil())
+    sp.add_layer(7.5, models.Soil())
+    depths = np.array([-1.0, 0.0, 2.9, 3.0, 5.0, 7.5, 20.0])
+    inds = sp.get_layer_index_by_depth(depths)
+    assert np.array_equal(inds, [0, 1, 1, 2, 2, 3, 3])
+    assert np.array_equal(inds, [sp.get_layer_index_by_depth(d) for d in depths])
+    sp.shift_all_layers(1.0)
+    assert sp.get_layer_index_by_depth(3.5) == 1
+    assert sp.get_layer_depth(3) == 8.5
+    sp.remove_layer(2)
+    assert sp.get_layer_index_by_depth(5.0) == 1
+    sp.replace_layer(1, sp.layer(2))
+    assert sp.layer(1) is sp.layer(2)
+
+
 def test_can_move_layer():
     sl1 = models.Soil()
     sl2 = models.Soil()
@@ -417,6 +454,28 @@ def test_soil_profile_split_complex_stress_dependent():
     assert None not in sp.split['shear_vel']
 
 
+def test_soil_profile_split_matches_values_at_depths():
+    sl1 = models.Soil(specific_gravity=2.65, e_curr=0.7, g_mod=30e6)
+    sl2 = models.StressDependentSoil(specific_gravity=2.65, e_curr=0.6, poissons_ratio=0.3, g0_mod=500.)
+    sp = models.SoilProfile()
+    sp.add_layer(0, sl1)
+    sp.add_layer(3, sl2)
+    sp.height = 12
+    sp.gwl = 5.
+    sp.gen_split(target=0.5, props=['shear_vel', 'unit_mass', 'v_eff', 'cohesion'])
+    split = sp.split
+    assert np.isclose(np.sum(split['thickness']), 12.)
+    assert split['depth'][0] == 0.25
+    expected_vs = [sp.get_shear_vel_at_depth(z) for z in split['depth']]
+    assert np.allclose(split['shear_vel'], expected_vs)
+    assert np.allclose(split['v_eff'], sp.get_v_eff_stress_at_depth(split['depth']))
+    assert np.isclose(split['unit_mass'][-1], sl2.unit_sat_mass)
+    assert None in split['cohesion']
+    dd = sm.discretize_soil_profile(sp, target=0.5)
+    assert np.allclose(dd['thickness'], split['thickness'])
+    assert np.isclose(dd['shear_vel'][-1], sp.get_shear_vel_at_depth(12.))
+
+
 def test_save_and_load_soil_profile():
     sl1 = models.Soil()
     sl1_gmod = 30e6
@@ -441,5 +500,269 @@ def test_save_and_load_soil_profile():
     assert np.isclose(load_soil_from_profile.g_mod, sl1.g_mod)
 
 
+def test_profile_ensemble_matches_single_profiles():
+    sl1 = models.Soil(specific_gravity=2.65, e_curr=0.7, g_mod=30e6, saturation=0.2)
+    sl2 = models.StressDependentSoil(specific_gravity=2.65, e_curr=0.6, poissons_ratio=0.3, g0_mod=500.)
+    sl3 = models.Soil(specific_gravity=2.7, e_curr=0.5, g_mod=80e6)
+    sps = []
+    for i, gwl in enumerate([-1.0, 0.0, 2.5, 6.0, 1e6]):
+        sp = models.SoilProfile()
+        sp.add_layer(0, sl1)
+        sp.add_layer(2.0 + i, sl2)
+        if i % 2:
+            sp.add_layer(8.0 - i, sl3)
+        sp.height = 15.
+        sp.gwl = gwl
+        sps.append(sp)
+    ens = models.ProfileEnsemble(sps, chunk_size=2)
+    depths = np.linspace(0.1, 14.9, 40)
+    v_eff = ens.get_v_eff_stress_at_depths(depths)
+    vs = ens.get_shear_vel_at_depths(depths)
+    unit_mass = ens.get_unit_mass_at_depths(depths)
+    assert v_eff.shape == (len(sps), len(depths))
+    for i, sp in enumerate(sps):
+        assert np.allclose(ens.get_v_total_stress_at_depths(depths)[i], sp.get_v_total_stress_at_depth(depths))
+        assert np.allclose(v_eff[i], sp.get_v_eff_stress_at_depth(depths))
+        assert np.allclose(vs[i], [sp.get_shear_vel_at_depth(z) for z in depths])
+        expected = [sp.get_soil_at_depth(z).get_unit_mass(z > sp.gwl) for z in depths]
+        assert np.allclose(unit_mass[i], expected)
+    assert np.allclose(ens.get_v_eff_stress_at_depths(depths, chunk_size=len(sps)), v_eff)
+    assert np.isnan(ens.get_shear_vel_at_depths([-1.0])).all()  # above the first layer
+
+
+def test_site_metrics():
+    sl1 = models.Soil(specific_gravity=2.65, e_curr=0.7, g_mod=20e6)
+    sl2 = models.Soil(specific_gravity=2.65, e_curr=0.6, g_mod=80e6)
+    sp = models.SoilProfile()
+    sp.add_layer(0, sl1)
+    sp.add_layer(10, sl2)
+    sp.height = 20.
+    sp.gwl = 1e6
+    vs1 = sl1.get_shear_vel(saturated=False)
+    vs2 = sl2.get_shear_vel(saturated=False)
+    metrics = sp.get_site_metrics(target=2.0)
+    travel_time = 10 / vs1 + 10 / vs2
+    assert np.isclose(metrics['travel_time'], travel_time)
+    assert np.isclose(metrics['site_period'], 4 * travel_time)
+    assert np.isclose(metrics['vs_avg'], 20 / travel_time)
+    assert np.isclose(metrics['vs30'], 30 / (10 / vs1 + 20 / vs2))  # deepest velocity extends to 30m
+    assert np.isclose(metrics['unit_mass_avg'], (sl1.unit_dry_mass + sl2.unit_dry_mass) / 2)
+    assert sp.get_site_metrics(target=2.0) == metrics  # cached
+    sl2.g_mod = 100e6
+    assert sp.get_site_metrics(target=2.0)['vs30'] > metrics['vs30']
+
+
+def test_site_metrics_of_profile_ensemble():
+    sl1 = models.Soil(specific_gravity=2.65, e_curr=0.7, g_mod=30e6)
+    sl2 = models.StressDependentSoil(specific_gravity=2.65, e_curr=0.6, poissons_ratio=0.3, g0_mod=500.)
+    sps = []
+    for i in range(4):
+        sp = models.SoilProfile()
+        sp.add_layer(0, sl1)
+        sp.add_layer(2. + 3 * i, sl2)
+        sp.height = 15. + 10 * i
+        sp.gwl = 2. * i
+        sps.append(sp)
+    metrics = models.ProfileEnsemble(sps).get_site_metrics(target=0.5)
+    for i, sp in enumerate(sps):
+        expected = sp.get_site_metrics(target=0.5)
+        for item in expected:
+            assert np.isclose(metrics[item][i], expected[item])
+
+
+def test_pore_pressure_profile():
+    sl1 = models.Soil(specific_gravity=2.65, e_curr=0.6)
+    sl2 = models.Soil(specific_gravity=2.65, e_curr=0.8)
+    sp = models.SoilProfile()
+    sp.add_layer(0, sl1)
+    sp.add_layer(5, sl2)
+    sp.height = 20.
+    sp.gwl = 2.
+    depths = np.linspace(0, 20, 41)
+    hydrostatic = sp.get_v_eff_stress_at_depth(depths)
+    sp.pore_pressure = models.PorePressureProfile.from_hydrostatic(2.)
+    assert np.allclose(sp.get_v_eff_stress_at_depth(depths), hydrostatic)
+
+    sp.pore_pressure = models.PorePressureProfile.from_under_drained_layer(2., 5., 10., base_head=3.)
+    assert np.isclose(sp.get_pore_pressure_at_depth(5.), 3 * 9800)
+    assert np.isclose(sp.get_pore_pressure_at_depth(7.5), 3 * 9800)
+    assert np.isclose(sp.get_pore_pressure_at_depth(12.), 5 * 9800)
+    expected = sp.get_v_total_stress_at_depth(12.) - 5 * 9800
+    assert np.isclose(sp.get_v_eff_stress_at_depth(12.), expected)
+
+    sp.pore_pressure = models.PorePressureProfile.from_perched_water_table(1., 3., 4., 15.)
+    pp = sp.get_pore_pressure_at_depth(depths)
+    assert np.allclose(pp[depths <= 1.], 0.0)
+    assert np.isclose(pp[depths == 3.][0], 2 * 9800)
+    assert np.allclose(pp[(depths >= 4.) & (depths <= 15.)], 0.0)
+    assert np.isclose(pp[-1], 5 * 9800)
+    sp.gen_split(target=1.0, props=['v_eff', 'pore_pressure'])
+    assert np.allclose(sp.split['pore_pressure'], sp.get_pore_pressure_at_depth(sp.split['depth']))
+
+    sp2 = sp.deepcopy()
+    sp2.pore_pressure = None
+    ens = models.ProfileEnsemble([sp, sp2])
+    v_eff = ens.get_v_eff_stress_at_depths(depths)
+    assert np.allclose(v_eff[0], sp.get_v_eff_stress_at_depth(depths))
+    assert np.allclose(v_eff[1], hydrostatic)
+
+    with pytest.raises(exceptions.ModelError):
+        models.PorePressureProfile([3., 1.], [0., 1.])
+
+
+def test_save_and_load_soil_profile_with_pore_pressure():
+    sl1 = models.Soil(specific_gravity=2.65, e_curr=0.6)
+    sp = models.SoilProfile()
+    sp.id = 1
+    sp.add_layer(0, sl1)
+    sp.height = 10.
+    sp.gwl = 2.
+    hash_wo_pp = sp.unique_hash
+    sp.clear_unique_hash()
+    sp.pore_pressure = models.PorePressureProfile.from_pressure_heads([2., 5., 10.], [0., 1., 6.])
+    assert sp.unique_hash != hash_wo_pp
+    ecp_output = sm.Output()
+    ecp_output.add_to_dict(sp)
+    objs = sm.loads_json(ecp_output.to_str())
+    loaded = objs['soil_profile'][1]
+    assert np.allclose(loaded.pore_pressure.pressures, sp.pore_pressure.pressures)
+    assert np.isclose(loaded.get_v_eff_stress_at_depth(7.), sp.get_v_eff_stress_at_depth(7.))
+
+
+def test_soil_profile_result_cache():
+    sl1 = models.Soil(specific_gravity=2.65, e_curr=0.7, g_mod=30e6)
+    sl2 = models.StressDependentSoil(specific_gravity=2.65, e_curr=0.6, poissons_ratio=0.3, g0_mod=500.)
+    sp = models.SoilProfile()
+    sp.add_layer(0, sl1)
+    sp.add_layer(3, sl2)
+    sp.height = 12
+    sp.gwl = 5.
+    assert sp.cache_info() is None
+    depths = np.linspace(0, 12, 25)
+    expected = sp.get_v_eff_stress_at_depth(depths)
+    sp.enable_cache(maxsize=3)
+    assert np.allclose(sp.get_v_eff_stress_at_depth(depths), expected)
+    v_eff = sp.get_v_eff_stress_at_depth(depths.copy())
+    assert np.allclose(v_eff, expected)
+    v_eff[0] = -1.  # results are copies
+    assert sp.get_v_eff_stress_at_depth(depths)[0] == expected[0]
+    assert sp.cache_info() == (2, 1, 3, 1)
+    sp.gen_split(target=0.5, props=['shear_vel'])
+    sp.gen_split(target=0.5, props=['shear_vel'])
+    assert sp.cache_info().hits == 3
+    vs = sp.get_shear_vel_at_depth(8.)
+
+    # changes to the profile or its soils clear the cache
+    sp.gwl = 4.
+    assert not np.allclose(sp.get_v_eff_stress_at_depth(depths), expected)
+    assert sp.cache_info().currsize == 1
+    sp.gwl = 5.
+    sl2.g0_mod = 600.
+    assert sp.get_shear_vel_at_depth(8.) > vs
+    sp.add_layer(8., sl1)
+    assert np.isclose(sp.get_shear_vel_at_depth(8.), sl1.get_shear_vel(saturated=True))
+
+    for i in range(5):
+        sp.get_v_total_stress_at_depth(float(i))
+    assert sp.cache_info().currsize == 3
+    sp.disable_cache()
+    assert sp.cache_info() is None
+
+
+def test_get_parameters_at_depths_in_soil_profile():
+    sl1 = models.Soil(g_mod=30e6, unit_dry_weight=16000)
+    sl1.name = 'sand'
+    sl2 = models.Soil(cohesion=20e3)
+    sp = models.SoilProfile()
+    sp.add_layer(0, sl1)
+    sp.add_layer(3, sl2)
+    depths = np.array([-1., 0., 2., 3., 4., 100.])
+    vals = sp.get_parameters_at_depths(depths, ['g_mod', 'cohesion', 'unit_dry_mass', 'name'])
+    assert list(vals) == ['g_mod', 'cohesion', 'unit_dry_mass', 'name']
+    assert np.allclose(vals['g_mod'], [np.nan, 30e6, 30e6, np.nan, np.nan, np.nan], equal_nan=True)
+    assert np.allclose(vals['cohesion'], [np.nan, np.nan, np.nan, 20e3, 20e3, 20e3], equal_nan=True)
+    assert np.isclose(vals['unit_dry_mass'][1], sl1.unit_dry_mass)
+    assert np.isnan(vals['unit_dry_mass'][-1])
+    assert list(vals['name']) == [None, 'sand', 'sand', None, None, None]
+    many = sp.get_parameters_at_depths(np.linspace(0, 10, 10 ** 6), ['g_mod'])['g_mod']
+    assert many.shape == (10 ** 6,)
+    assert np.isnan(many[-1])
+
+
+def test_state_parameter_along_soil_profile():
+    sl1 = models.CriticalSoil(specific_gravity=2.65, e_curr=0.75, poissons_ratio=0.3, e_cr0=0.79, p_cr0=10e3,
+                              lamb_crl=0.015)
+    sl2 = models.Soil(specific_gravity=2.65, e_curr=0.6)
+    sp = models.SoilProfile()
+    sp.add_layer(0, sl1)
+    sp.add_layer(6, sl2)
+    sp.height = 10.
+    sp.gwl = 2.
+    sp.gen_split(target=0.5, props=['state_parameter'])
+    split = sp.split
+    in_sl1 = split['depth'] < 6
+    v_eff = sp.get_v_eff_stress_at_depth(split['depth'][in_sl1])
+    assert np.allclose(list(split['state_parameter'][in_sl1]), sl1.get_state_parameter_at_v_eff_stress(v_eff))
+    assert None in split['state_parameter']
+    ens = models.ProfileEnsemble([sp])
+    state = ens.get_state_parameter_at_depths(split['depth'])[0]
+    assert np.allclose(state[in_sl1], sl1.get_state_parameter_at_v_eff_stress(v_eff))
+    assert np.isnan(state[~in_sl1]).all()
+
+
+def test_soil_profile_w_properties_that_vary_with_depth():
+    sl1 = models.Soil(specific_gravity=2.65, e_curr=0.7, g_mod=40e6, poissons_ratio=0.3)
+    sl2 = models.Soil(specific_gravity=2.65, e_curr=0.6, g_mod=40e6, poissons_ratio=0.3)
+    sl2.set_depth_variation('unit_sat_weight', gradient=150.)
+    sl2.set_depth_variation('unit_dry_weight', exponent=0.5, ref_depth=2.)
+    sl2.set_depth_variation('shear_vel', exponent=0.25)
+    sp = models.SoilProfile()
+    sp.add_layer(0, sl1)
+    sp.add_layer(3, sl2)
+    sp.height = 20.
+    sp.gwl = 5.
+
+    # closed form stresses match the layer walk and numerical integration of the unit weight
+    depths = np.linspace(0, 20, 81)
+    sigma_v = sp.get_v_total_stress_at_depth(depths)
+    assert np.allclose(sigma_v, [sp.one_vertical_total_stress(z) for z in depths])
+    zs_dry = np.linspace(3, 5, 2001)
+    zs_sat = np.linspace(5, 20, 2001)
+    expected = (3 * sl1.unit_dry_weight + np.trapezoid(sl2.unit_dry_weight * (1 + (zs_dry - 3) / 2.) ** 0.5, zs_dry)
+                + np.trapezoid(sl2.unit_sat_weight + 150. * (zs_sat - 3), zs_sat))
+    assert np.isclose(sigma_v[-1], expected)
+
+    assert np.isclose(sp.get_parameter_at_depth(10., 'unit_sat_weight'), sl2.unit_sat_weight + 150. * 7)
+    params = sp.get_parameters_at_depths([1., 10.], ['unit_sat_weight'])
+    assert np.allclose(params['unit_sat_weight'], [sl1.unit_sat_weight, sl2.unit_sat_weight + 150. * 7])
+    assert np.isclose(sp.get_shear_vel_at_depth(4.), sl2.get_shear_vel(False) * 2 ** 0.25)
+    sp.gen_split(target=0.5, props=['shear_vel', 'unit_mass'])
+    split = sp.split
+    assert np.allclose(split['shear_vel'], [sp.get_shear_vel_at_depth(z) for z in split['depth']])
+    assert np.isclose(split['unit_mass'][-1], (sl2.unit_sat_weight + 150. * (split['depth'][-1] - 3)) / sl2.g)
+
+    ens = models.ProfileEnsemble([sp])
+    assert np.allclose(ens.get_v_total_stress_at_depths(depths)[0], sigma_v)
+    assert np.allclose(ens.get_shear_vel_at_depths(split['depth'])[0], split['shear_vel'])
+    assert np.allclose(ens.get_unit_mass_at_depths(split['depth'])[0], split['unit_mass'])
+
+    ecp_output = sm.Output()
+    ecp_output.add_to_dict(sp)
+    objs = sm.loads_json(json.dumps(ecp_output.to_dict()))
+    assert np.allclose(objs['soil_profile'][1].get_v_total_stress_at_depth(depths), sigma_v)
+
+
+def test_parameter_at_depth_methods_apply_depth_variation():
+    sl = models.Soil(specific_gravity=2.65, e_curr=0.7, g_mod=40e6, poissons_ratio=0.3)
+    sl.set_depth_variation('g_mod', gradient=1e6)
+    sp = models.SoilProfile()
+    sp.add_layer(0, sl)
+    sp.height = 10.
+    assert np.isclose(sp.get_parameter_at_depth(2., 'g_mod'), 42e6)
+    assert np.isclose(sp.get_parameters_at_depth(2., ['g_mod'])['g_mod'], 42e6)
+    assert np.isclose(sp.get_parameters_at_depths([2.], ['g_mod'])['g_mod'][0], 42e6)
+    assert sp.get_parameters_at_depth(2., ['poissons_ratio'])['poissons_ratio'] == 0.3
+
+
 if __name__ == '__main__':
     test_save_and_load_soil_profile()
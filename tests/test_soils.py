@@ -1,8 +1,10 @@
+from collections import OrderedDict
 import pytest
 import os
 
 from sfsimodels import files
 from sfsimodels import models
+from sfsimodels.exceptions import ModelError
 import numpy as np
 
 
@@ -229,6 +231,16 @@ def test_inputs_soil():
     assert "e_cr0" in crit_sl.inputs
 
 
+def test_inputs_shared_between_soils():
+    sl1 = models.Soil()
+    sl2 = models.Soil(e_curr=0.6)
+    assert sl1.inputs is sl2.inputs
+    sl1.inputs += ["xi"]
+    assert "xi" in sl1.inputs
+    assert "xi" not in sl2.inputs
+    assert models.CriticalSoil().inputs is models.CriticalSoil().inputs
+
+
 def test_e_critical():
     crit_sl = models.CriticalSoil(wmd=1000)
     crit_sl.e_cr0 = 0.79  # Jin et al. 2015
@@ -238,6 +250,32 @@ def test_e_critical():
     assert np.isclose(crit_sl.e_critical(1.8), 0.81572, rtol=0.0001)
 
 
+def test_critical_state_parameters_over_arrays():
+    crit_sl = models.CriticalSoil(specific_gravity=2.65, e_curr=0.75, poissons_ratio=0.3, phi=32.,
+                                  e_cr0=0.79, p_cr0=10e3, lamb_crl=0.015)
+    assert crit_sl.stack['lamb_crl'] == 0.015
+    m_eff = np.array([5e3, 10e3, 100e3])
+    assert np.allclose(crit_sl.e_critical(m_eff), [crit_sl.e_critical(p) for p in m_eff])
+    assert np.allclose(crit_sl.get_state_parameter_at_m_eff_stress(m_eff), 0.75 - crit_sl.e_critical(m_eff))
+    v_eff = np.array([20e3, 80e3])
+    k0 = 0.3 / 0.7
+    expected = 0.75 - crit_sl.e_critical(v_eff * (1 + 2 * k0) / 3)
+    assert np.allclose(crit_sl.get_state_parameter_at_v_eff_stress(v_eff), expected)
+    sin_phi = np.sin(np.radians(32.))
+    assert np.isclose(crit_sl.critical_stress_ratio, 6 * sin_phi / (3 - sin_phi))
+
+    # elements of a mesh, each with a soil and a vertical effective stress
+    table = models.SoilTable.from_soils([crit_sl, models.Soil(e_curr=0.6, poissons_ratio=0.3)])
+    rows = np.array([[0, 0, 1], [1, 0, 0]])
+    v_effs = np.array([[20e3, 80e3, 50e3], [10e3, 40e3, 60e3]])
+    state = table.get_state_parameter_at_v_eff_stress(v_effs, inds=rows)
+    assert state.shape == (2, 3)
+    assert np.allclose(state[rows == 0], crit_sl.get_state_parameter_at_v_eff_stress(v_effs[rows == 0]))
+    assert np.isnan(state[rows == 1]).all()
+    loaded = table.get_soil(0)
+    assert loaded.lamb_crl == 0.015
+
+
 def test_load_test_data():
     from tests import load_test_data as ltd
     soil = models.Soil()
@@ -292,6 +330,20 @@ def test_can_override_all():
             assert getattr(soil2, item) == value * 1.3
 
 
+def test_override_history_does_not_grow():
+    sl = models.Soil(specific_gravity=2.65, e_curr=0.7, saturation=0.5, g_mod=40e6, poissons_ratio=0.3)
+    stacks = []
+    for i in range(4):
+        for j in range(200):
+            sl.override("e_curr", 0.6 + 0.0001 * (i * 200 + j))
+            sl.phi = 30. + 0.01 * j
+        stacks.append(list(sl.stack))
+    assert all(stack == stacks[0] for stack in stacks)  # the stack is replayed on override, so must not grow
+    assert len(sl.stack) <= len(sl.inputs)
+    assert list(sl.stack)[-1] == "phi"
+    assert np.isclose(sl.specific_gravity, 2.65)
+
+
 def test_override_fake_key():
     sl = models.Soil()
     with pytest.raises(KeyError):
@@ -398,6 +450,210 @@ def test_stress_dependent_soil_set_curr_m_eff():
     assert np.isclose(g_mod, sl.g_mod)
 
 
+def test_stress_dependent_soil_with_stress_arrays():
+    sl = models.StressDependentSoil(specific_gravity=2.65, e_curr=0.7, poissons_ratio=0.3, g0_mod=500.)
+    v_effs = np.array([10.0e3, 50.0e3, 200.0e3])
+    saturated = np.array([False, True, True])
+    g_mods = sl.get_g_mod_at_v_eff_stress(v_effs)
+    vs = sl.get_shear_vel_at_v_eff_stress(v_effs, saturated)
+    for i in range(len(v_effs)):
+        assert np.isclose(g_mods[i], sl.get_g_mod_at_v_eff_stress(v_effs[i]))
+        assert np.isclose(vs[i], sl.get_shear_vel_at_v_eff_stress(v_effs[i], saturated[i]))
+    assert np.allclose(sl.get_g_mod_at_m_eff_stress(v_effs), [sl.get_g_mod_at_m_eff_stress(v) for v in v_effs])
+    sl.set_g0_mod_at_v_eff_stress(v_effs, g_mods)
+    assert np.isclose(sl.g0_mod, 500.)
+
+    # batch of soils, one row for each stress
+    sl2 = models.Soil(specific_gravity=2.7, e_curr=0.6, g_mod=30.0e6, poissons_ratio=0.3)
+    table = models.SoilTable.from_soils([sl, sl2])
+    inds = np.array([0, 0, 1, 1])
+    v_effs = np.array([10.0e3, 50.0e3, 10.0e3, 50.0e3])
+    saturated = np.array([False, True, False, True])
+    vs = table.get_shear_vel_at_v_eff_stress(v_effs, saturated, inds=inds)
+    assert np.allclose(vs[:2], sl.get_shear_vel_at_v_eff_stress(v_effs[:2], saturated[:2]))
+    assert np.isclose(vs[2], sl2.get_shear_vel(False))
+    assert np.isclose(vs[3], sl2.get_shear_vel(True))
+
+
+def test_soil_table_to_and_from_soils():
+    sl1 = models.Soil(specific_gravity=2.65, e_curr=0.6, g_mod=30e6, poissons_ratio=0.3, phi=30.)
+    sl1.id = 1
+    sl2 = models.StressDependentSoil(specific_gravity=2.7, e_curr=0.7, poissons_ratio=0.3, g0_mod=500.)
+    sl2.name = "sand"
+    table = models.SoilTable.from_soils([sl1, sl2])
+    assert len(table) == 2
+    assert np.isclose(table.e_curr[0], 0.6)
+    assert np.isnan(table.g0_mod[0])
+    assert np.allclose(table.unit_sat_mass, [sl1.unit_sat_mass, sl2.unit_sat_mass])
+    assert np.isclose(table.bulk_mod[0], sl1.bulk_mod)
+    assert np.isclose(table.get_shear_vel(saturated=np.array([True, False]))[0], sl1.get_shear_vel(True))
+    soils = table.to_soils()
+    assert isinstance(soils[1], models.StressDependentSoil)
+    assert soils[0].id == 1
+    assert soils[1].name == "sand"
+    assert soils[0].to_dict(with_hash=False) == sl1.to_dict(with_hash=False)
+    assert soils[1].to_dict(with_hash=False) == sl2.to_dict(with_hash=False)
+    assert list(soils[0].stack) == list(sl1.stack)
+    assert list(soils[1].stack) == list(sl2.stack)
+    soils[0].unit_dry_weight = sl1.unit_dry_weight  # still consistent
+    assert list(table.take([1]).get_soil(0).stack) == list(sl2.stack)
+    soils[0].override("e_curr", 0.7)
+    sl1.override("e_curr", 0.7)
+    assert np.isclose(soils[0].unit_dry_weight, sl1.unit_dry_weight)
+    # without a history of set values, all of the defined inputs are in the stack
+    sl = models.SoilTable(1, e_curr=0.6, specific_gravity=2.65).get_soil(0)
+    assert list(sl.stack) == ['gravity', 'wmd', 'liq_sg', 'e_curr', 'specific_gravity']
+
+
+def test_soil_table_round_trip_keeps_unique_hash():
+    sl1 = models.Soil(specific_gravity=2.65, e_curr=0.6, g_mod=30e6, poissons_ratio=0.3, phi=30)
+    sl2 = models.StressDependentSoil(specific_gravity=2.7, e_curr=0.7, poissons_ratio=0.3, g0_mod=500)
+    sl3 = models.CriticalSoil(specific_gravity=2.65, e_curr=0.6, poissons_ratio=0.3)
+    sl3.e_cr0 = 0.8
+    sl3.p_cr0 = 10
+    sl3.lamb_crl = 0.05
+    soils = [sl1, sl2, sl3]
+    table = models.SoilTable.concatenate([models.SoilTable.from_soils(soils[:2]), models.SoilTable.from_soils([sl3])])
+    for sl, new_sl in zip(soils, table.to_soils()):
+        assert new_sl.wmd == 1000 and isinstance(new_sl.wmd, int)
+        assert new_sl.unique_hash == sl.unique_hash
+
+
+def test_soil_table_take_with_mask():
+    soils = [models.Soil(specific_gravity=2.65, e_curr=0.6, phi=phi) for phi in [25., 30., 35., 40.]]
+    table = models.SoilTable.from_soils(soils)
+    selected = table.take(table['phi'] > 30)
+    assert isinstance(selected, models.SoilTable)
+    assert len(selected) == 2
+    assert np.allclose(selected['phi'], [35., 40.])
+    assert selected.get_soil(1).unique_hash == soils[3].unique_hash
+    assert np.allclose(table.take([3, 0])['phi'], [40., 25.])
+
+
+def test_calc_consistent_soil_parameters():
+    from sfsimodels.models.soils import calc_consistent_soil_parameters
+    values = {
+        "specific_gravity": [2.65, 2.65, None, 2.65],
+        "e_curr": [0.6, None, 0.7, 0.6],
+        "unit_dry_weight": [None, 17000., 17000., 17000.],
+        "saturation": [0.5, None, 1.0, None],
+        "g_mod": [30e6, None, None, 30e6],
+        "poissons_ratio": [0.3, None, None, 0.3],
+    }
+    params, inconsistent = calc_consistent_soil_parameters(values)
+    assert np.array_equal(inconsistent, [False, False, False, True])
+    for i in range(3):
+        sl = models.Soil(**{item: values[item][i] for item in values})
+        for item in params:
+            if getattr(sl, item) is None:
+                assert np.isnan(params[item][i])
+            else:
+                assert np.isclose(params[item][i], getattr(sl, item))
+
+    table = models.SoilTable(2, e_curr=[0.6, 0.7], specific_gravity=2.65, bulk_mod=[65e6, None], poissons_ratio=0.3)
+    assert not table.recompute_all_weights_and_void().any()
+    assert not table.recompute_all_stiffness_parameters().any()
+    assert np.isclose(table.unit_dry_weight[1], models.Soil(e_curr=0.7, specific_gravity=2.65).unit_dry_weight)
+    assert np.isclose(table.g_mod[0], 30e6)
+    assert np.isnan(table.g_mod[1])
+
+
+def test_inconsistent_setter_does_not_change_soil():
+    sl = models.Soil()
+    sl.unit_dry_weight = 15000.
+    sl.unit_sat_weight = 19000.
+    with pytest.raises(ModelError):
+        sl.specific_gravity = 2.8
+    assert sl.specific_gravity is None
+    assert sl.e_curr is None
+    sl.saturation = 0.5
+    with pytest.raises(ModelError):
+        sl.e_curr = 0.9
+    assert sl.e_curr is None
+    assert sl.unit_moist_weight is None
+    porosity = (19000. - 15000.) / sl.ulw
+    sl.e_curr = porosity / (1 - porosity)
+    assert np.isclose(sl.unit_moist_weight, 17000.)
+
+
+def test_set_many():
+    values = {"phi": 33., "e_curr": 0.7, "specific_gravity": 2.65, "saturation": 0.5, "e_max": 1.0,
+              "relative_density": 0.6, "g_mod": 40e6, "poissons_ratio": 0.3}
+    sl = models.Soil()
+    assert sl.set_many(values) == []
+    sl_single = models.Soil()
+    for item in values:
+        setattr(sl_single, item, values[item])
+    assert sl.to_dict(with_hash=False) == sl_single.to_dict(with_hash=False)
+    assert np.isclose(sl.e_min, 0.5)
+    assert sl.stack["relative_density"] == 0.6
+
+    sl = models.Soil(unit_dry_weight=15000.)
+    conflicts = sl.set_many({"e_curr": 0.7, "specific_gravity": 2.65, "bulk_mod": 65e6})
+    assert conflicts == ["specific_gravity"]
+    assert np.isclose(sl.e_curr, 0.7)
+    assert sl.bulk_mod == 65e6
+    with pytest.raises(ModelError):
+        models.Soil(unit_dry_weight=15000., e_curr=0.7, specific_gravity=2.65)
+
+
+def test_calc_consistent_soil_parameters_with_priority():
+    from sfsimodels.models.soils import calc_consistent_soil_parameters
+    values = OrderedDict([
+        ("unit_dry_weight", [15000., 16000.]),
+        ("specific_gravity", [2.65, 2.65]),
+        ("e_curr", [0.7, 2.65 * 9800 / 16000 - 1]),
+    ])
+    params, replaced = calc_consistent_soil_parameters(values, priority=True)
+    assert np.array_equal(replaced, [True, False])
+    assert np.isclose(params['e_curr'][0], 2.65 * 9800 / 15000 - 1)
+    assert not calc_consistent_soil_parameters(params)[1].any()
+
+
+def test_soil_sampler():
+    sl = models.Soil(specific_gravity=2.65, e_min=0.5, e_max=0.9, e_curr=0.7, g_mod=40e6, poissons_ratio=0.3, phi=33.)
+    distributions = OrderedDict([
+        ('g_mod', ('lognormal', 40e6, 8e6)),
+        ('phi', ('normal', 33., 2.)),
+        ('unit_dry_weight', ('uniform', 14000., 16000.)),
+    ])
+    corr = [[1, 0.6, 0.5], [0.6, 1, 0.], [0.5, 0., 1]]
+    table = models.SoilSampler(sl, distributions, correlation=corr).sample(20000, seed=1)
+    assert len(table) == 20000
+    assert np.isclose(np.mean(table.g_mod), 40e6, rtol=0.01)
+    assert np.isclose(np.std(table.g_mod), 8e6, rtol=0.05)
+    assert np.isclose(np.mean(table.phi), 33., rtol=0.01)
+    assert 14000. <= table.unit_dry_weight.min() and table.unit_dry_weight.max() <= 16000.
+    assert np.isclose(np.corrcoef(table.g_mod, table.phi)[0, 1], 0.6, atol=0.03)
+    # all realisations are consistent, the void ratio is derived from the sampled unit weight
+    assert not table.recompute_all_weights_and_void().any()
+    assert not table.recompute_all_stiffness_parameters().any()
+    assert np.allclose(table.specific_gravity, 2.65)
+    assert np.allclose(table.e_curr, 2.65 * 9800 / table.unit_dry_weight - 1)
+    sl_0 = table.get_soil(0)
+    assert np.isclose(sl_0.relative_density, table.relative_density[0])
+    with pytest.raises(ModelError):
+        models.SoilSampler(sl, distributions, correlation=np.ones((3, 3)) * 2)
+
+
+def test_sample_soil_profile_with_vertical_correlation():
+    from sfsimodels.models.soils import sample_soil_profile
+    sl1 = models.Soil(specific_gravity=2.65, e_curr=0.7, g_mod=40e6)
+    sl2 = models.Soil(specific_gravity=2.7, e_curr=0.5, g_mod=90e6)
+    sp = models.SoilProfile()
+    sp.add_layer(0, sl1)
+    sp.add_layer(5, sl2)
+    sp.height = 15
+    samplers = {1: models.SoilSampler(sl1, {'g_mod': ('lognormal', 40e6, 8e6)})}
+    n = 2000
+    dd = sample_soil_profile(sp, samplers, n, target=0.5, correlation_length=2., seed=3)
+    g_mod = dd['soils'].g_mod.reshape(n, -1)
+    assert g_mod.shape == (n, len(dd['depth']))
+    assert np.allclose(g_mod[:, dd['layer'] == 2], 90e6)
+    assert np.isclose(np.corrcoef(g_mod[:, 0], g_mod[:, 1])[0, 1], np.exp(-0.5 / 2), atol=0.05)
+    assert np.isclose(np.corrcoef(g_mod[:, 0], g_mod[:, 8])[0, 1], np.exp(-4. / 2), atol=0.08)
+
+
 if __name__ == '__main__':
     test_e_critical()
     # test_non_normal_g()
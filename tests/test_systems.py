@@ -52,5 +52,37 @@ def test_save_and_load_2d_system():
     assert system.sps[0].layer(1).xi == 0.03
 
 
+def test_gen_sps_at_xs():
+    from sfsimodels.models import systems
+    sl1 = sm.Soil(specific_gravity=2.65, e_curr=0.7)
+    sl2 = sm.Soil(specific_gravity=2.65, e_curr=0.5)
+    sp = sm.SoilProfile()
+    sp.add_layer(0, sl1)
+    sp.add_layer(3., sl2)
+    sp.height = 20
+    sp.x_angles = [0.0, 0.05]
+    sp2 = sm.SoilProfile()
+    sp2.add_layer(0, sl2)
+    sp2.height = 20
+    sp2.x_angles = [0.0]
+    tds = sm.TwoDSystem(width=100, height=20)
+    tds.add_sp(sp, 0)
+    tds.add_sp(sp2, 60.)
+    tds.x_surf = [0, 30, 100]
+    tds.y_surf = [0, 2., -1.]
+    tds.gwl = 3.
+    xs = np.linspace(5, 95, 10)
+    sps = systems.gen_sps_at_xs(tds, xs)
+    for i, x in enumerate(xs):
+        y_ff = tds.get_y_surface_at_x(x)
+        assert sps[i].layer(1) is (sl1 if x < 60 else sl2)  # soils are shared
+        assert np.isclose(sps[i].height, 20 + y_ff)
+        assert np.isclose(sps[i].gwl, y_ff - 3.)
+        if x < 60:
+            assert np.isclose(sps[i].get_layer_depth(2), 3. - 0.05 * x + y_ff)
+        single = systems.gen_sp_at_x(tds, x)
+        assert np.allclose(single.depths, sps[i].depths)
+
+
 if __name__ == '__main__':
     test_save_and_load_2d_system()
\ No newline at end of file